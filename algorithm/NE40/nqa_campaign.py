@@ -0,0 +1,486 @@
+import json
+import os
+import sys
+import time
+import asyncio
+import argparse
+import re
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.async_console import AsyncConsole, raise_nofile_limit, run_bounded
+from common.config_apply import apply_config
+from common.deadline import CircuitBreaker, Deadline
+from common.governor import AsyncConcurrencyGovernor
+from common.nqa_store import DEFAULT_STORE_DIR, NqaStore
+from per_ne40_pall import AsyncRouterTelnetManager, find_latest_folder
+
+CAMPAIGN_ADMIN = "campaign"
+CAMPAIGN_PROTOCOLS = ("OSPF", "O_ASE", "O_NSSA", "IBGP", "EBGP")
+SCHEDULE_ADMIN = "monitor"
+DEFAULT_STATE_DIR = os.environ.get("NET_TWIN_NQA", "/tmp/net-twin-nqa")
+TEST_RESULT_PATTERN = re.compile(r'^\s*\d+\s*\.\s*Test (\d+) result', re.MULTILINE)
+
+
+class NqaCampaign(AsyncRouterTelnetManager):
+    """NQA 全网测量：所有路由器同时向各自路由表中的全部 OSPF/BGP 目的地址发起测试。
+
+    每台路由器的测试实例在一次流水线写入中配置完毕，由同一个 commit 同时启动；
+    之后不再按固定间隔轮询，而是等到测试按 probe-count × interval + timeout 预计结束的时刻
+    一次性取回全部结果，只对尚未结束的实例再等待一小段时间重查。
+    整体耗时约等于一次测试的时长，而不是路由器数 × 目的地址数次测试。
+    """
+
+    def __init__(self, telnet_info, probe_count=5, interval=100, probe_timeout=1, max_tests=50,
+                 max_sessions=1000, device_timeout=120, job_timeout=600, breaker=None, store=None):
+        super().__init__(telnet_info, max_sessions=max_sessions, device_timeout=device_timeout,
+                         job_timeout=job_timeout, breaker=breaker, store=store)
+        self.probe_count = probe_count
+        self.interval = interval  # 毫秒
+        self.probe_timeout = probe_timeout  # 秒
+        self.max_tests = max_tests  # 每台路由器最多同时运行的测试实例数
+
+    def parse_destinations(self, routing_table):
+        """解析路由表，返回全部 OSPF/BGP 目的地址（去掉子网掩码，保持出现顺序并去重）"""
+        destinations = []
+        seen = set()
+        for line in routing_table.splitlines():
+            parts = line.split()
+            if len(parts) < 2 or parts[1] not in CAMPAIGN_PROTOCOLS:
+                continue
+            dest_ip = parts[0].split('/')[0]
+            if dest_ip not in seen:
+                seen.add(dest_ip)
+                destinations.append(dest_ip)
+        if len(destinations) > self.max_tests:
+            print(f"Found {len(destinations)} destinations, testing the first {self.max_tests}")
+            destinations = destinations[:self.max_tests]
+        return destinations
+
+    def test_duration(self):
+        """单个测试实例从启动到结束的预计时长（秒）"""
+        return self.probe_count * self.interval / 1000.0 + self.probe_timeout
+
+    async def start_tests(self, console, destinations):
+        """一次写入全部测试实例的配置，最后一个 commit 让所有实例同时开始；有命令被拒绝时不提交并抛出 RuntimeError"""
+        commands = []
+        for k, dest_ip in enumerate(destinations):
+            commands += [
+                f'nqa test-instance {CAMPAIGN_ADMIN} t{k}',
+                'test-type icmpjitter',
+                f'destination-address ipv4 {dest_ip}',
+                f'probe-count {self.probe_count}',
+                f'interval milliseconds {self.interval}',
+                f'timeout {self.probe_timeout}',
+                'start now',
+                'q',
+            ]
+        await self.apply_or_raise(console, commands)
+        return asyncio.get_running_loop().time()
+
+    async def apply_or_raise(self, console, commands):
+        """在一次流水线写入中推送配置并 commit，任何一行出错都不提交，以免设备上留下只配置了一半的实例"""
+        committed, errors = await apply_config(console, commands, chunk_size=max(len(commands), 1))
+        if not committed:
+            error = errors[0]
+            raise RuntimeError(f"configuration rejected at {error['command']!r}: {error['message']}")
+
+    async def collect_results(self, console, destinations, started, idle=None):
+        """在测试预计结束的时刻取回所有结果，未结束的实例再等待一小段时间后只重查它们。
+
+        idle 为返回异步上下文管理器的函数时，等待期间在其中让出并发名额，其它路由器可以同时开始测试。
+        """
+        loop = asyncio.get_running_loop()
+        pending = set(range(len(destinations)))
+        results = {}
+        wake_at = started + self.test_duration()
+        while pending:
+            delay = wake_at - loop.time()
+            if console.deadline is not None and console.deadline.remaining() <= max(delay, 0):
+                print(f"Deadline reached on {console.sysname}. {len(pending)} tests may be incomplete.")
+                break
+            if delay > 0:
+                if idle is not None:
+                    async with idle():
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(delay)
+
+            order = sorted(pending)
+            outputs = await console.send_pipelined(
+                [f'display nqa results test-instance {CAMPAIGN_ADMIN} t{k}' for k in order])
+            for k, output in zip(order, outputs):
+                if "The test is finished" in output:
+                    results[k] = output
+                    pending.discard(k)
+            # 仍在运行的实例通常只差最后一个探测包，按一个探测间隔再查一次
+            wake_at = loop.time() + max(self.interval / 1000.0, 0.1)
+
+        for k in pending:
+            results[k] = ""
+        return results
+
+    async def stop_tests(self, console, destinations):
+        commands = ['system-view']
+        commands += [f'undo nqa test-instance {CAMPAIGN_ADMIN} t{k}' for k in range(len(destinations))]
+        commands += ['commit', 'return']
+        await console.send_pipelined(commands)
+
+    async def run_campaign_async(self, host, port, slot=None, deadline=None):
+        """对单台路由器执行全部测试，返回 (sysname, {目的地址: 性能指标})"""
+        console = AsyncConsole(host, port, deadline=deadline)
+        started = None
+        destinations = []
+        try:
+            sysname = await console.connect()
+            print(f"Sysname for {host}:{port} is {sysname}")
+
+            # 流水线发送要求关闭分页
+            await console.send('scr 0 t')
+            start = time.monotonic()
+            routing_output = await console.send('display ip routing-table')
+            if slot:
+                slot.observe(time.monotonic() - start)
+            destinations = self.parse_destinations(routing_output)
+            if not destinations:
+                print(f"No OSPF/BGP route found on {sysname}")
+                return sysname, {}
+
+            started = await self.start_tests(console, destinations)
+            # 测试在设备上运行期间不占用并发名额，否则全网测量会按并发上限分批进行
+            idle = (lambda: self.governor.idle(host)) if slot else None
+            outputs = await self.collect_results(console, destinations, started, idle)
+            metrics = {}
+            for k, dest_ip in enumerate(destinations):
+                metrics[dest_ip] = self.parse_nqa_result(outputs[k]) if outputs[k] else None
+            return sysname, metrics
+        except Exception as e:
+            print(f"Error during NQA campaign on {host}:{port} - {e}")
+            return console.sysname, {}
+        finally:
+            if started is not None:
+                try:
+                    await self.stop_tests(console, destinations)
+                except Exception as e:
+                    print(f"Failed to remove NQA campaign instances on {host}:{port} - {e}")
+            await console.close()
+
+    async def process_router_async(self, node, action=None):
+        """在并发名额和设备预算内对单台路由器执行 action(host, port, slot, deadline)，默认为全网测量"""
+        action = action or self.run_campaign_async
+        host = node.get("hostip")
+        port = node.get("port")
+        result_data = {"host": host, "port": port, "sysname": None, "metrics": {}}
+
+        if not host or not port:
+            print(f"无效的节点配置: {node}")
+            return result_data
+
+        if not self.admit(result_data):
+            return result_data
+
+        async with self.governor.slot(host) as slot:
+            deadline = self.device_deadline()
+            if deadline.expired():
+                return self.skip_result(result_data, "作业时间预算已用完，未处理该设备。")
+            sysname, metrics = await action(host, port, slot, deadline)
+            if not sysname:
+                slot.fail()
+        self.settle(result_data, sysname)
+        result_data["sysname"] = sysname
+        result_data["metrics"] = metrics
+        return result_data
+
+    def run(self):
+        """并发对所有路由器执行测试，返回按 源 sysname × 目的地址 排列的矩阵"""
+        nodes = self.telnet_info.get("node", [])
+        if not nodes:
+            print("没有找到任何节点配置。")
+            return None
+
+        # 每台路由器只有一个会话，AIMD 要等会话结束才有样本，从默认的 4 慢启动会让全网测量分批进行；
+        # 从 max_sessions 开始，仍会在出错或延迟升高时退避
+        self.governor = AsyncConcurrencyGovernor(initial=self.max_sessions, max_limit=self.max_sessions)
+        details = {}
+        for outcome in self.run_all(nodes, self.run_campaign_async):
+            if outcome.get("sysname"):
+                details[outcome["sysname"]] = outcome["metrics"]
+        return self.build_matrix(details)
+
+    def run_all(self, nodes, action):
+        """在一个事件循环中并发对 nodes 执行 action，返回成功处理的结果字典列表"""
+        raise_nofile_limit(self.max_sessions + 64)
+        self.job_deadline = Deadline(self.job_timeout) if self.job_timeout else None
+        outcomes = asyncio.run(run_bounded(nodes, lambda node: self.process_router_async(node, action), self.max_sessions))
+        self.governor.report()
+        if self.breaker:
+            self.breaker.save()
+
+        results = []
+        for node, outcome in zip(nodes, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"处理节点 {node} 时发生错误: {outcome}")
+            else:
+                results.append(outcome)
+        return results
+
+    def build_matrix(self, details, fresh=None):
+        """fresh 为 {源: {目的地址: 性能指标}} 时只把其中的结果写入时间序列存储，默认为 details 的全部结果"""
+        sources = sorted(details)
+        destinations = sorted({dest for metrics in details.values() for dest in metrics},
+                              key=lambda ip: tuple(int(part) for part in ip.split('.')))
+        column = {dest: j for j, dest in enumerate(destinations)}
+        matrix = {"sources": sources, "destinations": destinations}
+        for name in ("latency", "jitter", "packet_loss"):
+            rows = []
+            for source in sources:
+                row = [None] * len(destinations)
+                for dest, metrics in details[source].items():
+                    if metrics:
+                        row[column[dest]] = metrics[name]
+                rows.append(row)
+            matrix[name] = rows
+        matrix["details"] = details
+        if self.store is not None:
+            matrix["anomalies"] = self.record_details(details if fresh is None else fresh)
+        return matrix
+
+    def record_details(self, details):
+        """把每个 源 -> 目的地址 的测量结果追加到时间序列存储，返回 {源: {目的地址: {指标: 异常描述}}}，只含出现异常的条目"""
+        anomalies = {}
+        timestamp = time.time()
+        for source, destinations in details.items():
+            for dest, metrics in destinations.items():
+                if not metrics:
+                    continue
+                try:
+                    found = self.store.append(source, dest, metrics, timestamp)
+                except Exception as e:
+                    print(f"无法保存 {source} -> {dest} 的测量结果: {e}")
+                    continue
+                if found:
+                    anomalies.setdefault(source, {})[dest] = found
+                    print(f"{source} -> {dest} 与历史基线相比出现劣化: {', '.join(found)}")
+        return anomalies
+
+
+class NqaSchedule(NqaCampaign):
+    """常驻 NQA 测试实例：每个实验只部署一次带 frequency 的测试实例，由设备按周期自行测量。
+
+    provision 按路由表部署实例并把 host:port -> 目的地址 记录到状态文件；
+    harvest 只登录设备批量读取每个实例最近一次完成的结果，不修改任何配置，也无需等待测试；
+    teardown 删除状态文件中记录的实例。
+    """
+
+    def __init__(self, telnet_info, frequency=60, state_dir=DEFAULT_STATE_DIR, **kwargs):
+        super().__init__(telnet_info, **kwargs)
+        self.frequency = frequency  # 秒
+        lab_id = telnet_info.get("labId", "default")
+        self.state_path = os.path.join(state_dir, f"{lab_id}.json")
+        self.state = self.load_state()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def undo_commands(self, host, port):
+        """删除该设备上次部署的实例的命令"""
+        entry = self.state.get(f"{host}:{port}")
+        if not entry:
+            return []
+        return [f'undo nqa test-instance {SCHEDULE_ADMIN} t{k}' for k in range(len(entry["destinations"]))]
+
+    async def provision_async(self, host, port, slot=None, deadline=None):
+        """部署常驻测试实例，已部署过的设备先删除旧实例，全部配置在一次流水线写入和一个 commit 中完成"""
+        console = AsyncConsole(host, port, deadline=deadline)
+        try:
+            sysname = await console.connect()
+            await console.send('scr 0 t')
+            start = time.monotonic()
+            routing_output = await console.send('display ip routing-table')
+            if slot:
+                slot.observe(time.monotonic() - start)
+            destinations = self.parse_destinations(routing_output)
+
+            commands = self.undo_commands(host, port)
+            for k, dest_ip in enumerate(destinations):
+                commands += [
+                    f'nqa test-instance {SCHEDULE_ADMIN} t{k}',
+                    'test-type icmpjitter',
+                    f'destination-address ipv4 {dest_ip}',
+                    f'probe-count {self.probe_count}',
+                    f'interval milliseconds {self.interval}',
+                    f'timeout {self.probe_timeout}',
+                    f'frequency {self.frequency}',
+                    'start now',
+                    'q',
+                ]
+            await self.apply_or_raise(console, commands)
+            self.state[f"{host}:{port}"] = {"sysname": sysname, "destinations": destinations}
+            print(f"Provisioned {len(destinations)} NQA instances on {sysname}")
+            return sysname, {dest_ip: None for dest_ip in destinations}
+        except Exception as e:
+            print(f"Error provisioning NQA instances on {host}:{port} - {e}")
+            return console.sysname, {}
+        finally:
+            await console.close()
+
+    async def harvest_async(self, host, port, slot=None, deadline=None):
+        """只读：批量读取各实例最近一次完成的测试结果。
+
+        每个实例上次取回的测试序号记录在状态文件中，序号没有变化的结果（上次之后还没有完成新的测试）
+        仍出现在矩阵中，但不记入 self.fresh，不会被重复写入时间序列存储。
+        """
+        entry = self.state[f"{host}:{port}"]
+        destinations = entry["destinations"]
+        harvested = entry.setdefault("harvested", {})
+        console = AsyncConsole(host, port, deadline=deadline)
+        try:
+            sysname = await console.connect()
+            await console.send('scr 0 t')
+            start = time.monotonic()
+            outputs = await console.send_pipelined(
+                [f'display nqa results test-instance {SCHEDULE_ADMIN} t{k}' for k in range(len(destinations))])
+            if slot:
+                slot.observe(time.monotonic() - start)
+            metrics = {}
+            fresh = {}
+            for dest_ip, output in zip(destinations, outputs):
+                number, latest = latest_finished_result(output)
+                metrics[dest_ip] = self.parse_nqa_result(latest) if latest else None
+                if latest and harvested.get(dest_ip) != number:
+                    fresh[dest_ip] = metrics[dest_ip]
+                    harvested[dest_ip] = number
+            self.fresh[sysname] = fresh
+            return sysname, metrics
+        except Exception as e:
+            print(f"Error harvesting NQA results on {host}:{port} - {e}")
+            return console.sysname, {}
+        finally:
+            await console.close()
+
+    async def teardown_async(self, host, port, slot=None, deadline=None):
+        console = AsyncConsole(host, port, deadline=deadline)
+        try:
+            sysname = await console.connect()
+            await console.send('scr 0 t')
+            await self.apply_or_raise(console, self.undo_commands(host, port))
+            self.state.pop(f"{host}:{port}", None)
+            print(f"Removed NQA instances on {sysname}")
+            return sysname, {}
+        except Exception as e:
+            print(f"Error removing NQA instances on {host}:{port} - {e}")
+            return console.sysname, {}
+        finally:
+            await console.close()
+
+    def deployed_nodes(self):
+        nodes = []
+        for node in self.telnet_info.get("node", []):
+            if f"{node.get('hostip')}:{node.get('port')}" in self.state:
+                nodes.append(node)
+            else:
+                print(f"{node.get('hostip')}:{node.get('port')} 未部署常驻 NQA 实例，跳过")
+        return nodes
+
+    def provision(self):
+        nodes = self.telnet_info.get("node", [])
+        results = self.run_all(nodes, self.provision_async)
+        self.save_state()
+        return {result["sysname"]: list(result["metrics"]) for result in results if result.get("sysname")}
+
+    def harvest(self):
+        details = {}
+        self.fresh = {}
+        for result in self.run_all(self.deployed_nodes(), self.harvest_async):
+            if result.get("sysname"):
+                details[result["sysname"]] = result["metrics"]
+        self.save_state()
+        return self.build_matrix(details, self.fresh)
+
+    def teardown(self):
+        results = self.run_all(self.deployed_nodes(), self.teardown_async)
+        self.save_state()
+        return {result["sysname"]: [] for result in results if result.get("sysname")}
+
+
+def latest_finished_result(output):
+    """display nqa results 按测试序号列出历史记录，返回最后一个已完成的测试的 (测试序号, 结果段)，没有时为 (None, None)"""
+    latest = (None, None)
+    parts = TEST_RESULT_PATTERN.split(output)
+    for number, block in zip(parts[1::2], parts[2::2]):
+        if "The test is finished" in block:
+            latest = (int(number), block)
+    return latest
+
+
+def main(input_path, output_path, mode="campaign", probe_count=5, interval=100, max_tests=50, frequency=60,
+         max_sessions=1000, device_timeout=120, job_timeout=600, store_dir=DEFAULT_STORE_DIR):
+    base_path = "/uploadPath/reasoning"
+    if "{t}" in input_path or "{t}" in output_path:
+        latest_folder = find_latest_folder(base_path)
+        input_path = input_path.replace("{t}", latest_folder)
+        output_path = output_path.replace("{t}", latest_folder)
+
+    try:
+        with open(input_path, 'r') as f:
+            telnet_info = json.load(f)
+    except Exception as e:
+        print(f"无法加载输入 JSON 文件 '{input_path}': {e}")
+        return
+
+    options = dict(probe_count=probe_count, interval=interval, max_tests=max_tests, max_sessions=max_sessions,
+                   device_timeout=device_timeout, job_timeout=job_timeout, breaker=CircuitBreaker(),
+                   store=NqaStore(store_dir) if store_dir else None)
+    start = time.monotonic()
+    if mode == "campaign":
+        result = NqaCampaign(telnet_info, **options).run()
+    else:
+        schedule = NqaSchedule(telnet_info, frequency=frequency, **options)
+        result = getattr(schedule, mode)()
+    if result is None:
+        return
+    if "sources" in result:
+        print(f"NQA 测量完成：{len(result['sources'])} 台路由器，{len(result['destinations'])} 个目的地址，"
+              f"耗时 {time.monotonic() - start:.1f} 秒")
+    else:
+        print(f"NQA 实例 {mode} 完成：{len(result)} 台路由器，耗时 {time.monotonic() - start:.1f} 秒")
+
+    try:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(result, indent=4, ensure_ascii=False))
+        print(f"结果已写入 {output_path}")
+    except Exception as e:
+        print(f"无法写入输出 JSON 文件 '{output_path}': {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在所有路由器上同时向全部 OSPF/BGP 目的地址发起 NQA 测试，输出时延/抖动/丢包矩阵。")
+    parser.add_argument("-i", "--input", required=True, help="param.json 的路径，使用 {t} 表示最新的文件夹编号。")
+    parser.add_argument("-o", "--output", required=True, help="输出路径，用于存储测量矩阵或实例部署结果，使用 {t} 表示最新的文件夹编号。")
+    parser.add_argument("--mode", choices=["campaign", "provision", "harvest", "teardown"], default="campaign",
+                        help="campaign 为一次性全网测量；provision 部署带 frequency 的常驻实例；"
+                             "harvest 只读取常驻实例的最新结果；teardown 删除常驻实例（默认为 campaign）。")
+    parser.add_argument("--frequency", type=int, default=60, help="常驻实例的测试周期（秒，默认为 60）。")
+    parser.add_argument("--probe-count", type=int, default=5, help="每个测试实例的探测包数（默认为 5）。")
+    parser.add_argument("--interval", type=int, default=100, help="探测包间隔（毫秒，默认为 100）。")
+    parser.add_argument("--max-tests", type=int, default=50, help="每台路由器最多同时运行的测试实例数（默认为 50）。")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="最大并发会话数（默认为 1000）。")
+    parser.add_argument("--device-timeout", type=int, default=120, help="单台设备的时间预算（秒，默认为 120）。")
+    parser.add_argument("--job-timeout", type=int, default=600, help="整个作业的时间预算（秒，默认为 600，0 表示不限制）。")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help=f"NQA 时间序列存储目录（默认为 {DEFAULT_STORE_DIR}，也可通过 NET_TWIN_NQA_STORE 设置）。")
+    parser.add_argument("--no-store", action="store_true", help="不保存测量结果，也不进行基于历史的异常检测。")
+    args = parser.parse_args()
+
+    main(args.input, args.output, mode=args.mode, probe_count=args.probe_count, interval=args.interval,
+         max_tests=args.max_tests, frequency=args.frequency, max_sessions=args.max_sessions, device_timeout=args.device_timeout, job_timeout=args.job_timeout,
+         store_dir=None if args.no_store else args.store_dir)
@@ -1,70 +1,65 @@
 import json
-import telnetlib
 import os
+import sys
+import time
+import asyncio
 import argparse
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.async_console import AsyncConsole, raise_nofile_limit, run_bounded
+from common.config_apply import apply_config
+from common.console_session import open_session
+from common.deadline import CircuitBreaker, Deadline
+from common.governor import AsyncConcurrencyGovernor, get_governor
+from common.nqa_store import DEFAULT_STORE_DIR, NqaStore
+
 class RouterTelnetManager:
-    def __init__(self, telnet_info, max_threads=10):
+    def __init__(self, telnet_info, max_threads=10, device_timeout=120, job_timeout=600, breaker=None, store=None):
         self.telnet_info = telnet_info
         self.sysnames = {}
         self.ospf_routes = {}
         self.max_threads = max_threads  # 最大并发线程数
-
-    def get_sysname_and_routing_table(self, host, port):
-        """通过 Telnet 获取节点的 sysname 和 OSPF 路由表信息"""
+        # 所有设备通常在同一台 EVE-NG 主机后面，按控制台主机自适应调整实际并发数，max_threads 为上限
+        self.governor = get_governor(max_limit=max_threads)
+        self.device_timeout = device_timeout  # 单台设备的时间预算（秒）
+        self.job_timeout = job_timeout  # 整个作业的时间预算（秒），0 表示不限制
+        self.job_deadline = None
+        self.breaker = breaker  # 连续超时的设备直接跳过
+        self.store = store  # NqaStore，每次的测量结果追加到时间序列中并与历史基线比较
+
+    def get_sysname_and_routing_table(self, host, port, slot=None, deadline=None):
+        """通过 Telnet 获取节点的 sysname 和 OSPF 路由表信息，slot 用于向并发控制器报告命令延迟。
+
+        所有命令都限制在 deadline 的剩余时间内，超时后返回已经得到的部分结果。
+        """
+        sysname = None
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-
-            # 发送一个空命令（如回车字符 '\n'），以确保接收到提示符
-            tn.write(b'\n')
-
-            sysname = None
-            ospf_ip = None
-            nqa_result = None
-            while True:
-                output = tn.read_until(b'>', timeout=5)
-                if not output:
-                    break
-                lines = output.decode('ascii', errors='ignore').splitlines()
-
-                # 检查 sysname
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('[') and line.endswith(']'):
-                        tn.write(b'q\n')
-                    elif line.startswith('<') and line.endswith('>'):
-                        sysname = line.strip('<> ')
-                        break
-
-                if sysname:
-                    print(f"Sysname for {host}:{port} is {sysname}")
-
-                    # 发送 scr 0 t 指令以确保可以正确输出路由表
-                    tn.write(b'scr 0 t\n')
-                    tn.read_until(b'>', timeout=3)
-
-                    # 发送命令获取路由表
-                    tn.write(b'display ip routing-table\n')
-                    routing_output = tn.read_until(b'>', timeout=5).decode('ascii', errors='ignore')
-                    ospf_ip = self.parse_routing_table(routing_output)
-
-                    if ospf_ip:
-                        # 配置并执行 NQA 测试
-                        nqa_result = self.perform_nqa_test(tn, ospf_ip)
-                        tn.close()
-                        return sysname, ospf_ip, nqa_result
-                    else:
-                        tn.close()
-                        return sysname, None, None
-
-                else:
-                    print(f"Waiting for correct prompt from {host}:{port}...")
+            # broker 在运行时复用其已登录的会话；会话打开时已同步到用户视图的真实提示符
+            with open_session(host, port, deadline=deadline) as session:
+                sysname = session.sysname
+                print(f"Sysname for {host}:{port} is {sysname}")
+
+                # 发送 scr 0 t 指令以确保可以正确输出路由表
+                session.execute('scr 0 t')
+
+                # 发送命令获取路由表，设备输出完毕即返回
+                start = time.monotonic()
+                routing_output = session.execute('display ip routing-table')
+                if slot:
+                    slot.observe(time.monotonic() - start)
+                ospf_ip = self.parse_routing_table(routing_output)
+
+                if ospf_ip:
+                    # 配置并执行 NQA 测试
+                    nqa_result = self.perform_nqa_test(session, ospf_ip, deadline=deadline)
+                    return sysname, ospf_ip, nqa_result
+                return sysname, None, None
 
         except Exception as e:
             print(f"Error connecting to {host}:{port} - {e}")
-            return None, None, None
+            return sysname, None, None
 
     def parse_routing_table(self, routing_table):
         """解析路由表，找到第一次出现 OSPF 的目的地址，并去掉子网掩码"""
@@ -79,40 +74,36 @@ class RouterTelnetManager:
         print("No OSPF route found")
         return None
 
-    def perform_nqa_test(self, tn, dest_ip, max_attempts=5):
-        """配置并执行 NQA 测试，最多尝试 max_attempts 次获取 NQA 测试结果，返回性能指标"""
+    def perform_nqa_test(self, session, dest_ip, max_attempts=5, poll_interval=1, deadline=None):
+        """配置并执行 NQA 测试，最多尝试 max_attempts 次获取 NQA 测试结果，返回性能指标；
+        deadline 剩余时间不足以再等待一轮时停止查询，按已有结果解析"""
         try:
             # 进入 system-view 模式
-            tn.write(b'system-view\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('system-view')
 
-            # 配置 NQA 测试实例
+            # 配置 NQA 测试实例，每条命令在提示符返回后立即发送下一条
             nqa_commands = [
-                b'nqa test-instance admin perfor_test\n',
-                b'test-type icmpjitter\n',
-                f'destination-address ipv4 {dest_ip}\n'.encode('ascii'),
-                b'probe-count 2\n',
-                b'interval milliseconds 100\n',
-                b'timeout 1\n'
+                'nqa test-instance admin perfor_test',
+                'test-type icmpjitter',
+                f'destination-address ipv4 {dest_ip}',
+                'probe-count 2',
+                'interval milliseconds 100',
+                'timeout 1'
             ]
             for cmd in nqa_commands:
-                tn.write(cmd)
-                tn.read_until(b']', timeout=3)
+                session.execute(cmd)
 
             # 发送命令开始测试
-            tn.write(b'start now\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('start now')
 
             # 确保配置提交
-            tn.write(b'commit\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('commit')
 
             # 尝试获取 NQA 测试结果
             attempt_count = 0
             result = ""
             while attempt_count < max_attempts:
-                tn.write(b'display nqa results test-instance admin perfor_test\n')
-                partial_output = tn.read_until(b'>', timeout=5).decode('ascii')
+                partial_output = session.execute('display nqa results test-instance admin perfor_test')
                 result += partial_output
 
                 if "The test is finished" in partial_output:
@@ -126,22 +117,23 @@ class RouterTelnetManager:
                     print(f"Max attempts reached for {dest_ip}. Test result may be incomplete.")
                     break
 
+                if deadline is not None and deadline.remaining() <= poll_interval:
+                    print(f"Deadline reached for {dest_ip}. Test result may be incomplete.")
+                    break
+
+                # 读取不再等待固定超时，测试未完成时主动间隔一段时间再查询
+                time.sleep(poll_interval)
+
             # 记录并返回结果
             print(f"NQA Test Result for {dest_ip}:")
             print(result)
 
             # 执行结束和清理命令
-            tn.write(b'stop\n')
-            tn.read_until(b'>', timeout=3)
-
-            tn.write(b'q\n')
-            tn.read_until(b'>', timeout=3)
-
-            tn.write(b'undo nqa test-instance admin perfor_test\n')
-            tn.read_until(b']', timeout=3)
-
-            tn.write(b'commit\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('stop')
+            session.execute('q')
+            session.execute('undo nqa test-instance admin perfor_test')
+            session.execute('commit')
+            session.execute('return')
 
             # 解析并返回性能评估输入
             metrics = self.parse_nqa_result(result)
@@ -313,14 +305,63 @@ class RouterTelnetManager:
         """处理单个路由器的连接和测试，返回结果字典。"""
         host = node.get("hostip")
         port = node.get("port")
-        result_data = {"host": host, "port": port, "sysname": None, "ospf_ip": None, "nqa_result": None, "performance_evaluation": None, "performance_summary": None}
+        result_data = self.new_result(host, port)
 
         if not host or not port:
             print(f"无效的节点配置: {node}")
             result_data["performance_summary"] = "无效的节点配置。"
             return result_data
 
-        sysname, ospf_ip, nqa_result = self.get_sysname_and_routing_table(host, port)
+        if not self.admit(result_data):
+            return result_data
+
+        with self.governor.slot(host) as slot:
+            deadline = self.device_deadline()
+            if deadline.expired():
+                return self.skip_result(result_data, "作业时间预算已用完，未处理该设备。")
+            sysname, ospf_ip, nqa_result = self.get_sysname_and_routing_table(host, port, slot, deadline)
+            if not sysname:
+                slot.fail()
+        self.settle(result_data, sysname)
+        return self.build_result(result_data, sysname, ospf_ip, nqa_result)
+
+    def device_deadline(self):
+        """从作业预算中切出单台设备的预算"""
+        if self.job_deadline is None:
+            return Deadline(self.device_timeout)
+        return self.job_deadline.child(self.device_timeout)
+
+    def admit(self, result_data):
+        """熔断中的设备直接跳过，返回 False"""
+        key = f"{result_data['host']}:{result_data['port']}"
+        if self.breaker is None or self.breaker.allow(key):
+            return True
+        print(f"{key} 连续超时，熔断中，跳过该设备")
+        self.skip_result(result_data, "设备连续超时，已暂时跳过。")
+        return False
+
+    def settle(self, result_data, sysname):
+        """记录设备本次是否可达；作业预算耗尽导致的失败不计入熔断"""
+        if self.breaker is None:
+            return
+        key = f"{result_data['host']}:{result_data['port']}"
+        if sysname:
+            self.breaker.record_success(key)
+        elif self.job_deadline is None or not self.job_deadline.expired():
+            self.breaker.record_failure(key)
+
+    def skip_result(self, result_data, summary):
+        print(f"{result_data['host']}:{result_data['port']} - {summary}")
+        result_data["performance_summary"] = summary
+        return result_data
+
+    def new_result(self, host, port):
+        return {"host": host, "port": port, "sysname": None, "ospf_ip": None, "nqa_result": None, "performance_evaluation": None, "performance_summary": None}
+
+    def build_result(self, result_data, sysname, ospf_ip, nqa_result):
+        """根据 sysname、OSPF 路由和 NQA 结果填充结果字典并进行性能评估。"""
+        host = result_data["host"]
+        port = result_data["port"]
         if sysname:
             self.sysnames[f"{host}:{port}"] = sysname
             print(f"已连接到 {host}:{port} - Sysname: {sysname}")
@@ -339,6 +380,7 @@ class RouterTelnetManager:
                 result_data["nqa_result"] = performance_metrics
                 result_data["performance_evaluation"] = evaluation
                 result_data["performance_summary"] = summary
+                self.record_measurement(result_data, sysname, ospf_ip, performance_metrics)
             else:
                 result_data["ospf_ip"] = ospf_ip if ospf_ip else None
                 result_data["nqa_result"] = nqa_result if nqa_result else None
@@ -355,6 +397,22 @@ class RouterTelnetManager:
 
         return result_data
 
+    def record_measurement(self, result_data, sysname, dest_ip, metrics):
+        """把测量结果追加到时间序列存储，与历史基线相比明显变差的指标记录在 anomalies 中并追加到性能评价"""
+        if self.store is None:
+            return
+        try:
+            anomalies = self.store.append(sysname, dest_ip, metrics)
+        except Exception as e:
+            print(f"无法保存 {sysname} -> {dest_ip} 的测量结果: {e}")
+            return
+        result_data["anomalies"] = anomalies
+        if anomalies:
+            names = {"latency": "时延", "jitter": "抖动", "packet_loss": "丢包率"}
+            details = "，".join(f"{names[name]} {anomaly['value']}（基线 {anomaly['expected']}）" for name, anomaly in anomalies.items())
+            print(f"{sysname} -> {dest_ip} 与历史基线相比出现劣化: {details}")
+            result_data["performance_summary"] += f"与历史基线相比出现劣化：{details}。"
+
     def connect_and_get_sysnames_routes_and_nqa(self):
         """通过 Telnet 连接每个路由器，检索 sysname、OSPF 路由，执行 NQA 测试，并评估网络性能。"""
         results = []
@@ -363,6 +421,8 @@ class RouterTelnetManager:
             print("没有找到任何节点配置。")
             return results
 
+        # 每台设备的预算都从作业预算中切出，作业总耗时因此有上限
+        self.job_deadline = Deadline(self.job_timeout) if self.job_timeout else None
         with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
             # 提交所有路由器的处理任务
             future_to_node = {executor.submit(self.process_router, node): node for node in nodes}
@@ -383,6 +443,142 @@ class RouterTelnetManager:
                         "performance_summary": "处理过程中发生错误。"
                     })
 
+        self.governor.report()
+        if self.breaker:
+            self.breaker.save()
+        return results
+
+
+class AsyncRouterTelnetManager(RouterTelnetManager):
+    """基于 asyncio 的采集引擎，在一个事件循环内同时驱动大量 Telnet 会话，结果格式与线程版一致。"""
+
+    def __init__(self, telnet_info, max_sessions=1000, nqa_poll_interval=1, device_timeout=120, job_timeout=600, breaker=None, store=None):
+        super().__init__(telnet_info, device_timeout=device_timeout, job_timeout=job_timeout, breaker=breaker, store=store)
+        self.max_sessions = max_sessions  # 最大并发会话数
+        self.governor = AsyncConcurrencyGovernor(max_limit=max_sessions)
+        self.nqa_poll_interval = nqa_poll_interval
+
+    async def get_sysname_and_routing_table_async(self, host, port, slot=None, deadline=None):
+        """通过异步 Telnet 获取节点的 sysname 和 OSPF 路由表信息，并执行 NQA 测试"""
+        console = AsyncConsole(host, port, deadline=deadline)
+        try:
+            sysname = await console.connect()
+            print(f"Sysname for {host}:{port} is {sysname}")
+
+            # 发送 scr 0 t 指令以确保可以正确输出路由表
+            await console.send('scr 0 t')
+            start = time.monotonic()
+            routing_output = await console.send('display ip routing-table')
+            if slot:
+                slot.observe(time.monotonic() - start)
+            ospf_ip = self.parse_routing_table(routing_output)
+            if not ospf_ip:
+                return sysname, None, None
+
+            nqa_result = await self.perform_nqa_test_async(console, ospf_ip)
+            return sysname, ospf_ip, nqa_result
+        except Exception as e:
+            print(f"Error connecting to {host}:{port} - {e}")
+            return console.sysname, None, None
+        finally:
+            await console.close()
+
+    async def perform_nqa_test_async(self, console, dest_ip, max_attempts=5):
+        """异步配置并执行 NQA 测试，测试实例的配置一次推送、一次 commit，结果按提示符返回，不再依赖固定超时"""
+        try:
+            nqa_commands = [
+                'nqa test-instance admin perfor_test',
+                'test-type icmpjitter',
+                f'destination-address ipv4 {dest_ip}',
+                'probe-count 2',
+                'interval milliseconds 100',
+                'timeout 1',
+                'start now',
+                'q'
+            ]
+            committed, errors = await apply_config(console, nqa_commands)
+            if not committed:
+                print(f"Failed to configure NQA test for {dest_ip}: {errors}")
+                return None
+
+            result = ""
+            for attempt_count in range(1, max_attempts + 1):
+                partial_output = await console.send('display nqa results test-instance admin perfor_test')
+                result += partial_output
+                if "The test is finished" in partial_output:
+                    print(f"NQA test finished for {dest_ip} on attempt {attempt_count}")
+                    break
+                print(f"Attempt {attempt_count}/{max_attempts} for NQA result on {dest_ip}...")
+                if console.deadline is not None and console.deadline.remaining() <= self.nqa_poll_interval:
+                    print(f"Deadline reached for {dest_ip}. Test result may be incomplete.")
+                    break
+                await asyncio.sleep(self.nqa_poll_interval)
+            else:
+                print(f"Max attempts reached for {dest_ip}. Test result may be incomplete.")
+
+            print(f"NQA Test Result for {dest_ip}:")
+            print(result)
+
+            # 删除测试实例
+            await apply_config(console, ['undo nqa test-instance admin perfor_test'])
+
+            metrics = self.parse_nqa_result(result)
+            if metrics is None:
+                print(f"Failed to parse NQA results for {dest_ip}.")
+            return metrics
+
+        except Exception as e:
+            print(f"Error during NQA test - {e}")
+            return None
+
+    async def process_router_async(self, node):
+        """异步处理单个路由器，返回与 process_router 相同的结果字典。"""
+        host = node.get("hostip")
+        port = node.get("port")
+        result_data = self.new_result(host, port)
+
+        if not host or not port:
+            print(f"无效的节点配置: {node}")
+            result_data["performance_summary"] = "无效的节点配置。"
+            return result_data
+
+        if not self.admit(result_data):
+            return result_data
+
+        async with self.governor.slot(host) as slot:
+            deadline = self.device_deadline()
+            if deadline.expired():
+                return self.skip_result(result_data, "作业时间预算已用完，未处理该设备。")
+            sysname, ospf_ip, nqa_result = await self.get_sysname_and_routing_table_async(host, port, slot, deadline)
+            if not sysname:
+                slot.fail()
+        self.settle(result_data, sysname)
+        return self.build_result(result_data, sysname, ospf_ip, nqa_result)
+
+    def connect_and_get_sysnames_routes_and_nqa(self):
+        """在单个事件循环中并发连接所有路由器，检索 sysname、OSPF 路由，执行 NQA 测试，并评估网络性能。"""
+        nodes = self.telnet_info.get("node", [])
+        if not nodes:
+            print("没有找到任何节点配置。")
+            return []
+
+        # 每个会话占用一个文件描述符，预留一部分给输出文件等
+        raise_nofile_limit(self.max_sessions + 64)
+        self.job_deadline = Deadline(self.job_timeout) if self.job_timeout else None
+        outcomes = asyncio.run(run_bounded(nodes, self.process_router_async, self.max_sessions))
+
+        results = []
+        for node, outcome in zip(nodes, outcomes):
+            if isinstance(outcome, BaseException):
+                print(f"处理节点 {node} 时发生错误: {outcome}")
+                result_data = self.new_result(node.get("hostip"), node.get("port"))
+                result_data["performance_summary"] = "处理过程中发生错误。"
+                results.append(result_data)
+            else:
+                results.append(outcome)
+        self.governor.report()
+        if self.breaker:
+            self.breaker.save()
         return results
 
 def find_latest_folder(base_path):
@@ -393,7 +589,8 @@ def find_latest_folder(base_path):
     latest_folder = max(all_folders, key=int)
     return latest_folder
 
-def main(input_path, output_path, max_threads=10):
+def main(input_path, output_path, max_threads=10, engine="thread", max_sessions=1000, device_timeout=120, job_timeout=600,
+         store_dir=DEFAULT_STORE_DIR):
     # 如果使用 {t}，则解析最新的文件夹编号
     base_path = "/uploadPath/reasoning"
     if "{t}" in input_path or "{t}" in output_path:
@@ -410,7 +607,14 @@ def main(input_path, output_path, max_threads=10):
         return
 
     # 管理 Telnet 连接
-    telnet_manager = RouterTelnetManager(telnet_info, max_threads=max_threads)
+    breaker = CircuitBreaker()
+    store = NqaStore(store_dir) if store_dir else None
+    if engine == "asyncio":
+        telnet_manager = AsyncRouterTelnetManager(telnet_info, max_sessions=max_sessions, device_timeout=device_timeout,
+                                                  job_timeout=job_timeout, breaker=breaker, store=store)
+    else:
+        telnet_manager = RouterTelnetManager(telnet_info, max_threads=max_threads, device_timeout=device_timeout,
+                                             job_timeout=job_timeout, breaker=breaker, store=store)
     results = telnet_manager.connect_and_get_sysnames_routes_and_nqa()
 
     # 输出结果到文件
@@ -426,7 +630,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="通过 Telnet 从路由器检索 sysname、OSPF 路由，并执行 NQA 测试以评估网络性能。")
     parser.add_argument("-i", "--input", required=True, help="param.json 的路径，使用 {t} 表示最新的文件夹编号。")
     parser.add_argument("-o", "--output", required=True, help="输出路径，用于存储处理信息，使用 {t} 表示最新的文件夹编号。")
-    parser.add_argument("--max-threads", type=int, default=10, help="最大并发线程数（默认为 10）。")
+    parser.add_argument("--max-threads", type=int, default=10, help="最大并发线程数（默认为 10），每个控制台主机的实际并发数在此范围内自适应调整。")
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default="thread", help="采集引擎：thread 为线程池，asyncio 为单事件循环（默认为 thread）。")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="asyncio 引擎的最大并发会话数（默认为 1000），每个控制台主机的实际并发数在此范围内自适应调整。")
+    parser.add_argument("--device-timeout", type=int, default=120, help="单台设备的时间预算（秒，默认为 120），超时后输出已得到的部分结果。")
+    parser.add_argument("--job-timeout", type=int, default=600, help="整个作业的时间预算（秒，默认为 600，0 表示不限制）。")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help=f"NQA 时间序列存储目录（默认为 {DEFAULT_STORE_DIR}，也可通过 NET_TWIN_NQA_STORE 设置）。")
+    parser.add_argument("--no-store", action="store_true", help="不保存测量结果，也不进行基于历史的异常检测。")
     args = parser.parse_args()
 
-    main(args.input, args.output, max_threads=args.max_threads)
+    main(args.input, args.output, max_threads=args.max_threads, engine=args.engine, max_sessions=args.max_sessions,
+         device_timeout=args.device_timeout, job_timeout=args.job_timeout, store_dir=None if args.no_store else args.store_dir)
@@ -1,9 +1,13 @@
 import json
-import telnetlib
 import os
+import sys
+import time
 import argparse
 import re
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.console_session import open_session
+
 
 class RouterTelnetManager:
     def __init__(self, telnet_info):
@@ -14,50 +18,23 @@ class RouterTelnetManager:
     def get_sysname_and_routing_table(self, host, port):
         """通过 Telnet 获取节点的 sysname 和 OSPF 路由表信息"""
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-
-            # 发送一个空命令（如回车字符 '\n'），以确保接收到提示符
-            tn.write(b'\n')
-
-            sysname = None
-            ospf_ip = None
-            nqa_result = None
-            while True:
-                output = tn.read_until(b'>', timeout=5)
-                lines = output.decode('ascii', errors='ignore').splitlines()
-
-                # 检查 sysname
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith('[') and line.endswith(']'):
-                        tn.write(b'q\n')
-                    elif line.startswith('<') and line.endswith('>'):
-                        sysname = line.strip('<> ')
-                        break
-
-                if sysname:
-                    print(f"Sysname for {host}:{port} is {sysname}")
-
-                    # 发送 scr 0 t 指令以确保可以正确输出路由表
-                    tn.write(b'scr 0 t\n')
-                    tn.read_until(b'>', timeout=3)
-
-                    # 发送命令获取路由表
-                    tn.write(b'display ip routing-table\n')
-                    routing_output = tn.read_until(b'>', timeout=5).decode('ascii', errors='ignore')
-                    ospf_ip = self.parse_routing_table(routing_output)
-
-                    if ospf_ip:
-                        # 配置并执行 NQA 测试
-                        nqa_result = self.perform_nqa_test(tn, ospf_ip)
-                        tn.close()
-                        return sysname, ospf_ip, nqa_result
-                    else:
-                        tn.close()
-                        return sysname, None, None
+            # broker 在运行时复用其已登录的会话；会话打开时已同步到用户视图的真实提示符
+            with open_session(host, port) as session:
+                sysname = session.sysname
+                print(f"Sysname for {host}:{port} is {sysname}")
 
-                else:
-                    print(f"Waiting for correct prompt from {host}:{port}...")
+                # 发送 scr 0 t 指令以确保可以正确输出路由表
+                session.execute('scr 0 t')
+
+                # 发送命令获取路由表，设备输出完毕即返回
+                routing_output = session.execute('display ip routing-table')
+                ospf_ip = self.parse_routing_table(routing_output)
+
+                if ospf_ip:
+                    # 配置并执行 NQA 测试
+                    nqa_result = self.perform_nqa_test(session, ospf_ip)
+                    return sysname, ospf_ip, nqa_result
+                return sysname, None, None
 
         except Exception as e:
             print(f"Error connecting to {host}:{port} - {e}")
@@ -76,40 +53,35 @@ class RouterTelnetManager:
         print("No OSPF route found")
         return None
 
-    def perform_nqa_test(self, tn, dest_ip, max_attempts=5):
+    def perform_nqa_test(self, session, dest_ip, max_attempts=5, poll_interval=1):
         """配置并执行 NQA 测试，最多尝试 max_attempts 次获取 NQA 测试结果，返回性能指标"""
         try:
             # 进入 system-view 模式
-            tn.write(b'system-view\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('system-view')
 
-            # 配置 NQA 测试实例
+            # 配置 NQA 测试实例，每条命令在提示符返回后立即发送下一条
             nqa_commands = [
-                b'nqa test-instance admin perfor_test\n',
-                b'test-type icmpjitter\n',
-                f'destination-address ipv4 {dest_ip}\n'.encode('ascii'),
-                b'probe-count 2\n',
-                b'interval milliseconds 100\n',
-                b'timeout 1\n'
+                'nqa test-instance admin perfor_test',
+                'test-type icmpjitter',
+                f'destination-address ipv4 {dest_ip}',
+                'probe-count 2',
+                'interval milliseconds 100',
+                'timeout 1'
             ]
             for cmd in nqa_commands:
-                tn.write(cmd)
-                tn.read_until(b']', timeout=3)
+                session.execute(cmd)
 
             # 发送命令开始测试
-            tn.write(b'start now\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('start now')
 
             # 确保配置提交
-            tn.write(b'commit\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('commit')
 
             # 尝试获取 NQA 测试结果
             attempt_count = 0
             result = ""
             while attempt_count < max_attempts:
-                tn.write(b'display nqa results test-instance admin perfor_test\n')
-                partial_output = tn.read_until(b'>', timeout=5).decode('ascii')
+                partial_output = session.execute('display nqa results test-instance admin perfor_test')
                 result += partial_output
 
                 if "The test is finished" in partial_output:
@@ -123,22 +95,19 @@ class RouterTelnetManager:
                     print(f"Max attempts reached for {dest_ip}. Test result may be incomplete.")
                     break
 
+                # 读取不再等待固定超时，测试未完成时主动间隔一段时间再查询
+                time.sleep(poll_interval)
+
             # 记录并返回结果
             print(f"NQA Test Result for {dest_ip}:")
             print(result)
 
             # 执行结束和清理命令
-            tn.write(b'stop\n')
-            tn.read_until(b'>', timeout=3)
-
-            tn.write(b'q\n')
-            tn.read_until(b'>', timeout=3)
-
-            tn.write(b'undo nqa test-instance admin perfor_test\n')
-            tn.read_until(b']', timeout=3)
-
-            tn.write(b'commit\n')
-            tn.read_until(b']', timeout=3)
+            session.execute('stop')
+            session.execute('q')
+            session.execute('undo nqa test-instance admin perfor_test')
+            session.execute('commit')
+            session.execute('return')
 
             # 解析并返回性能评估输入
             metrics = self.parse_nqa_result(result)
@@ -1,8 +1,12 @@
 import os
+import sys
 import json
 import xml.etree.ElementTree as ET
 import subprocess
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.container_inventory import get_inventory
+
 class FRRConfigExtractor:
     def __init__(self, reasoning_directory, labs_directory, output_file_path):
         self.reasoning_directory = reasoning_directory
@@ -68,12 +72,8 @@ class FRRConfigExtractor:
         return nodes, links
 
     def get_running_containers(self):
-        result = subprocess.run(['docker', 'ps', '--format', '{{.ID}} {{.Names}}'], capture_output=True, text=True)
-        containers = {}
-        for line in result.stdout.strip().splitlines():
-            container_id, container_name = line.split(maxsplit=1)
-            containers[container_name] = container_id
-        return containers
+        # 同一次推演中的脚本共享容器清单，只按 docker events 增量更新，不再每次列出所有容器
+        return get_inventory().name_to_id()
 
     def match_ids_with_containers(self, lab_id, containers):
         matched_containers = []
@@ -1,21 +1,24 @@
 import os
+import sys
 import json
 import xml.etree.ElementTree as ET
-import subprocess
 import argparse
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.container_inventory import get_inventory
+from common.docker_api import get_client
+from common.frr_bundle import collect_bundles, bundle_config
+
 class FrrContainerManager:
     def __init__(self):
         self.frr_conf_data = {}
+        # Docker Engine API 可用时通过长连接访问，否则退回 docker CLI
+        self.docker = get_client()
 
 
     def get_running_containers(self):
-        result = subprocess.run(['docker', 'ps', '--format', '{{.ID}} {{.Names}}'], capture_output=True, text=True)
-        containers = {}
-        for line in result.stdout.strip().splitlines():
-            container_id, container_name = line.split(maxsplit=1)
-            containers[container_name] = container_id
-        return containers
+        # 同一次推演中的脚本共享容器清单，只按 docker events 增量更新，不再每次列出所有容器
+        return get_inventory(self.docker).name_to_id()
   
     def match_ids_with_containers(self, lab_id, containers):
         matched_containers = []
@@ -24,18 +27,6 @@ class FrrContainerManager:
                 matched_containers.append(container_id)
         return matched_containers
 
-    def get_frr_conf(self, container_id, file_path="/etc/frr/frr.conf"):
-        try:
-            result = subprocess.run(['docker', 'exec', container_id, 'cat', file_path], capture_output=True, text=True)
-            if result.returncode == 0:
-                return result.stdout
-            else:
-                print(f"Error reading file: {result.stderr}")
-                return None
-        except subprocess.CalledProcessError as e:
-            print(f"Error occurred: {e}")
-            return None
-
     def parse_frr_conf(self, frr_conf):
         data = {
             'hostname': None,
@@ -125,9 +116,13 @@ class FrrContainerManager:
         matched_container_ids = self.match_ids_with_containers(lab_id_from_unl, running_containers)
 
         if matched_container_ids:
+            # 每个容器只执行一次 exec，同时取回 frr.conf 和 show running-config（文件读不到时使用）
+            bundles = collect_bundles(matched_container_ids, client=self.docker)
             for cid in matched_container_ids:
                 print(f"Fetching frr.conf from container ID: {cid}")
-                frr_conf = self.get_frr_conf(cid)
+                if bundles[cid]["error"]:
+                    print(f"Error occurred: {bundles[cid]['error']}")
+                frr_conf = bundle_config(bundles[cid])
                 if frr_conf:
                     parsed_conf = self.parse_frr_conf(frr_conf)
                     self.frr_conf_data[cid] = {
@@ -1,10 +1,17 @@
 import xml.etree.ElementTree as ET
 import os
+import re
+import sys
 import json
 import random
 import subprocess
 import argparse
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cgroup_stats import CgroupStats, format_size
+from common.container_inventory import get_inventory
+from common.docker_api import DockerError, get_client, summarize_stats
+
 def get_latest_directory(directory):
     """
     获取指定目录下最新生成的文件夹。
@@ -13,36 +20,107 @@ def get_latest_directory(directory):
     latest_dir = max(dirs, key=os.path.getmtime)
     return latest_dir
 
+# 各列用制表符分隔：内存、网络、块设备 I/O 的值本身带有空格（"122.4MiB / 1.9GiB"）
+DOCKER_STATS_FORMAT = '{{.ID}}\t{{.Name}}\t{{.CPUPerc}}\t{{.MemUsage}}\t{{.NetIO}}\t{{.BlockIO}}\t{{.PIDs}}'
+
+def parse_docker_stats(output):
+    """
+    解析按 DOCKER_STATS_FORMAT 输出的 docker stats 结果。
+    返回一个字典，key 是 12 位短容器 ID，value 是该容器的资源使用情况。
+    """
+    table = {}
+    for line in output.splitlines():
+        fields = line.split('\t')
+        if len(fields) != 7:
+            continue
+        table[fields[0][:12]] = {
+            "container_id": fields[0],
+            "container_name": fields[1],
+            "cpu_percent": fields[2],
+            "memory_usage": fields[3],  # 内存使用量 / 限制
+            "network_io": fields[4],    # 网络输入 / 输出
+            "block_io": fields[5],      # 块输入 / 输出
+            "pids": fields[6]
+        }
+    return table
+
+def get_docker_stats_all(container_ids):
+    """
+    一次 docker stats --no-stream 调用采样所有指定容器的资源使用情况。
+    docker stats 每次调用都要采样约 2 秒，逐个容器调用时总耗时随容器数线性增长，合并成一次调用后与容器数无关。
+    返回 parse_docker_stats 格式的字典；采样期间有容器退出导致调用失败时，只对仍在运行的容器重试一次。
+    """
+    remaining = list(container_ids)
+    for attempt in range(2):
+        if not remaining:
+            break
+        try:
+            result = subprocess.run(['docker', 'stats', '--no-stream', '--format', DOCKER_STATS_FORMAT] + remaining,
+                                    capture_output=True, text=True, check=True)
+            return parse_docker_stats(result.stdout)
+        except subprocess.CalledProcessError as e:
+            print(f"Failed to get docker stats for {len(remaining)} containers. Error: {e.stderr.strip() or e}")
+        running = set(get_inventory().refresh().name_to_id().values())
+        still_running = [container_id for container_id in remaining if container_id[:12] in running]
+        if len(still_running) == len(remaining):
+            break
+        remaining = still_running
+    return {}
+
 def get_docker_stats(container_id):
     """
     获取指定容器的资源使用情况。
     返回一个字典，包含 CPU 使用率、内存使用情况、网络 I/O 等信息。
     """
-    try:
-        result = subprocess.run(['docker', 'stats', container_id, '--no-stream', '--format',
-                                 '{{.ID}} {{.Name}} {{.CPUPerc}} {{.MemUsage}} {{.NetIO}} {{.BlockIO}} {{.PIDs}}'],
-                                capture_output=True, text=True, check=True)
-        output = result.stdout.strip().split()
-        stats = {
-            "container_id": output[0],
-            "container_name": output[1],
-            "cpu_percent": output[2],
-            "memory_usage": output[3] + ' ' + output[4],  # 合并内存使用量和限制
-            "network_io": output[5] + ' ' + output[6],    # 合并网络输入和输出
-            "block_io": output[7] + ' ' + output[8],      # 合并块输入和输出
-            "pids": output[9]
-        }
-        return stats
-    except subprocess.CalledProcessError as e:
-        return f"Failed to get docker stats for container {container_id}. Error: {e}\n"
+    stats = get_docker_stats_all([container_id]).get(container_id[:12])
+    if stats is None:
+        return f"Failed to get docker stats for container {container_id}.\n"
+    return stats
 def parse_memory_usage(memory_str):
         """
         解析 memory_str（如 "122.4MiB" 或 "2.5GiB"）并转换为以 MiB 为单位的浮点数。
         """
-        units = {"KiB": 1 / 1024, "MiB": 1, "GiB": 1024}
-        number = float(''.join(filter(str.isdigit, memory_str.split()[0])) + '.' + ''.join(filter(str.isdigit, memory_str.split()[0].split('.')[-1])))
-        unit = ''.join(filter(str.isalpha, memory_str.split()[0]))
-        return number * units[unit]    
+        units = {"B": 1 / 1048576, "KiB": 1 / 1024, "kB": 1000 / 1048576, "MiB": 1, "MB": 1e6 / 1048576,
+                 "GiB": 1024, "GB": 1e9 / 1048576, "TiB": 1048576, "TB": 1e12 / 1048576}
+        match = re.match(r'\s*([\d.]+)\s*([A-Za-z]+)', memory_str)
+        if not match or match.group(2) not in units:
+            raise ValueError(f"Unrecognized memory usage: {memory_str!r}")
+        return float(match.group(1)) * units[match.group(2)]
+
+def format_container_stats(container_id, container_name, stats):
+    """
+    把 CgroupStats / summarize_stats 给出的数值统计转换为 parse_docker_stats 的格式，
+    三种采集方式保存到输出文件中的 docker_stats 字段完全相同。
+    """
+    return {
+        "container_id": container_id[:12],
+        "container_name": container_name,
+        "cpu_percent": f"{stats['cpu_percent']:.2f}%",
+        "memory_usage": f"{format_size(stats['memory_usage'])} / {format_size(stats['memory_limit'])}",
+        "network_io": f"{format_size(stats['net_rx'], binary=False)} / {format_size(stats['net_tx'], binary=False)}",
+        "block_io": f"{format_size(stats['block_read'], binary=False)} / {format_size(stats['block_write'], binary=False)}",
+        "pids": str(stats["pids"]) if stats["pids"] is not None else "--"
+    }
+
+def get_container_stats_all(container_ids, names=None, interval=1.0, collector=None, client=None):
+    """
+    获取所有指定容器的资源使用情况，返回以 12 位短容器 ID 为 key 的字典，格式与 parse_docker_stats 相同。
+    优先直接读取本机 cgroup 记账文件（每个容器两次采样，间隔 interval 秒）；
+    读不到 cgroup 的容器（例如 docker 运行在其他主机上）再通过 Docker Engine API（client）并发获取，没有 client 时用一次 docker stats 调用采样。
+    """
+    names = names or {}
+    collector = collector or CgroupStats()
+    table = {}
+    for container_id, stats in collector.collect(container_ids, interval).items():
+        table[container_id[:12]] = format_container_stats(container_id, names.get(container_id, ""), stats)
+    missing = [container_id for container_id in container_ids if container_id[:12] not in table]
+    if missing and client is not None:
+        for container_id, raw in client.stats_all(missing).items():
+            table[container_id[:12]] = format_container_stats(container_id, names.get(container_id, ""), summarize_stats(raw))
+    elif missing:
+        table.update(get_docker_stats_all(missing))
+    return table
+
 class NodeReader:
     def __init__(self, unl_file_path):
         self.unl_file_path = unl_file_path
@@ -50,6 +128,8 @@ class NodeReader:
         self.root = None
         self.nodes = None
         self.networks = None
+        # Docker Engine API 可用时通过长连接访问，否则退回 docker CLI
+        self.docker = get_client()
         self.output_data = {
             "nodes": [],
             "links": [],
@@ -118,17 +198,10 @@ class NodeReader:
 
     def get_running_containers(self):
         """
-        通过 docker ps 获取正在运行的容器信息。
+        从共享的容器清单获取正在运行的容器信息，清单只按 docker events 增量更新，不再每次列出所有容器。
         返回一个字典，其中 key 是容器 NAMES，value 是容器 ID。
         """
-        result = subprocess.run(['docker', 'ps', '--format', '{{.ID}} {{.Names}}'], capture_output=True, text=True)
-        containers = {}
-        
-        for line in result.stdout.strip().splitlines():
-            container_id, container_name = line.split(maxsplit=1)
-            containers[container_name] = container_id
-        
-        return containers
+        return get_inventory(self.docker).name_to_id()
 
     def match_ids_with_containers(self, lab_id, containers):
         """
@@ -147,9 +220,14 @@ class NodeReader:
         返回包含容器ID和hostname的字典。
         """
         try:
-            result = subprocess.run(['docker', 'exec', container_id, 'cat', '/etc/frr/frr.conf'],
-                                    capture_output=True, text=True, check=True)
-            frr_conf = result.stdout
+            if self.docker is not None:
+                exit_code, frr_conf, stderr = self.docker.exec(container_id, ['cat', '/etc/frr/frr.conf'])
+                if exit_code != 0:
+                    raise DockerError(exit_code, stderr.strip())
+            else:
+                result = subprocess.run(['docker', 'exec', container_id, 'cat', '/etc/frr/frr.conf'],
+                                        capture_output=True, text=True, check=True)
+                frr_conf = result.stdout
             
             # 提取 hostname
             hostname = ""
@@ -163,7 +241,7 @@ class NodeReader:
                 "hostname": hostname,
                 "frr_conf": f"Configuration from container {container_id}:\n{frr_conf}\n"
             }
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, DockerError, OSError) as e:
             return {
                 "container_id": container_id,
                 "hostname": "",
@@ -188,10 +266,13 @@ class NodeReader:
         }
 
         if matched_container_ids:
+            # 所有容器同时采样
+            container_names = {container_id: name for name, container_id in running_containers.items()}
+            stats_table = get_container_stats_all(matched_container_ids, container_names, client=self.docker)
             for container_id in matched_container_ids:
                 # 获取FRR配置及hostname
                 container_info = self.get_frr_config_from_container(container_id)
-                docker_stats = get_docker_stats(container_id)
+                docker_stats = stats_table.get(container_id[:12], f"Failed to get docker stats for container {container_id}.\n")
 
                 self.output_data["containers"].append({
                     "container_id": container_info["container_id"],
@@ -200,6 +281,11 @@ class NodeReader:
                     "docker_stats": docker_stats
                 })
 
+                if not isinstance(docker_stats, dict):
+                    print(docker_stats)
+                    performance_summary.append(f"路由 {container_info['hostname']} 的资源使用情况获取失败")
+                    continue
+
                 # 提取并解析 CPU 和内存使用率
                 cpu_usage = float(docker_stats["cpu_percent"].strip('%'))
                 memory_usage = parse_memory_usage(docker_stats["memory_usage"])
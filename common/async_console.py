@@ -0,0 +1,181 @@
+import asyncio
+import resource
+
+from common.deadline import bounded_timeout
+from common.prompt_reader import ConsoleTimeout, PipelineSplitter, clean_output, parse_prompt, scan_tail
+
+# Telnet 协议控制字节
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+
+
+class AsyncConsole:
+    """基于 asyncio 的单个 Telnet 控制台会话，按提示符判断命令结束"""
+
+    def __init__(self, host, port, connect_timeout=10, read_timeout=10, deadline=None):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline  # 设备的时间预算，连接和每次读取的超时都不超过剩余时间
+        self.reader = None
+        self.writer = None
+        self.prompt = None
+        self.sysname = None
+        self.view = None
+        self._pending = b''
+        self._in_subnegotiation = False
+
+    async def connect(self):
+        """建立 Telnet 连接，发送回车同步提示符，并确保处于用户视图"""
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout=bounded_timeout(self.deadline, self.connect_timeout))
+        self.write(b'\n')
+        await self.read_until_prompt()
+        if self.view == 'system':
+            await self.send('return')
+        return self.sysname
+
+    def write(self, data):
+        self.writer.write(data.replace(bytes([IAC]), bytes([IAC, IAC])))
+
+    async def send(self, command, timeout=None):
+        """发送一条命令并返回提示符出现之前的输出"""
+        self.write(command.encode('ascii') + b'\n')
+        return await self.read_until_prompt(timeout)
+
+    async def send_pipelined(self, commands, timeout=None):
+        """一次写入全部命令，按命令回显和提示符切分出每条命令的输出，用法与 PromptReader.execute_pipelined 相同。
+
+        调用前需要关闭分页（scr 0 t），否则 ---- More ---- 会吃掉后续命令的输入。
+        """
+        if not commands:
+            return []
+        splitter = PipelineSplitter(commands)
+        self.write(''.join(command + '\n' for command in commands).encode('ascii'))
+        deadline = asyncio.get_running_loop().time() + bounded_timeout(self.deadline, timeout or self.read_timeout)
+        buffer = bytearray()
+        while True:
+            if splitter.feed(buffer):
+                tail = scan_tail(buffer)
+                if tail and tail[0] == 'prompt' and tail[1] > splitter.starts[-1]:
+                    self.prompt = tail[2]
+                    self.sysname, self.view = parse_prompt(self.prompt)
+                    return splitter.split(buffer, tail[1])
+            await self._fill(buffer, deadline)
+
+    async def read_until_prompt(self, timeout=None):
+        """持续读取直到最后一行是提示符，遇到 ---- More ---- 自动翻页"""
+        deadline = asyncio.get_running_loop().time() + bounded_timeout(self.deadline, timeout or self.read_timeout)
+        buffer = bytearray()
+        while True:
+            tail = scan_tail(buffer)
+            if tail and tail[0] == 'prompt':
+                self.prompt = tail[2]
+                self.sysname, self.view = parse_prompt(self.prompt)
+                return clean_output(buffer[:tail[1]])
+            if tail and tail[0] == 'more':
+                self.write(b' ')
+                del buffer[tail[1]:]
+            await self._fill(buffer, deadline)
+
+    async def _fill(self, buffer, deadline):
+        """等待下一块数据并追加到 buffer，最多等待到 deadline"""
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise ConsoleTimeout(f"Timed out waiting for prompt from {self.host}:{self.port}",
+                                 clean_output(buffer))
+        try:
+            chunk = await asyncio.wait_for(self.reader.read(65536), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise ConsoleTimeout(f"Timed out waiting for prompt from {self.host}:{self.port}",
+                                 clean_output(buffer))
+        if not chunk:
+            raise ConnectionError(f"Connection closed by {self.host}:{self.port}")
+        buffer += self.process_telnet(chunk)
+
+    def process_telnet(self, data):
+        """去掉 Telnet 协商序列，并像 telnetlib 一样拒绝对端提出的所有选项"""
+        data = self._pending + data
+        self._pending = b''
+        output = bytearray()
+        reply = bytearray()
+        i = 0
+        length = len(data)
+        while i < length:
+            if self._in_subnegotiation:
+                end = data.find(bytes([IAC, SE]), i)
+                if end < 0:
+                    self._pending = data[-1:] if data[-1] == IAC else b''
+                    break
+                self._in_subnegotiation = False
+                i = end + 2
+                continue
+            iac = data.find(bytes([IAC]), i)
+            if iac < 0:
+                output += data[i:]
+                break
+            output += data[i:iac]
+            if iac + 1 >= length:
+                self._pending = data[iac:]
+                break
+            command = data[iac + 1]
+            if command == IAC:
+                output.append(IAC)
+                i = iac + 2
+            elif command in (DO, DONT, WILL, WONT):
+                if iac + 2 >= length:
+                    self._pending = data[iac:]
+                    break
+                option = data[iac + 2]
+                if command == DO:
+                    reply += bytes([IAC, WONT, option])
+                elif command == WILL:
+                    reply += bytes([IAC, DONT, option])
+                i = iac + 3
+            elif command == SB:
+                self._in_subnegotiation = True
+                i = iac + 2
+            else:
+                i = iac + 2
+        if reply:
+            self.writer.write(bytes(reply))
+        return output.replace(b'\x00', b'')
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+
+def raise_nofile_limit(wanted):
+    """尽量把进程可打开的文件描述符上限提高到 wanted，返回实际生效的软限制"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft >= wanted:
+        return soft
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        return target
+    except (ValueError, OSError):
+        return soft
+
+
+async def run_bounded(items, worker, max_concurrency):
+    """在同一个事件循环里并发处理 items，同时最多 max_concurrency 个会话"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def guarded(item):
+        async with semaphore:
+            return await worker(item)
+
+    return await asyncio.gather(*(guarded(item) for item in items), return_exceptions=True)
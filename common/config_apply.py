@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.async_console import AsyncConsole, raise_nofile_limit, run_bounded
+from common.deadline import Deadline
+from common.governor import AsyncConcurrencyGovernor
+
+# 配置命令被设备拒绝时输出以这些前缀开头的行
+ERROR_PREFIXES = ("Error:", "Error ")
+
+
+def find_error(output):
+    """返回命令输出中的第一条错误信息，没有错误时返回 None"""
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith(ERROR_PREFIXES):
+            return line
+    return None
+
+
+async def apply_config(console, lines, chunk_size=50, commit_on_error=False):
+    """在一个已登录的会话上推送一段配置，返回 (是否已提交, 错误列表)。
+
+    配置按 chunk_size 行一批流水线写入，每批只需一次往返；每条命令的回显都必须出现，
+    否则说明设备丢弃了输入，剩余配置不再发送。全部行推送完后只执行一次 commit；
+    有任何行被拒绝且 commit_on_error 为 False 时丢弃候选配置，不提交。
+    错误列表中每一项为 {"line": 行号（从 1 开始）, "command": 命令, "message": 错误信息}。
+    """
+    lines = [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+    errors = []
+    await console.send('scr 0 t')
+    output = await console.send('system-view')
+    if console.view != 'system':
+        errors.append({"line": 0, "command": 'system-view', "message": find_error(output) or "无法进入系统视图"})
+        return False, errors
+
+    for offset in range(0, len(lines), chunk_size):
+        chunk = lines[offset:offset + chunk_size]
+        outputs = await console.send_pipelined(chunk)
+        for number, (command, output) in enumerate(zip(chunk, outputs), start=offset + 1):
+            if not output.lstrip().startswith(command):
+                errors.append({"line": number, "command": command, "message": "命令回显不一致，设备可能丢弃了输入"})
+                break
+            message = find_error(output)
+            if message:
+                errors.append({"line": number, "command": command, "message": message})
+        if errors and errors[-1]["message"].startswith("命令回显"):
+            break
+
+    committed = False
+    if errors and not commit_on_error:
+        await console.send('clear configuration candidate')
+    else:
+        message = find_error(await console.send('commit'))
+        if message:
+            errors.append({"line": len(lines) + 1, "command": 'commit', "message": message})
+        else:
+            committed = True
+    await console.send('return')
+    return committed, errors
+
+
+async def apply_to_device(host, port, lines, deadline=None, chunk_size=50, commit_on_error=False):
+    """登录单台设备并推送配置，返回结果字典"""
+    result = {"host": host, "port": port, "sysname": None, "committed": False, "errors": [], "elapsed": None}
+    start = time.monotonic()
+    console = AsyncConsole(host, port, deadline=deadline)
+    try:
+        result["sysname"] = await console.connect()
+        result["committed"], result["errors"] = await apply_config(console, lines, chunk_size, commit_on_error)
+    except Exception as e:
+        print(f"Error applying configuration to {host}:{port} - {e}")
+        result["errors"].append({"line": None, "command": None, "message": str(e)})
+    finally:
+        await console.close()
+    result["elapsed"] = round(time.monotonic() - start, 3)
+    return result
+
+
+def apply_to_devices(targets, max_sessions=100, device_timeout=60, job_timeout=600, chunk_size=50, commit_on_error=False):
+    """并发向多台设备推送配置。
+
+    targets 为 [(host, port, lines), ...]，每台设备可以推送不同的配置；返回与 targets 顺序一致的结果字典列表。
+    每个控制台主机上的并发会话数按 AIMD 自适应调整。
+    """
+    governor = AsyncConcurrencyGovernor(max_limit=max_sessions)
+    job_deadline = Deadline(job_timeout) if job_timeout else None
+
+    async def worker(target):
+        host, port, lines = target
+        async with governor.slot(host) as slot:
+            deadline = job_deadline.child(device_timeout) if job_deadline else Deadline(device_timeout)
+            result = await apply_to_device(host, port, lines, deadline, chunk_size, commit_on_error)
+            if result["sysname"] is None:
+                slot.fail()
+            return result
+
+    raise_nofile_limit(max_sessions + 64)
+    outcomes = asyncio.run(run_bounded(targets, worker, max_sessions))
+    results = []
+    for (host, port, _), outcome in zip(targets, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"Error applying configuration to {host}:{port} - {outcome}")
+            outcome = {"host": host, "port": port, "sysname": None, "committed": False,
+                       "errors": [{"line": None, "command": None, "message": str(outcome)}], "elapsed": None}
+        results.append(outcome)
+    governor.report()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="并发向设备推送一段配置，每台设备只执行一次 commit，并报告每一行的错误。")
+    parser.add_argument("-i", "--input", required=True, help="param.json 的路径。")
+    parser.add_argument("-c", "--config", required=True, help="配置文件，每行一条系统视图下的命令，# 开头的行为注释。")
+    parser.add_argument("-o", "--output", help="结果输出路径（JSON），不指定时只打印汇总。")
+    parser.add_argument("--nodes", help="只推送到这些节点（param.json 中的 name，逗号分隔），默认为全部节点。")
+    parser.add_argument("--max-sessions", type=int, default=100, help="最大并发会话数（默认为 100）。")
+    parser.add_argument("--chunk-size", type=int, default=50, help="每次流水线写入的配置行数（默认为 50）。")
+    parser.add_argument("--device-timeout", type=int, default=60, help="单台设备的时间预算（秒，默认为 60）。")
+    parser.add_argument("--job-timeout", type=int, default=600, help="整个作业的时间预算（秒，默认为 600，0 表示不限制）。")
+    parser.add_argument("--commit-on-error", action="store_true", help="有命令被拒绝时仍然提交其余配置。")
+    args = parser.parse_args()
+
+    with open(args.input, 'r') as f:
+        telnet_info = json.load(f)
+    with open(args.config, 'r') as f:
+        config_lines = f.read().splitlines()
+
+    selected = set(args.nodes.split(',')) if args.nodes else None
+    targets = [(node["hostip"], node["port"], config_lines) for node in telnet_info.get("node", [])
+               if selected is None or node.get("name") in selected]
+
+    start = time.monotonic()
+    results = apply_to_devices(targets, max_sessions=args.max_sessions, device_timeout=args.device_timeout,
+                               job_timeout=args.job_timeout, chunk_size=args.chunk_size,
+                               commit_on_error=args.commit_on_error)
+    for result in results:
+        for error in result["errors"]:
+            print(f"{result['sysname'] or result['host']}:{result['port']} line {error['line']} "
+                  f"{error['command']!r}: {error['message']}")
+    committed = sum(result["committed"] for result in results)
+    print(f"{committed}/{len(results)} 台设备已提交，耗时 {time.monotonic() - start:.1f} 秒")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"结果已写入 {args.output}")
@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import socket
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.async_console import AsyncConsole, run_bounded
+from common.deadline import DeadlineExceeded, bounded_timeout
+
+DEFAULT_SOCKET = os.environ.get("NET_TWIN_BROKER", "/tmp/net-twin-console.sock")
+
+
+class BrokerError(Exception):
+    pass
+
+
+class ConsoleBroker:
+    """常驻的控制台会话代理。
+
+    为每台设备保持一个已登录的控制台会话，脚本通过 Unix socket 借用会话。
+    每个客户端连接借用一台设备：open 时获得该设备的锁，close 或断开时回到用户视图并释放锁，
+    同一设备的请求因此按顺序执行，登录和提示符同步只在 broker 启动后发生一次。
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, read_timeout=30):
+        self.socket_path = socket_path
+        self.read_timeout = read_timeout
+        self.consoles = {}
+        self.locks = {}
+
+    async def serve(self, nodes=()):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        print(f"Console broker listening on {self.socket_path}")
+        if nodes:
+            # 预先登录所有设备，之后的脚本直接复用
+            await run_bounded(nodes, self.preload, 100)
+        async with server:
+            await server.serve_forever()
+
+    async def preload(self, node):
+        key = (node.get("hostip"), int(node.get("port")))
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            try:
+                console = await self.get_console(key)
+                print(f"Connected to {key[0]}:{key[1]} - Sysname: {console.sysname}")
+            except Exception as e:
+                print(f"Error connecting to {key[0]}:{key[1]} - {e}")
+
+    async def get_console(self, key):
+        console = self.consoles.get(key)
+        if console is None:
+            console = AsyncConsole(key[0], key[1], read_timeout=self.read_timeout)
+            try:
+                await console.connect()
+            except Exception:
+                await console.close()
+                raise
+            self.consoles[key] = console
+        return console
+
+    async def drop(self, key):
+        """会话出错后状态未知，关闭它，下次借用时重新登录"""
+        console = self.consoles.pop(key, None)
+        if console:
+            await console.close()
+
+    async def release(self, key):
+        console = self.consoles.get(key)
+        try:
+            if console and console.view == 'system':
+                await console.send('return')
+        except Exception:
+            await self.drop(key)
+        finally:
+            self.locks[key].release()
+
+    async def handle_client(self, reader, writer):
+        key = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                op = request.get("op")
+                try:
+                    if op == "open":
+                        if key:
+                            raise BrokerError("session already open on this connection")
+                        device = (request["host"], int(request["port"]))
+                        await self.locks.setdefault(device, asyncio.Lock()).acquire()
+                        try:
+                            console = await self.get_console(device)
+                        except Exception:
+                            self.locks[device].release()
+                            raise
+                        key = device
+                        response = {"ok": True, "sysname": console.sysname}
+                    elif op in ("execute", "run"):
+                        if not key:
+                            raise BrokerError("no session open on this connection")
+                        console = await self.get_console(key)
+                        commands = [request["command"]] if op == "execute" else request["commands"]
+                        try:
+                            outputs = [await console.send(command, request.get("timeout")) for command in commands]
+                        except Exception:
+                            await self.drop(key)
+                            raise
+                        response = {"ok": True, "sysname": console.sysname, "prompt": console.prompt,
+                                    "outputs": outputs}
+                    elif op == "close":
+                        if key:
+                            await self.release(key)
+                            key = None
+                        response = {"ok": True}
+                    else:
+                        raise BrokerError(f"unknown op: {op}")
+                except Exception as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            print(f"Broker client error - {e}")
+        finally:
+            if key:
+                await self.release(key)
+            writer.close()
+
+
+class BrokerSession:
+    """通过 broker 借用设备会话，接口与 ConsoleSession 一致"""
+
+    def __init__(self, host, port, socket_path=DEFAULT_SOCKET, deadline=None):
+        self.host = host
+        self.port = port
+        self.deadline = deadline
+        self.sysname = None
+        self.prompt = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.file = self.sock.makefile('rwb')
+        self.opened = False
+
+    def request(self, **payload):
+        if self.deadline is not None:
+            # 等待设备锁和命令输出都不超过剩余时间
+            self.sock.settimeout(self.deadline.timeout(None))
+        self.file.write(json.dumps(payload).encode('utf-8') + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise BrokerError("broker closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise BrokerError(response.get("error"))
+        return response
+
+    def open(self):
+        response = self.request(op="open", host=self.host, port=self.port)
+        self.sysname = response["sysname"]
+        self.opened = True
+        return self.sysname
+
+    def execute(self, command, timeout=None):
+        return self.run([command], timeout=timeout)[command]
+
+    def run(self, commands, pipeline=False, timeout=None):
+        """在 broker 中依次执行 commands，一次 socket 往返，返回 {命令: 输出}"""
+        if not self.opened:
+            self.open()
+        response = self.request(op="run", commands=list(commands), timeout=bounded_timeout(self.deadline, timeout))
+        self.prompt = response["prompt"]
+        return dict(zip(commands, response["outputs"]))
+
+    def close(self):
+        if self.sock:
+            try:
+                if self.opened:
+                    self.request(op="close")
+            except (BrokerError, DeadlineExceeded, OSError):
+                pass
+            self.file.close()
+            self.sock.close()
+            self.sock = None
+            self.opened = False
+
+    def __enter__(self):
+        if not self.opened:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main(input_path, socket_path, read_timeout):
+    nodes = []
+    if input_path:
+        with open(input_path, 'r') as f:
+            telnet_info = json.load(f)
+        nodes = telnet_info["node"] if isinstance(telnet_info, dict) else telnet_info
+        nodes = [node for node in nodes if node.get("hostip") and node.get("port")]
+
+    broker = ConsoleBroker(socket_path, read_timeout=read_timeout)
+    try:
+        asyncio.run(broker.serve(nodes))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="常驻控制台会话代理：为每台设备保持一个已登录的会话，各脚本通过 Unix socket 复用。")
+    parser.add_argument("-i", "--input", help="param.json 的路径，启动时预先登录其中的所有设备。")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket 路径（默认为 {DEFAULT_SOCKET}，也可通过 NET_TWIN_BROKER 设置）。")
+    parser.add_argument("--read-timeout", type=int, default=30, help="等待设备提示符的最长时间（秒，默认为 30）。")
+    args = parser.parse_args()
+
+    main(args.input, args.socket, args.read_timeout)
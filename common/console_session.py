@@ -0,0 +1,131 @@
+import telnetlib
+
+from common.console_broker import DEFAULT_SOCKET, BrokerSession
+from common.deadline import bounded_timeout
+from common.prompt_reader import PromptReader
+
+
+class ConsoleSession:
+    """保持一个 Telnet 控制台会话：登录一次，之后按顺序执行任意多条 display 命令"""
+
+    def __init__(self, host, port, timeout=10, read_timeout=30, deadline=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline  # 设备的时间预算，所有读写的超时都不超过剩余时间
+        self.tn = None
+        self.reader = None
+        self.sysname = None
+        self.paging_disabled = False
+
+    def open(self):
+        """建立连接并同步到提示符，从 <sysname> / [~sysname] 中解析 sysname，并回到用户视图"""
+        self.tn = telnetlib.Telnet(self.host, self.port, timeout=bounded_timeout(self.deadline, self.timeout))
+        self.reader = PromptReader(self.tn, timeout=self.read_timeout)
+        self.reader.sync(timeout=bounded_timeout(self.deadline, self.timeout))
+        if self.reader.view == 'system':
+            self.reader.execute('return')
+        self.sysname = self.reader.sysname
+        return self.sysname
+
+    def execute(self, command, timeout=None):
+        """执行一条命令，设备返回提示符后立即返回输出"""
+        if self.tn is None:
+            self.open()
+        return self.reader.execute(command, bounded_timeout(self.deadline, timeout or self.read_timeout))
+
+    def run(self, commands, pipeline=False):
+        """在同一个会话中依次执行 commands，返回 {命令: 输出}；pipeline=True 时一次写入全部命令"""
+        if not pipeline:
+            return {command: self.execute(command) for command in commands}
+        if self.tn is None:
+            self.open()
+        if not self.paging_disabled:
+            # 流水线模式下翻页提示会吃掉后续命令的输入，先关闭分页
+            self.execute('screen-length 0 temporary')
+            self.paging_disabled = True
+        outputs = self.reader.execute_pipelined(commands, bounded_timeout(self.deadline, self.read_timeout))
+        return dict(zip(commands, outputs))
+
+    def close(self):
+        if self.tn:
+            self.tn.close()
+            self.tn = None
+            self.reader = None
+            self.paging_disabled = False
+
+    def __enter__(self):
+        if self.tn is None:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CachedSession:
+    """先查 OutputCache，只有缓存缺失或过期时才真正登录设备执行命令"""
+
+    SYSNAME_KEY = "__sysname__"
+
+    def __init__(self, host, port, cache, opener):
+        self.host = host
+        self.port = port
+        self.cache = cache
+        self.opener = opener
+        self.session = None
+        self.sysname = None
+
+    def connect(self):
+        if self.session is None:
+            self.session = self.opener()
+            self.session.open()
+            self.cache.put(self.host, self.port, self.SYSNAME_KEY, self.session.sysname)
+        return self.session
+
+    def open(self):
+        self.sysname = self.cache.get(self.host, self.port, self.SYSNAME_KEY)
+        if self.sysname is None:
+            self.sysname = self.connect().sysname
+        return self.sysname
+
+    def execute(self, command, timeout=None):
+        output = self.cache.get(self.host, self.port, command)
+        if output is None:
+            output = self.connect().execute(command, timeout)
+            self.cache.put(self.host, self.port, command, output)
+        return output
+
+    def run(self, commands, pipeline=False):
+        outputs = {command: self.cache.get(self.host, self.port, command) for command in commands}
+        missing = [command for command in commands if outputs[command] is None]
+        if missing:
+            fresh = self.connect().run(missing, pipeline=pipeline)
+            for command, output in fresh.items():
+                self.cache.put(self.host, self.port, command, output)
+            outputs.update(fresh)
+        return outputs
+
+    def close(self):
+        if self.session:
+            self.session.close()
+            self.session = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_session(host, port, socket_path=DEFAULT_SOCKET, cache=None, deadline=None, **kwargs):
+    """broker 在运行时借用它保持的会话，否则直接登录设备；传入 cache 时优先使用缓存的输出，
+    传入 deadline 时所有读写都限制在其剩余时间内"""
+    if cache is not None:
+        return CachedSession(host, port, cache, lambda: open_session(host, port, socket_path, deadline=deadline, **kwargs))
+    try:
+        return BrokerSession(host, port, socket_path, deadline=deadline)
+    except OSError:
+        return ConsoleSession(host, port, deadline=deadline, **kwargs)
@@ -0,0 +1,243 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.docker_api import DockerError, get_client
+
+DEFAULT_INVENTORY_FILE = os.environ.get("NET_TWIN_INVENTORY", "/tmp/net-twin-inventory.json")
+# dockerd 只在内存中保留最近 256 条事件（所有类型共用，每次 exec 就占 3 条），取回的事件达到这个数量时，
+# since 之后较早的事件可能已被挤出，增量更新不可信，需要重新列出
+EVENT_BUFFER = 256
+# 守护进程重启会清空事件缓冲区，快照超过这个时间（秒）也重新列出
+DEFAULT_MAX_AGE = 600
+# EVE-NG 容器名称以节点 ID 结尾
+NODE_PATTERN = re.compile(r'(\d+)$')
+STOP_ACTIONS = ("die", "destroy")
+
+
+def timestamp(ns):
+    """docker events 的 since / until 参数格式："秒.纳秒" """
+    return f"{ns // 10 ** 9}.{ns % 10 ** 9:09d}"
+
+
+class ContainerInventory:
+    """运行中容器的清单：第一次使用时列出一次，之后只按 docker events 增量更新。
+
+    清单保存在 path 指定的快照文件中，同一次推演中依次运行的各个脚本共享：每个脚本只需用 since=上次的时间
+    取回这段时间内的容器事件（通常为空），而不必重新列出所有容器。长时间运行的进程可以调用 watch()
+    在后台线程中持续跟随事件流。所有查询（名称 -> ID、实验 -> 容器、容器 -> 节点）都直接在内存中完成。
+    Docker Engine API 不可用时通过 docker CLI 完成同样的操作。
+    """
+
+    def __init__(self, client=None, path=DEFAULT_INVENTORY_FILE, max_age=DEFAULT_MAX_AGE):
+        self.client = client
+        self.path = path
+        self.max_age = max_age
+        self.containers = {}  # 完整容器 ID -> {"name": 名称, "image": 镜像}
+        self.since_ns = None  # 已处理到的事件时间
+        self.listed_ns = None  # 上一次完整列出的时间
+        self.lock = threading.Lock()
+        self.watcher = None
+
+    def load(self):
+        """读取快照并追上之后的事件；没有快照或快照过旧时重新列出所有容器"""
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = json.load(f)
+            self.containers = snapshot["containers"]
+            self.since_ns = snapshot["since"]
+            self.listed_ns = snapshot["listed"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return self.rebuild()
+        if time.time_ns() - self.listed_ns > self.max_age * 10 ** 9:
+            return self.rebuild()
+        try:
+            self.refresh()
+        except (OSError, ValueError, DockerError, subprocess.SubprocessError) as e:
+            print(f"无法获取容器事件，重新列出容器: {e}")
+            return self.rebuild()
+        return self
+
+    def rebuild(self):
+        """重新列出所有容器；列出失败时清单为空且不保存快照，下一次使用时重试"""
+        # 先记下时间再列出，列出期间发生的事件在下一次 refresh 时会被再处理一遍，处理是幂等的
+        now = time.time_ns()
+        containers = {}
+        try:
+            if self.client is not None:
+                for container in self.client.containers():
+                    names = container.get("Names") or []
+                    if names:
+                        containers[container["Id"]] = {"name": names[0].lstrip('/'), "image": container.get("Image", "")}
+            else:
+                result = subprocess.run(['docker', 'ps', '--no-trunc', '--format', '{{.ID}}\t{{.Names}}\t{{.Image}}'],
+                                        capture_output=True, text=True, check=True)
+                for line in result.stdout.splitlines():
+                    fields = line.split('\t')
+                    if len(fields) == 3:
+                        containers[fields[0]] = {"name": fields[1], "image": fields[2]}
+        except (OSError, ValueError, DockerError, subprocess.SubprocessError) as e:
+            stderr = getattr(e, 'stderr', None)
+            print(f"无法列出运行中的容器: {stderr.strip() if stderr else e}")
+            with self.lock:
+                self.containers = {}
+                self.since_ns = self.listed_ns = None
+            return self
+        with self.lock:
+            self.containers = containers
+            self.since_ns = self.listed_ns = now
+        self.save()
+        return self
+
+    def refresh(self):
+        """应用上次处理之后到现在为止的容器事件；事件可能已被挤出守护进程的缓冲区时改为重新列出"""
+        if self.since_ns is None:
+            return self.rebuild()
+        until_ns = time.time_ns()
+        events = self.fetch_events(timestamp(self.since_ns), timestamp(until_ns))
+        if len(events) >= EVENT_BUFFER:
+            print(f"上次更新后的 {len(events)} 条事件已占满守护进程的事件缓冲区，重新列出容器")
+            return self.rebuild()
+        for event in events:
+            self.apply(event)
+        with self.lock:
+            self.since_ns = max(self.since_ns, until_ns)
+        self.save()
+        return self
+
+    def fetch_events(self, since, until):
+        # 不按类型过滤：缓冲区由所有类型的事件共用，只有取回全部事件才能判断是否有事件被挤出
+        if self.client is not None:
+            return list(self.client.events(since=since, until=until))
+        result = subprocess.run(['docker', 'events', '--since', since, '--until', until, '--format', '{{json .}}'],
+                                capture_output=True, text=True, check=True)
+        return [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+
+    def apply(self, event):
+        """按一条容器事件更新清单：start 加入，die / destroy 移除，rename 改名"""
+        if event.get("Type", "container") != "container":
+            return
+        action = event.get("Action") or event.get("status", "")
+        actor = event.get("Actor") or {}
+        container_id = actor.get("ID") or event.get("id")
+        attributes = actor.get("Attributes") or {}
+        with self.lock:
+            if action == "start" or action.startswith("rename"):
+                entry = self.containers.setdefault(container_id, {"name": "", "image": ""})
+                entry["name"] = attributes.get("name", entry["name"]).lstrip('/')
+                entry["image"] = attributes.get("image", event.get("from", entry["image"]))
+            elif action in STOP_ACTIONS:
+                self.containers.pop(container_id, None)
+            if "timeNano" in event:
+                self.since_ns = max(self.since_ns or 0, event["timeNano"] + 1)
+
+    def save(self):
+        with self.lock:
+            snapshot = {"since": self.since_ns, "listed": self.listed_ns, "containers": self.containers}
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"无法保存容器清单 {self.path}: {e}")
+
+    def watch(self):
+        """启动后台线程跟随事件流，清单随容器启停实时更新；连接断开后自动重连"""
+        if self.client is None or self.watcher is not None:
+            return
+        self.watcher = threading.Thread(target=self.follow, daemon=True)
+        self.watcher.start()
+
+    def follow(self):
+        while True:
+            try:
+                # (重新)连接前先追上断开期间的事件，期间的事件过多时重新列出；列出失败时稍后重试
+                self.refresh()
+                if self.since_ns is not None:
+                    for event in self.client.events(since=timestamp(self.since_ns), filters={"type": ["container"]}):
+                        self.apply(event)
+                        self.save()
+            except (OSError, ValueError, DockerError) as e:
+                print(f"容器事件流中断，稍后重连: {e}")
+            time.sleep(1)
+
+    def name_to_id(self):
+        """{容器名称: 12 位短 ID}，与 get_running_containers 的返回值一致"""
+        with self.lock:
+            return {entry["name"]: container_id[:12] for container_id, entry in self.containers.items()}
+
+    def lab_containers(self, lab_id):
+        """名称中包含 lab_id 的容器的短 ID 列表"""
+        with self.lock:
+            return [container_id[:12] for container_id, entry in self.containers.items() if lab_id in entry["name"]]
+
+    def node_of(self, container_id):
+        """容器对应的 EVE-NG 节点 ID（容器名称末尾的数字），未知时返回 None"""
+        with self.lock:
+            for full_id, entry in self.containers.items():
+                if full_id.startswith(container_id):
+                    match = NODE_PATTERN.search(entry["name"])
+                    return match.group(1) if match else None
+        return None
+
+    def lab_nodes(self, lab_id):
+        """{节点 ID: 短容器 ID}，只包含名称中含有 lab_id 的容器"""
+        nodes = {}
+        for container_id in self.lab_containers(lab_id):
+            node_id = self.node_of(container_id)
+            if node_id is not None:
+                nodes[node_id] = container_id
+        return nodes
+
+
+_inventory = None
+
+
+def get_inventory(client=None, path=DEFAULT_INVENTORY_FILE):
+    """返回本进程共享的 ContainerInventory，第一次调用时加载快照"""
+    global _inventory
+    if _inventory is None:
+        _inventory = ContainerInventory(client if client is not None else get_client(), path).load()
+    return _inventory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看运行中容器的清单（首次列出，之后按 docker events 增量更新）。")
+    parser.add_argument("--path", default=DEFAULT_INVENTORY_FILE, help=f"清单快照文件（默认为 {DEFAULT_INVENTORY_FILE}，也可通过 NET_TWIN_INVENTORY 设置）。")
+    parser.add_argument("--lab-id", help="只列出名称中包含该实验 ID 的容器及其节点 ID。")
+    parser.add_argument("--rebuild", action="store_true", help="忽略快照，重新列出所有容器。")
+    parser.add_argument("--follow", action="store_true", help="持续跟随事件流并打印清单的变化。")
+    args = parser.parse_args()
+
+    inventory = ContainerInventory(get_client(), args.path)
+    if args.rebuild:
+        inventory.rebuild()
+    else:
+        inventory.load()
+    if args.lab_id:
+        for node_id, container_id in sorted(inventory.lab_nodes(args.lab_id).items(), key=lambda item: int(item[0])):
+            print(f"{node_id} {container_id}")
+    else:
+        for name, container_id in sorted(inventory.name_to_id().items()):
+            print(f"{container_id} {name}")
+    if args.follow:
+        if inventory.client is None:
+            print("Docker Engine API 不可用，无法跟随事件流", file=sys.stderr)
+            sys.exit(1)
+        inventory.watch()
+        previous = inventory.name_to_id()
+        while True:
+            time.sleep(1)
+            current = inventory.name_to_id()
+            for name in current.keys() - previous.keys():
+                print(f"+ {current[name]} {name}")
+            for name in previous.keys() - current.keys():
+                print(f"- {previous[name]} {name}")
+            previous = current
@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import threading
+
+DEFAULT_BREAKER_FILE = os.environ.get("NET_TWIN_BREAKER", "/tmp/net-twin-breaker.json")
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """时间预算：作业一个总预算，每台设备从中切出自己的预算，任何阻塞操作的超时都不超过剩余时间"""
+
+    def __init__(self, seconds, parent=None):
+        expires = time.monotonic() + seconds
+        if parent is not None:
+            expires = min(expires, parent.expires)
+        self.expires = expires
+
+    def child(self, seconds):
+        return Deadline(seconds, parent=self)
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("deadline exceeded")
+
+    def timeout(self, default):
+        """返回不超过剩余时间的超时值，预算已用完时抛出 DeadlineExceeded"""
+        self.check()
+        return min(default, self.remaining()) if default else self.remaining()
+
+
+def bounded_timeout(deadline, default):
+    """deadline 为 None 时原样返回 default"""
+    return default if deadline is None else deadline.timeout(default)
+
+
+class CircuitBreaker:
+    """连续失败 threshold 次的设备在 reset_timeout 秒内直接跳过，之后放行一次试探。
+
+    状态保存在 JSON 文件中，反复超时的设备在之后的运行中同样被快速跳过。
+    """
+
+    def __init__(self, path=DEFAULT_BREAKER_FILE, threshold=3, reset_timeout=300):
+        self.path = path
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.states = self.load()
+
+    def load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.states, f, indent=4)
+            os.replace(tmp_path, self.path)
+
+    def allow(self, key):
+        with self.lock:
+            state = self.states.get(key)
+            if state is None or state["failures"] < self.threshold:
+                return True
+            # 打开状态超过 reset_timeout 后放行一次；试探失败会重新计时
+            return time.time() - state["opened_at"] >= self.reset_timeout
+
+    def record_success(self, key):
+        with self.lock:
+            self.states.pop(key, None)
+
+    def record_failure(self, key):
+        with self.lock:
+            state = self.states.setdefault(key, {"failures": 0, "opened_at": 0})
+            state["failures"] += 1
+            if state["failures"] >= self.threshold:
+                state["opened_at"] = time.time()
@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import argparse
+import threading
+from urllib.parse import quote, urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DOCKER_SOCKET = os.environ.get("NET_TWIN_DOCKER_SOCKET", "/var/run/docker.sock")
+
+# 非 TTY 的 exec 输出按帧复用 stdout/stderr：1 字节流类型 + 3 字节填充 + 4 字节大端长度
+FRAME_HEADER = struct.Struct('>BxxxI')
+
+
+class DockerError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status} {message}")
+        self.status = status
+        self.message = message
+
+
+class StaleConnection(ConnectionError):
+    """复用的空闲连接已被服务端关闭，请求没有发出去，可以换一个连接重发"""
+
+
+class DockerClient:
+    """通过 Unix socket 直接访问 Docker Engine API 的最小客户端，支持容器列表、exec 和 stats。
+
+    请求使用 HTTP/1.1 长连接，用完的连接放回空闲池中复用，一个作业里的上百次调用只需要少数几个连接，
+    也不再为每次调用启动一个 docker CLI 进程。exec start 会把连接接管为原始数据流，因此总是使用单独的新连接。
+    可以在多个线程中共享同一个客户端。
+    """
+
+    def __init__(self, socket_path=DEFAULT_DOCKER_SOCKET, timeout=30, max_idle=8):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = []  # [(socket, 读文件)]
+        self.lock = threading.Lock()
+
+    def connect(self, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout or self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock, sock.makefile('rb')
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self.connect(), False
+
+    def release(self, connection):
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(connection)
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        sock, rfile = connection
+        try:
+            rfile.close()
+            sock.close()
+        except OSError:
+            pass
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            self.discard(connection)
+
+    def encode_request(self, method, path, body=None, headers=None):
+        payload = b'' if body is None else json.dumps(body).encode('utf-8')
+        lines = [f"{method} {path} HTTP/1.1", "Host: docker", "User-Agent: net-twin"]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(payload)}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('ascii') + payload
+
+    def read_head(self, rfile, reused=False):
+        """读取状态行和响应头，返回 (状态码, {小写头名: 值})"""
+        status_line = rfile.readline(65537)
+        if not status_line:
+            if reused:
+                raise StaleConnection("connection closed by docker daemon")
+            raise ConnectionError("connection closed by docker daemon")
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ConnectionError(f"malformed status line from docker daemon: {status_line[:80]!r}")
+        headers = {}
+        while True:
+            line = rfile.readline(65537)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return int(parts[1]), headers
+
+    def read_body(self, rfile, status, headers):
+        """按 chunked / Content-Length / 读到连接关闭 三种方式读取响应体，返回 (响应体, 连接能否复用)"""
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if status in (204, 304) or 100 <= status < 200:
+            return b'', keep_alive
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size_line = rfile.readline(65537)
+                if not size_line:
+                    raise ConnectionError("connection closed in the middle of a chunked response")
+                size = int(size_line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    # 跳过可能存在的 trailer
+                    while rfile.readline(65537) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks), keep_alive
+                chunks.append(self.read_exact(rfile, size))
+                rfile.readline(65537)
+        if 'content-length' in headers:
+            return self.read_exact(rfile, int(headers['content-length'])), keep_alive
+        return rfile.read(), False
+
+    def read_exact(self, rfile, size):
+        data = rfile.read(size)
+        if len(data) < size:
+            raise ConnectionError("connection closed in the middle of a response")
+        return data
+
+    def send(self, method, path, body=None, query=None):
+        """在一个长连接上发送请求，返回 (状态码, 响应体)"""
+        if query:
+            path = f"{path}?{urlencode(query)}"
+        data = self.encode_request(method, path, body)
+        while True:
+            connection, reused = self.acquire()
+            sock, rfile = connection
+            try:
+                sock.sendall(data)
+            except OSError:
+                self.discard(connection)
+                if reused:
+                    continue
+                raise
+            try:
+                status, headers = self.read_head(rfile, reused)
+                payload, keep_alive = self.read_body(rfile, status, headers)
+            except StaleConnection:
+                # 复用的空闲连接已被服务端关闭，请求没有被处理，换一个连接重发；新建的连接失败会直接抛出
+                self.discard(connection)
+                continue
+            except (OSError, ValueError):
+                self.discard(connection)
+                raise
+            if keep_alive:
+                self.release(connection)
+            else:
+                self.discard(connection)
+            return status, payload
+
+    def request(self, method, path, body=None, query=None, expect=(200,)):
+        """发送一个请求并返回解析后的 JSON（响应体为空时返回 None），状态码不在 expect 中时抛出 DockerError"""
+        status, payload = self.send(method, path, body, query)
+        if status not in expect:
+            try:
+                message = json.loads(payload).get("message", "")
+            except (ValueError, AttributeError):
+                message = payload.decode('utf-8', 'replace').strip()
+            raise DockerError(status, message)
+        if not payload:
+            return None
+        return json.loads(payload)
+
+    def ping(self):
+        """守护进程可以访问时返回 True"""
+        try:
+            status, _ = self.send("GET", "/_ping")
+        except (OSError, ValueError):
+            return False
+        return status == 200
+
+    def containers(self, all=False, filters=None):
+        """GET /containers/json，filters 形如 {"name": ["lab"]}"""
+        query = {}
+        if all:
+            query["all"] = "1"
+        if filters:
+            query["filters"] = json.dumps(filters)
+        return self.request("GET", "/containers/json", query=query)
+
+    def running_containers(self):
+        """返回 {容器名称: 12 位短 ID}，与 docker ps --format '{{.ID}} {{.Names}}' 的解析结果一致"""
+        containers = {}
+        for container in self.containers():
+            names = container.get("Names") or []
+            if names:
+                containers[names[0].lstrip('/')] = container["Id"][:12]
+        return containers
+
+    def exec(self, container_id, command, timeout=None):
+        """在容器中执行 command（参数列表），返回 (退出码, stdout, stderr)"""
+        created = self.request("POST", f"/containers/{quote(container_id)}/exec", expect=(201,),
+                               body={"AttachStdout": True, "AttachStderr": True, "Tty": False, "Cmd": list(command)})
+        exec_id = created["Id"]
+        stdout, stderr = self.exec_start(exec_id, timeout)
+        for attempt in range(50):
+            info = self.request("GET", f"/exec/{exec_id}/json")
+            if not info.get("Running"):
+                break
+            # 输出流关闭与进程状态更新之间有极短的间隔
+            time.sleep(0.01)
+        return info.get("ExitCode"), stdout, stderr
+
+    def exec_start(self, exec_id, timeout=None):
+        sock, rfile = self.connect(timeout)
+        try:
+            sock.sendall(self.encode_request("POST", f"/exec/{exec_id}/start", {"Detach": False, "Tty": False},
+                                             headers={"Connection": "Upgrade", "Upgrade": "tcp"}))
+            status, headers = self.read_head(rfile)
+            if status not in (101, 200):
+                payload, _ = self.read_body(rfile, status, headers)
+                try:
+                    message = json.loads(payload).get("message", "")
+                except (ValueError, AttributeError):
+                    message = payload.decode('utf-8', 'replace').strip()
+                raise DockerError(status, message)
+            if 'raw-stream' in headers.get('content-type', ''):
+                return rfile.read().decode('utf-8', 'replace'), ""
+            streams = {1: [], 2: []}
+            while True:
+                header = rfile.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    break
+                stream, size = FRAME_HEADER.unpack(header)
+                streams.get(stream, streams[1]).append(self.read_exact(rfile, size))
+            return b''.join(streams[1]).decode('utf-8', 'replace'), b''.join(streams[2]).decode('utf-8', 'replace')
+        finally:
+            self.discard((sock, rfile))
+
+    def events(self, since=None, until=None, filters=None, timeout=None):
+        """GET /events，逐个返回事件（dict）。
+
+        指定 until 时守护进程返回 since 到 until 之间的历史事件后结束；不指定时持续等待新事件，
+        timeout 为 None 表示一直阻塞。事件流占用一个单独的连接。
+        """
+        query = {}
+        if since is not None:
+            query["since"] = since
+        if until is not None:
+            query["until"] = until
+        if filters:
+            query["filters"] = json.dumps(filters)
+        sock, rfile = self.connect()
+        try:
+            sock.settimeout(timeout)
+            sock.sendall(self.encode_request("GET", f"/events?{urlencode(query)}" if query else "/events"))
+            status, headers = self.read_head(rfile)
+            if status != 200:
+                payload, _ = self.read_body(rfile, status, headers)
+                raise DockerError(status, payload.decode('utf-8', 'replace').strip())
+            buffer = b''
+            for data in self.iter_body(rfile, headers):
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    if line.strip():
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+        finally:
+            self.discard((sock, rfile))
+
+    def iter_body(self, rfile, headers):
+        """按收到的顺序逐段返回响应体，用于事件流这类不会一次结束的响应"""
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                size_line = rfile.readline(65537)
+                if not size_line:
+                    return
+                size = int(size_line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    return
+                yield self.read_exact(rfile, size)
+                rfile.readline(65537)
+        elif 'content-length' in headers:
+            yield self.read_exact(rfile, int(headers['content-length']))
+        else:
+            while True:
+                line = rfile.readline(65537)
+                if not line:
+                    return
+                yield line
+
+    def stats(self, container_id):
+        """GET /containers/{id}/stats?stream=false，返回原始统计（包含计算 CPU 使用率所需的 precpu_stats）"""
+        return self.request("GET", f"/containers/{quote(container_id)}/stats", query={"stream": "false"})
+
+    def stats_all(self, container_ids, max_workers=64):
+        """并发获取多个容器的统计，返回 {容器 ID: 原始统计}；守护进程对每个容器都要采样约 1 秒，并发后总耗时与容器数基本无关"""
+        def fetch(container_id):
+            try:
+                return self.stats(container_id)
+            except (OSError, ValueError, DockerError) as e:
+                print(f"Failed to get docker stats for container {container_id}. Error: {e}")
+                return None
+
+        if not container_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(container_ids))) as executor:
+            results = list(executor.map(fetch, container_ids))
+        return {container_id: stats for container_id, stats in zip(container_ids, results) if stats is not None}
+
+
+def summarize_stats(stats):
+    """按 docker stats 的算法把原始统计换算成与 CgroupStats.sample 相同的字段"""
+    cpu = stats.get("cpu_stats") or {}
+    precpu = stats.get("precpu_stats") or {}
+    cpu_delta = (cpu.get("cpu_usage") or {}).get("total_usage", 0) - (precpu.get("cpu_usage") or {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online_cpus = cpu.get("online_cpus") or len((cpu.get("cpu_usage") or {}).get("percpu_usage") or []) or 1
+    cpu_percent = cpu_delta / system_delta * online_cpus * 100.0 if system_delta > 0 and cpu_delta > 0 else 0.0
+
+    memory = stats.get("memory_stats") or {}
+    memory_detail = memory.get("stats") or {}
+    # cgroup v1 为 total_inactive_file，v2 为 inactive_file
+    cache = memory_detail.get("total_inactive_file", memory_detail.get("inactive_file", 0))
+    usage = max(memory.get("usage", 0) - cache, 0)
+    limit = memory.get("limit")
+
+    block_read = block_write = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = entry.get("op", "").lower()
+        if op == "read":
+            block_read += entry.get("value", 0)
+        elif op == "write":
+            block_write += entry.get("value", 0)
+
+    networks = stats.get("networks")
+    net_rx = sum(n.get("rx_bytes", 0) for n in networks.values()) if networks else None
+    net_tx = sum(n.get("tx_bytes", 0) for n in networks.values()) if networks else None
+
+    return {
+        "cpu_usage": (cpu.get("cpu_usage") or {}).get("total_usage", 0),
+        "cpu_percent": round(cpu_percent, 2),
+        "memory_usage": usage,
+        "memory_limit": limit,
+        "memory_percent": round(usage * 100.0 / limit, 2) if limit else None,
+        "block_read": block_read,
+        "block_write": block_write,
+        "net_rx": net_rx,
+        "net_tx": net_tx,
+        "pids": (stats.get("pids_stats") or {}).get("current"),
+    }
+
+
+def get_client(socket_path=DEFAULT_DOCKER_SOCKET, timeout=30):
+    """Docker Engine API 可以访问时返回 DockerClient，否则返回 None，调用方退回 docker CLI"""
+    client = DockerClient(socket_path, timeout=timeout)
+    if client.ping():
+        return client
+    client.close()
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="通过 Docker Engine API 列出容器、在容器中执行命令或获取统计。")
+    parser.add_argument("--socket", default=DEFAULT_DOCKER_SOCKET, help=f"Docker socket 路径（默认为 {DEFAULT_DOCKER_SOCKET}，也可通过 NET_TWIN_DOCKER_SOCKET 设置）。")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("ps", help="列出运行中的容器。")
+    exec_parser = sub.add_parser("exec", help="在容器中执行命令。")
+    exec_parser.add_argument("container")
+    exec_parser.add_argument("command", nargs=argparse.REMAINDER)
+    stats_parser = sub.add_parser("stats", help="获取容器的资源使用情况。")
+    stats_parser.add_argument("containers", nargs="+")
+    args = parser.parse_args()
+
+    client = DockerClient(args.socket)
+    try:
+        if args.action == "ps":
+            for name, container_id in client.running_containers().items():
+                print(f"{container_id} {name}")
+        elif args.action == "exec":
+            exit_code, stdout, stderr = client.exec(args.container, args.command)
+            sys.stdout.write(stdout)
+            sys.stderr.write(stderr)
+            sys.exit(exit_code or 0)
+        else:
+            raw = client.stats_all(args.containers)
+            print(json.dumps({container_id: summarize_stats(stats) for container_id, stats in raw.items()}, indent=4))
+    except (OSError, DockerError) as e:
+        print(f"无法访问 Docker Engine API {args.socket}: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        client.close()
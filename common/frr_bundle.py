@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import shlex
+import secrets
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.docker_api import DockerError
+
+FRR_CONF = "/etc/frr/frr.conf"
+RUNNING_CONFIG = "show running-config"
+DEFAULT_FILES = (FRR_CONF,)
+DEFAULT_COMMANDS = (RUNNING_CONFIG,)
+DEFAULT_JSON_COMMANDS = ("show ip route json", "show bgp summary json", "show ip ospf neighbor json")
+
+
+def bundle_items(files=DEFAULT_FILES, commands=DEFAULT_COMMANDS, json_commands=()):
+    """返回 [(名称, shell 命令)]：文件以路径为名称，vtysh 命令以命令本身为名称"""
+    items = [(path, f"cat {shlex.quote(path)}") for path in files]
+    items += [(command, f"vtysh -c {shlex.quote(command)}") for command in list(commands) + list(json_commands)]
+    return items
+
+
+def bundle_script(items, boundary):
+    """把所有条目合成一个 shell 脚本，每段输出前后各有一行带随机 boundary 的分隔行，结束行带退出码"""
+    lines = []
+    for name, command in items:
+        lines.append(f"printf '\\n%s begin %s\\n' {boundary} {shlex.quote(name)}")
+        lines.append(f"{command} 2>&1")
+        lines.append(f"printf '\\n%s end %d\\n' {boundary} $?")
+    return "\n".join(lines) + "\n"
+
+
+def parse_bundle(output, boundary):
+    """按分隔行切分脚本输出，返回 ({名称: 输出}, {名称: 退出码})；没有结束行的条目（输出被截断）退出码为 None"""
+    outputs = {}
+    status = {}
+    name = None
+    content = []
+    for line in output.split("\n"):
+        if line.startswith(boundary + " "):
+            marker, _, rest = line[len(boundary) + 1:].partition(" ")
+            if marker == "begin":
+                name, content = rest, []
+                status[name] = None
+                continue
+            if marker == "end" and name is not None:
+                # 去掉分隔行前由 printf 补上的换行
+                outputs[name] = "\n".join(content[:-1] if content and content[-1] == "" else content)
+                status[name] = int(rest) if rest.lstrip('-').isdigit() else None
+                name = None
+                continue
+        if name is not None:
+            content.append(line)
+    if name is not None:
+        outputs[name] = "\n".join(content)
+    return outputs, status
+
+
+def collect_bundle(container_id, items, client=None, timeout=60):
+    """在容器中执行一次 exec 取回 items 中的全部输出，返回 {"container_id", "outputs", "status", "error"}"""
+    boundary = f"@@net-twin-{secrets.token_hex(8)}@@"
+    command = ["sh", "-c", bundle_script(items, boundary)]
+    bundle = {"container_id": container_id, "outputs": {}, "status": {}, "error": None}
+    try:
+        if client is not None:
+            _, stdout, stderr = client.exec(container_id, command, timeout=timeout)
+        else:
+            result = subprocess.run(['docker', 'exec', container_id] + command, capture_output=True, text=True, timeout=timeout)
+            stdout, stderr = result.stdout, result.stderr
+    except (OSError, DockerError, subprocess.SubprocessError) as e:
+        bundle["error"] = str(e)
+        return bundle
+    bundle["outputs"], bundle["status"] = parse_bundle(stdout, boundary)
+    if not bundle["status"]:
+        bundle["error"] = stderr.strip() or "empty output"
+    return bundle
+
+
+def collect_bundles(container_ids, files=DEFAULT_FILES, commands=DEFAULT_COMMANDS, json_commands=(),
+                    client=None, max_workers=16, timeout=60):
+    """并发对每个容器执行一次 exec，返回 {容器 ID: bundle}，顺序与 container_ids 相同"""
+    items = bundle_items(files, commands, json_commands)
+    if not container_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(container_ids))) as executor:
+        bundles = list(executor.map(lambda container_id: collect_bundle(container_id, items, client, timeout), container_ids))
+    return dict(zip(container_ids, bundles))
+
+
+def bundle_output(bundle, name):
+    """条目成功时返回其输出，否则返回 None"""
+    if bundle["status"].get(name) != 0:
+        return None
+    return bundle["outputs"].get(name)
+
+
+def bundle_json(bundle, command):
+    """解析 json 命令的输出，失败时返回 None"""
+    output = bundle_output(bundle, command)
+    if not output:
+        return None
+    try:
+        return json.loads(output)
+    except ValueError:
+        return None
+
+
+def bundle_config(bundle):
+    """frr.conf 的内容；文件不可读时用 show running-config 代替，都失败时返回 None"""
+    config = bundle_output(bundle, FRR_CONF)
+    if config:
+        return config
+    running = bundle_output(bundle, RUNNING_CONFIG)
+    if running and "% Unknown command" not in running:
+        return running
+    return None
+
+
+if __name__ == "__main__":
+    from common.docker_api import get_client
+
+    parser = argparse.ArgumentParser(description="对每个 FRR 容器只执行一次 exec，取回配置文件和 vtysh 命令输出。")
+    parser.add_argument("containers", nargs="+", help="容器 ID 或名称。")
+    parser.add_argument("--file", action="append", dest="files", help=f"要读取的文件（可重复，默认为 {FRR_CONF}）。")
+    parser.add_argument("--command", action="append", dest="commands", help=f"要执行的 vtysh 命令（可重复，默认为 {RUNNING_CONFIG}）。")
+    parser.add_argument("--json-command", action="append", dest="json_commands",
+                        help=f"要执行并解析为 JSON 的 vtysh 命令（可重复，默认为 {', '.join(DEFAULT_JSON_COMMANDS)}）。")
+    args = parser.parse_args()
+
+    bundles = collect_bundles(args.containers, args.files or DEFAULT_FILES, args.commands or DEFAULT_COMMANDS,
+                              args.json_commands or DEFAULT_JSON_COMMANDS, client=get_client())
+    print(json.dumps(bundles, indent=4, ensure_ascii=False))
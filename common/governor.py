@@ -0,0 +1,204 @@
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+class AimdLimit:
+    """按 AIMD 调整的并发上限。
+
+    成功且延迟未明显超过基线时增加：第一次减少之前每个任务加 1（慢启动，每轮约翻倍），
+    之后加性增加（每完成约 limit 个任务上限加 1）；出错或延迟超过基线的 tolerance 倍时乘性减少，
+    同一个延迟周期内只减少一次，避免一批同时失败的任务把上限直接压到最低。基线取观察到的最小延迟，并缓慢上漂以适应整体变慢；
+    比基线多出不到 min_excess 秒的抖动不视为拥塞。
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, tolerance=2.0, backoff=0.5, min_excess=0.1):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.min_excess = min_excess
+        self.baseline = None
+        self.last_decrease = 0.0
+        self.slow_start = True
+
+    def on_sample(self, latency, ok):
+        now = time.monotonic()
+        if ok:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - self.baseline) * 0.01
+
+        if not ok or latency > max(self.tolerance * self.baseline, self.baseline + self.min_excess):
+            if now - self.last_decrease >= latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = now
+                self.slow_start = False
+        else:
+            step = 1.0 if self.slow_start else 1.0 / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+
+class Slot:
+    """一次占用的并发名额；observe 记录命令延迟，fail 标记本次采集失败"""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.samples = []
+        self.ok = True
+
+    def observe(self, latency):
+        self.samples.append(latency)
+
+    def fail(self):
+        self.ok = False
+
+    def latency(self):
+        # 没有单独记录命令延迟时，以整个任务的耗时作为延迟
+        return max(self.samples) if self.samples else time.monotonic() - self.start
+
+
+class HostGovernor:
+    """线程版：同一控制台主机上同时进行的会话数不超过当前 AIMD 上限"""
+
+    def __init__(self, **limits):
+        self.aimd = AimdLimit(**limits)
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.aimd.current:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, latency, ok):
+        with self.condition:
+            self.active -= 1
+            self.aimd.on_sample(latency, ok)
+            self.condition.notify_all()
+
+
+class AsyncHostGovernor:
+    """asyncio 版，语义与 HostGovernor 相同"""
+
+    def __init__(self, **limits):
+        self.aimd = AimdLimit(**limits)
+        self.active = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.aimd.current)
+            self.active += 1
+
+    async def release(self, latency, ok):
+        async with self.condition:
+            self.active -= 1
+            self.aimd.on_sample(latency, ok)
+            self.condition.notify_all()
+
+    async def suspend(self):
+        """暂时让出名额，不计入 AIMD 样本"""
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+
+class ConcurrencyGovernor:
+    """按控制台主机分别限流：所有设备通常位于同一台 EVE-NG 主机后面，真正的瓶颈是这台主机。
+
+    用法：
+        with governor.slot(host) as slot:
+            ...  # 可调用 slot.observe(latency) / slot.fail()
+    任务抛出异常时同样计为失败。
+    """
+
+    host_class = HostGovernor
+
+    def __init__(self, **limits):
+        self.limits = limits
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def for_host(self, host):
+        with self.lock:
+            governor = self.hosts.get(host)
+            if governor is None:
+                governor = self.hosts[host] = self.host_class(**self.limits)
+            return governor
+
+    @contextmanager
+    def slot(self, host):
+        governor = self.for_host(host)
+        governor.acquire()
+        slot = Slot()
+        try:
+            yield slot
+        except BaseException:
+            slot.fail()
+            raise
+        finally:
+            governor.release(slot.latency(), slot.ok)
+
+    def report(self):
+        for host, governor in self.hosts.items():
+            print(f"Concurrency limit for {host}: {governor.aimd.current}")
+
+
+class AsyncConcurrencyGovernor(ConcurrencyGovernor):
+    """asyncio 版：async with governor.slot(host) as slot"""
+
+    host_class = AsyncHostGovernor
+
+    @asynccontextmanager
+    async def slot(self, host):
+        governor = self.for_host(host)
+        await governor.acquire()
+        slot = Slot()
+        try:
+            yield slot
+        except BaseException:
+            slot.fail()
+            raise
+        finally:
+            await governor.release(slot.latency(), slot.ok)
+
+    @asynccontextmanager
+    async def idle(self, host):
+        """在 slot 内使用：等待设备自行完成工作（例如 NQA 测试）期间让出名额，结束后重新排队占用"""
+        governor = self.for_host(host)
+        await governor.suspend()
+        try:
+            yield
+        finally:
+            await governor.acquire()
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor(max_limit=None):
+    """返回本进程共享的 ConcurrencyGovernor（线程版）。
+
+    同一进程中的各个采集器登录的通常是同一台 EVE-NG 主机，共用一个实例才能让它们的会话一起受每台主机的 AIMD 上限约束。
+    max_limit 取各调用方要求中的最大值。
+    """
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = ConcurrencyGovernor(**({} if max_limit is None else {"max_limit": max_limit}))
+        elif max_limit is not None and max_limit > _governor.limits.get("max_limit", AimdLimit().max_limit):
+            with _governor.lock:
+                _governor.limits["max_limit"] = max_limit
+                for governor in _governor.hosts.values():
+                    governor.aimd.max_limit = max_limit
+        return _governor
@@ -0,0 +1,265 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import struct
+import argparse
+import threading
+
+DEFAULT_STORE_DIR = os.environ.get("NET_TWIN_NQA_STORE", "/tmp/net-twin-nqa-store")
+METRICS = ("latency", "jitter", "packet_loss")
+# 各指标视为异常的最小变化量：时延、抖动以毫秒计，丢包率以百分比计（probe-count 为 5 时丢一个包就是 20%）
+MIN_DELTA = {"latency": 2.0, "jitter": 2.0, "packet_loss": 10.0}
+
+# 原始样本：时间戳、时延、抖动、丢包率，缺失的指标记为 NaN
+SAMPLE = struct.Struct('<dfff')
+# 汇总：时间段起点、样本数，以及每个指标的平均值和最大值
+ROLLUP = struct.Struct('<dI' + 'ff' * len(METRICS))
+
+
+def safe_name(name):
+    return re.sub(r'[^\w.\-]', '_', str(name))
+
+
+class MetricDetector:
+    """单个指标的流式异常检测，状态可序列化为 dict。
+
+    EWMA 跟踪均值和方差，新样本超出均值 threshold 个标准差（且差值不小于 min_delta）时视为异常；
+    同时按一天中的小时维护季节性基线，样本落在本小时的历史范围内时不报告，避免每天固定时段的高峰被反复告警。
+    只检测变差的方向（时延、抖动、丢包增大）。异常样本只以较小的 anomaly_alpha 更新均值，短暂的劣化不会很快被“学习”成正常值；
+    连续 rebaseline_after 个样本都异常时认为指标已经稳定在新的水平，基线直接换成这段异常样本自身的均值和方差。
+    """
+
+    def __init__(self, state=None, alpha=0.1, threshold=3.0, warmup=10, min_delta=1.0, season_warmup=3,
+                 anomaly_alpha=0.01, rebaseline_after=30):
+        state = state or {}
+        self.mean = state.get("mean")
+        self.var = state.get("var", 0.0)
+        self.count = state.get("count", 0)
+        self.seasons = state.get("seasons", {})  # 小时 -> [mean, var, count]
+        self.streak = state.get("streak", 0)  # 连续异常的样本数
+        self.shadow = state.get("shadow")  # 这段连续异常样本的 [mean, var]
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_delta = min_delta
+        self.season_warmup = season_warmup
+        self.anomaly_alpha = anomaly_alpha
+        self.rebaseline_after = rebaseline_after
+
+    def state(self):
+        return {"mean": self.mean, "var": self.var, "count": self.count, "seasons": self.seasons,
+                "streak": self.streak, "shadow": self.shadow}
+
+    def exceeds(self, value, mean, var):
+        std = math.sqrt(var) if var > 0 else 0.0
+        return value - mean >= max(self.threshold * std, self.min_delta), (value - mean) / std if std else None
+
+    def update(self, value, timestamp):
+        """加入一个样本，返回异常描述或 None"""
+        hour = str(time.localtime(timestamp).tm_hour)
+        season = self.seasons.get(hour)
+        anomaly = None
+
+        if self.mean is not None and self.count >= self.warmup:
+            exceeded, score = self.exceeds(value, self.mean, self.var)
+            if exceeded and season and season[2] >= self.season_warmup:
+                exceeded, score = self.exceeds(value, season[0], season[1])
+                expected = season[0]
+            else:
+                expected = self.mean
+            if exceeded:
+                anomaly = {"value": round(value, 3), "expected": round(expected, 3),
+                           "score": round(score, 2) if score is not None else None}
+
+        mean, var, count = season or (None, 0.0, 0)
+        if anomaly is None:
+            self.streak, self.shadow = 0, None
+            self.mean, self.var = self.ewma(self.mean, self.var, value, self.alpha)
+            mean, var = self.ewma(mean, var, value, self.alpha)
+        else:
+            # 异常样本只让均值缓慢移动，不计入方差，否则方差很快被撑大，几个样本后异常就不再被报告
+            self.streak += 1
+            self.shadow = list(self.ewma(*(self.shadow or (None, 0.0)), value, self.alpha))
+            self.mean = self.ewma(self.mean, self.var, value, self.anomaly_alpha)[0]
+            mean = self.ewma(mean, var, value, self.anomaly_alpha)[0]
+        self.count += 1
+        if anomaly is None or season:
+            # 异常样本不新建季节性基线，否则新的一小时会以异常值为基线，之后的异常都被当成本时段的正常范围
+            self.seasons[hour] = [mean, var, count + 1]
+
+        if self.streak >= self.rebaseline_after:
+            # 持续异常：指标已经换了水平（例如路径切换后时延整体变大），以新水平重新建立基线
+            self.mean, self.var = self.shadow
+            self.seasons[hour] = [self.mean, self.var, count + 1]
+            self.streak, self.shadow = 0, None
+        return anomaly
+
+    def ewma(self, mean, var, value, alpha):
+        if mean is None:
+            return value, 0.0
+        diff = value - mean
+        increment = alpha * diff
+        return mean + increment, (1 - alpha) * (var + diff * increment)
+
+
+class NqaStore:
+    """NQA 测量结果的只追加时间序列存储。
+
+    每个 (设备, 目的地址) 一个二进制文件，每个样本 20 字节定长记录，追加写入；
+    periods 中的每个周期（默认 1 小时和 1 天）另有一个汇总文件，当前未结束的时间段和异常检测状态
+    保存在状态文件中。每次追加只更新这几个文件，不需要读取历史数据。
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, periods=(3600, 86400), min_delta=None, **detector_options):
+        self.root = root
+        self.periods = periods
+        self.min_delta = dict(MIN_DELTA, **(min_delta or {}))
+        self.detector_options = detector_options
+        self.lock = threading.Lock()
+
+    def series_path(self, device, destination, suffix):
+        return os.path.join(self.root, safe_name(device), f"{safe_name(destination)}{suffix}")
+
+    def load_state(self, device, destination):
+        try:
+            with open(self.series_path(device, destination, '.state.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, device, destination, state):
+        path = self.series_path(device, destination, '.state.json')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def append(self, device, destination, metrics, timestamp=None):
+        """追加一次测量，更新汇总并进行异常检测，返回 {指标: 异常描述}，没有异常时为空 dict"""
+        timestamp = time.time() if timestamp is None else timestamp
+        values = [metrics.get(name) for name in METRICS]
+        values = [float('nan') if value is None else float(value) for value in values]
+
+        with self.lock:
+            os.makedirs(os.path.dirname(self.series_path(device, destination, '')), exist_ok=True)
+            with open(self.series_path(device, destination, '.bin'), 'ab') as f:
+                f.write(SAMPLE.pack(timestamp, *values))
+
+            state = self.load_state(device, destination)
+            buckets = state.setdefault("buckets", {})
+            for period in self.periods:
+                self.roll(device, destination, period, buckets, timestamp, values)
+
+            anomalies = {}
+            detectors = state.setdefault("detectors", {})
+            for name, value in zip(METRICS, values):
+                if math.isnan(value):
+                    continue
+                detector = MetricDetector(detectors.get(name), min_delta=self.min_delta[name], **self.detector_options)
+                anomaly = detector.update(value, timestamp)
+                detectors[name] = detector.state()
+                if anomaly:
+                    anomalies[name] = anomaly
+            self.save_state(device, destination, state)
+        return anomalies
+
+    def roll(self, device, destination, period, buckets, timestamp, values):
+        """把样本计入 period 对应的当前时间段，进入新的时间段时把上一段写入汇总文件"""
+        start = timestamp - timestamp % period
+        bucket = buckets.get(str(period))
+        if bucket and bucket["start"] != start:
+            self.write_rollup(device, destination, period, bucket)
+            bucket = None
+        if not bucket:
+            bucket = buckets[str(period)] = {"start": start, "count": 0,
+                                             "sum": [0.0] * len(METRICS), "n": [0] * len(METRICS),
+                                             "max": [None] * len(METRICS)}
+        bucket["count"] += 1
+        for i, value in enumerate(values):
+            if math.isnan(value):
+                continue
+            bucket["sum"][i] += value
+            bucket["n"][i] += 1
+            bucket["max"][i] = value if bucket["max"][i] is None else max(bucket["max"][i], value)
+
+    def write_rollup(self, device, destination, period, bucket):
+        fields = []
+        for i in range(len(METRICS)):
+            n = bucket["n"][i]
+            fields += [bucket["sum"][i] / n if n else float('nan'),
+                       bucket["max"][i] if bucket["max"][i] is not None else float('nan')]
+        with open(self.series_path(device, destination, f'.r{period}.bin'), 'ab') as f:
+            f.write(ROLLUP.pack(bucket["start"], bucket["count"], *fields))
+
+    def read(self, device, destination, start=None, end=None):
+        """返回 [(时间戳, {指标: 值}), ...]，缺失的指标为 None"""
+        return self.read_records(self.series_path(device, destination, '.bin'), SAMPLE, start, end,
+                                 lambda record: (record[0], self.to_metrics(record[1:])))
+
+    def read_rollup(self, device, destination, period, start=None, end=None):
+        """返回 [(时间段起点, 样本数, {指标: {"avg": 平均值, "max": 最大值}}), ...]，不含尚未结束的当前时间段"""
+        def convert(record):
+            values = record[2:]
+            summary = {name: {"avg": self.to_value(values[2 * i]), "max": self.to_value(values[2 * i + 1])}
+                       for i, name in enumerate(METRICS)}
+            return record[0], record[1], summary
+        return self.read_records(self.series_path(device, destination, f'.r{period}.bin'), ROLLUP, start, end, convert)
+
+    def read_records(self, path, record_struct, start, end, convert):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return []
+        # 只读取完整的记录，忽略写入到一半的尾部
+        usable = len(data) - len(data) % record_struct.size
+        records = []
+        for record in record_struct.iter_unpack(data[:usable]):
+            if (start is None or record[0] >= start) and (end is None or record[0] < end):
+                records.append(convert(record))
+        return records
+
+    def to_value(self, value):
+        return None if math.isnan(value) else round(value, 3)
+
+    def to_metrics(self, values):
+        return {name: self.to_value(value) for name, value in zip(METRICS, values)}
+
+    def series(self):
+        """返回已有的所有 (设备, 目的地址)"""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for device in sorted(os.listdir(self.root)):
+            for name in sorted(os.listdir(os.path.join(self.root, device))):
+                if name.endswith('.bin') and not re.search(r'\.r\d+\.bin$', name):
+                    result.append((device, name[:-len('.bin')]))
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看 NQA 测量时间序列。")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help=f"存储目录（默认为 {DEFAULT_STORE_DIR}，也可通过 NET_TWIN_NQA_STORE 设置）。")
+    parser.add_argument("--device", help="设备 sysname，不指定时列出所有序列。")
+    parser.add_argument("--destination", help="目的地址，与 --device 一起使用。")
+    parser.add_argument("--rollup", type=int, help="显示该周期（秒）的汇总而不是原始样本。")
+    parser.add_argument("--since", type=float, default=None, help="只显示最近这么多秒内的数据。")
+    args = parser.parse_args()
+
+    store = NqaStore(args.store_dir)
+    if not args.device or not args.destination:
+        for device, destination in store.series():
+            print(f"{device} {destination}")
+        sys.exit(0)
+
+    start = time.time() - args.since if args.since else None
+    if args.rollup:
+        records = store.read_rollup(args.device, args.destination, args.rollup, start)
+    else:
+        records = store.read(args.device, args.destination, start)
+    for record in records:
+        print(json.dumps([time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record[0]))] + list(record[1:]),
+                         ensure_ascii=False))
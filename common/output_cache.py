@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+
+DEFAULT_CACHE_DIR = os.environ.get("NET_TWIN_CACHE", "/tmp/net-twin-cache")
+
+
+class OutputCache:
+    """按 (host, port, command) 缓存设备命令输出的磁盘缓存，同一次推演中的多个脚本共享。
+
+    每台设备一个目录，每条命令一个 JSON 文件，写入时先写临时文件再 os.replace，
+    并发运行的脚本不会读到半个文件。超过 ttl 秒的结果视为过期。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=60):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def device_dir(self, host, port):
+        return os.path.join(self.cache_dir, f"{host}_{port}")
+
+    def entry_path(self, host, port, command):
+        digest = hashlib.sha1(command.encode('utf-8')).hexdigest()
+        return os.path.join(self.device_dir(host, port), f"{digest}.json")
+
+    def get(self, host, port, command, ttl=None):
+        """返回未过期的缓存输出，没有或已过期时返回 None"""
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            with open(self.entry_path(host, port, command), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("command") != command or time.time() - entry.get("time", 0) > ttl:
+            return None
+        return entry.get("output")
+
+    def put(self, host, port, command, output):
+        path = self.entry_path(host, port, command)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"host": host, "port": port, "command": command, "time": time.time(), "output": output}, f)
+        os.replace(tmp_path, path)
+
+    def invalidate(self, host=None, port=None, command=None):
+        """删除缓存：不指定设备时清空全部，只指定设备时清空该设备，指定命令时只删除这一条"""
+        if host is None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        elif command is None:
+            shutil.rmtree(self.device_dir(host, port), ignore_errors=True)
+        else:
+            try:
+                os.remove(self.entry_path(host, port, command))
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="清除设备命令输出缓存。")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"缓存目录（默认为 {DEFAULT_CACHE_DIR}，也可通过 NET_TWIN_CACHE 设置）。")
+    parser.add_argument("--host", help="只清除该设备的缓存。")
+    parser.add_argument("--port", type=int, help="设备的控制台端口，与 --host 一起使用。")
+    parser.add_argument("--command", help="只清除这一条命令的缓存，需要同时指定 --host 和 --port。")
+    args = parser.parse_args()
+
+    if (args.port or args.command) and not args.host:
+        print("--port/--command 需要同时指定 --host。")
+        sys.exit(1)
+    OutputCache(args.cache_dir).invalidate(args.host, args.port, args.command)
+    print("Cache invalidated.")
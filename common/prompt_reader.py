@@ -0,0 +1,159 @@
+import re
+import select
+import time
+
+# 设备提示符：NE40 用户视图 <sysname>，系统视图 [~sysname] / [*sysname]，VPCS 等设备的 name>
+PROMPT_PATTERN = rb'(?:<([^\s<>]+)>|\[[~*]?([^\s\[\]]+)\]|([A-Za-z][\w.\-]*)>)'
+PROMPT_RE = re.compile(rb'^' + PROMPT_PATTERN + rb'\s*$')
+MORE_RE = re.compile(rb'-+\s*More\s*-+\s*$')
+ANSI_RE = re.compile(rb'\x1b\[\d*[A-Za-z]')
+# 翻页后设备用 "光标左移 + 空格 + 光标左移" 擦掉 ---- More ----，空格必须和控制序列一起去掉，否则会留在下一页首行行首
+ERASE_RE = re.compile(rb'\x1b\[(\d+)D *\x1b\[\1D')
+
+
+class ConsoleTimeout(Exception):
+    """在超时时间内没有等到提示符，partial 中保存已经收到的输出"""
+
+    def __init__(self, message, partial=""):
+        super().__init__(message)
+        self.partial = partial
+
+
+def scan_tail(buffer):
+    """检查缓冲区最后一行。
+
+    返回 ('prompt', 行起始位置, 提示符) 或 ('more', 行起始位置, None)，都不是则返回 None。
+    只看最后一行，避免大输出时反复扫描整个缓冲区。
+    """
+    line_start = buffer.rfind(b'\n') + 1
+    last_line = bytes(buffer[line_start:]).strip()
+    if PROMPT_RE.match(last_line):
+        return 'prompt', line_start, last_line.decode('ascii', errors='ignore')
+    if MORE_RE.search(last_line):
+        return 'more', line_start, None
+    return None
+
+
+def parse_prompt(prompt):
+    """从提示符中解析 (sysname, view)，view 为 user / system / other"""
+    match = PROMPT_RE.match(prompt.encode('ascii', errors='ignore'))
+    if not match:
+        return None, None
+    if match.group(1):
+        return match.group(1).decode('ascii'), 'user'
+    if match.group(2):
+        return match.group(2).decode('ascii'), 'system'
+    return match.group(3).decode('ascii'), 'other'
+
+
+def clean_output(data):
+    """去掉翻页时设备发来的 \\x1b[16D 等控制序列"""
+    return ANSI_RE.sub(b'', ERASE_RE.sub(b'', bytes(data))).decode('ascii', errors='ignore')
+
+
+class PipelineSplitter:
+    """按 "提示符 + 命令回显" 把流水线执行的输出切分成每条命令的结果。
+
+    流水线模式下设备在输出完上一条命令后打印提示符，紧接着回显下一条已缓存的命令，
+    因此第 i 条命令的输出从它的回显开始，到下一条命令所在行的提示符为止。
+    """
+
+    def __init__(self, commands):
+        self.commands = commands
+        self.markers = [re.compile(rb'(?m)^' + PROMPT_PATTERN + rb'[ \t]*(' + re.escape(command.encode('ascii')) + rb')')
+                        for command in commands[1:]]
+        self.starts = [0]
+        self.ends = []
+        self.search_from = 0
+
+    def feed(self, buffer):
+        """在新到达的数据中继续查找回显标记，全部找到时返回 True"""
+        while len(self.starts) < len(self.commands):
+            match = self.markers[len(self.starts) - 1].search(buffer, self.search_from)
+            if not match:
+                # 已完整的行都不匹配，下次只需从最后一行开始查找
+                self.search_from = max(self.search_from, buffer.rfind(b'\n') + 1)
+                return False
+            self.ends.append(match.start())
+            self.starts.append(match.start(4))
+            self.search_from = match.end()
+        return True
+
+    def split(self, buffer, end):
+        bounds = zip(self.starts, self.ends + [end])
+        return [clean_output(buffer[start:stop]) for start, stop in bounds]
+
+
+class PromptReader:
+    """在 telnetlib 会话上按真实提示符读取命令输出。
+
+    命令输出一结束（最后一行出现提示符）就立即返回，遇到 ---- More ---- 自动发送空格翻页，
+    timeout 只作为设备无响应时的上限。
+    """
+
+    def __init__(self, tn, timeout=30):
+        self.tn = tn
+        self.timeout = timeout
+        self.prompt = None
+        self.sysname = None
+        self.view = None
+
+    def sync(self, timeout=10):
+        """发送回车并等待提示符，返回 sysname"""
+        self.tn.write(b'\n')
+        self.read_until_prompt(timeout)
+        return self.sysname
+
+    def execute(self, command, timeout=None):
+        """发送一条命令，返回提示符之前的全部输出（包含命令回显）"""
+        self.tn.write(command.encode('ascii') + b'\n')
+        return self.read_until_prompt(timeout)
+
+    def execute_pipelined(self, commands, timeout=None):
+        """一次写入全部命令，再按命令回显和提示符切分出每条命令的输出。
+
+        设备会缓存提前输入的命令，N 次往返因此合并为大约一次。调用前需要关闭分页
+        (screen-length 0 temporary)，否则 ---- More ---- 会吃掉后续命令的输入。
+        """
+        if not commands:
+            return []
+        splitter = PipelineSplitter(commands)
+        self.tn.write(''.join(command + '\n' for command in commands).encode('ascii'))
+        deadline = time.monotonic() + (timeout or self.timeout)
+        buffer = bytearray()
+        while True:
+            if splitter.feed(buffer):
+                tail = scan_tail(buffer)
+                if tail and tail[0] == 'prompt' and tail[1] > splitter.starts[-1]:
+                    self.prompt = tail[2]
+                    self.sysname, self.view = parse_prompt(self.prompt)
+                    return splitter.split(buffer, tail[1])
+            self._fill(buffer, deadline)
+
+    def read_until_prompt(self, timeout=None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        buffer = bytearray()
+        while True:
+            tail = scan_tail(buffer)
+            if tail and tail[0] == 'prompt':
+                self.prompt = tail[2]
+                self.sysname, self.view = parse_prompt(self.prompt)
+                return clean_output(buffer[:tail[1]])
+            if tail and tail[0] == 'more':
+                self.tn.write(b' ')
+                del buffer[tail[1]:]
+            self._fill(buffer, deadline)
+
+    def _fill(self, buffer, deadline):
+        """把已到达的数据追加到 buffer，没有数据时最多等待到 deadline"""
+        # read_very_eager 不阻塞，连接关闭时抛出 EOFError
+        data = self.tn.read_very_eager()
+        if data:
+            buffer += data
+            return
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ConsoleTimeout(f"Timed out waiting for prompt from {self.tn.host}:{self.tn.port}",
+                                 clean_output(buffer))
+        select.select([self.tn], [], [], remaining)
@@ -0,0 +1,65 @@
+import os
+import json
+
+DEFAULT_INDEX_DIR = os.environ.get("NET_TWIN_INDEX", "/tmp/net-twin-index")
+
+
+class SysnameIndex:
+    """持久化的 host:port -> sysname -> UNL 节点 ID 索引，每个实验一个 JSON 文件。
+
+    控制台端口和设备的对应关系在实验运行期间基本不变，因此每次运行只做廉价的校验：
+    索引中的 sysname 仍是某个 UNL 节点的名称、且对应同一个节点 ID 时直接使用，
+    新增的端口、节点被改名或删除等不一致的情况才重新登录设备获取 sysname。
+    """
+
+    def __init__(self, lab_id, unl_nodes, index_dir=DEFAULT_INDEX_DIR, refresh=False):
+        self.path = os.path.join(index_dir, f"{lab_id}.json")
+        # UNL 节点名称 -> 节点 ID，映射时按名称 O(1) 查找
+        self.name_to_node = {info['name']: node_id for node_id, info in unl_nodes.items()}
+        self.entries = {} if refresh else self.load()
+        self.changed = refresh
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=4)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+    def is_valid(self, entry):
+        # 没有对应节点的条目（例如还没配置 sysname、仍显示 <HUAWEI> 的设备）每次都重新获取
+        if entry is None or entry.get("node_id") is None:
+            return False
+        return self.name_to_node.get(entry.get("sysname")) == entry.get("node_id")
+
+    def get_sysname(self, host, port, probe):
+        """返回 host:port 的 sysname，索引缺失或与 UNL 不一致时调用 probe(host, port) 重新获取"""
+        host_port = f"{host}:{port}"
+        entry = self.entries.get(host_port)
+        if self.is_valid(entry):
+            return entry["sysname"]
+
+        sysname = probe(host, port)
+        if sysname:
+            self.entries[host_port] = {"sysname": sysname, "node_id": self.name_to_node.get(sysname)}
+            self.changed = True
+        elif host_port in self.entries:
+            del self.entries[host_port]
+            self.changed = True
+        return sysname
+
+    def retain(self, host_ports):
+        """删除已不在 param.json 中的控制台端口"""
+        for host_port in set(self.entries) - set(host_ports):
+            del self.entries[host_port]
+            self.changed = True
@@ -1,10 +1,14 @@
 import xml.etree.ElementTree as ET
 import json
-import telnetlib
 import os
+import sys
 import argparse
 import subprocess
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.console_session import open_session
+from common.sysname_index import SysnameIndex
+
 
 class UNLParser:
     def __init__(self, unl_file):
@@ -47,25 +51,17 @@ class UNLParser:
 
 
 class RouterManager:
-    def __init__(self, telnet_info):
+    def __init__(self, telnet_info, index=None):
         self.telnet_info = telnet_info
+        self.index = index  # sysname 索引，为 None 时每次都登录设备获取
         self.sysnames = {}
         self.configurations = {}
 
     def get_sysname_via_telnet(self, host, port):
         """通过 Telnet 获取 NE40 节点的 sysname"""
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-            tn.write(b'\n')
-            output = tn.read_until(b'>', timeout=5)
-            lines = output.decode('ascii').splitlines()
-            sysname = None
-            for line in lines:
-                if line.startswith('<') and line.endswith('>'):
-                    sysname = line.strip('<> ')
-                    break
-            tn.close()
-            return sysname if sysname else None
+            with open_session(host, port) as session:
+                return session.sysname
         except Exception as e:
             print(f"Telnet Error: {e}")
             return None
@@ -73,12 +69,8 @@ class RouterManager:
     def get_configuration_via_telnet(self, host, port):
         """通过 Telnet 获取 NE40 路由器的配置信息"""
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-            tn.read_until(b'>', timeout=5)
-            tn.write(b'display current-configuration\n')
-            config_output = tn.read_until(b'>', timeout=10)
-            tn.close()
-            return config_output.decode('ascii')
+            with open_session(host, port) as session:
+                return session.execute('display current-configuration')
         except Exception as e:
             print(f"Telnet Error: {e}")
             return None
@@ -106,6 +98,12 @@ class RouterManager:
             print(f"SSH/Docker Error: {e}")
             return None
 
+    def resolve_sysname(self, host, port):
+        """优先使用索引中仍与 UNL 一致的 sysname，否则登录设备获取"""
+        if self.index is None:
+            return self.get_sysname_via_telnet(host, port)
+        return self.index.get_sysname(host, port, self.get_sysname_via_telnet)
+
     def connect_and_get_sysnames_and_configs(self):
         """Connect to each router and retrieve sysnames and configurations."""
         for node in self.telnet_info["node"]:
@@ -116,7 +114,7 @@ class RouterManager:
 
             if console_type == "telnet":
                 # 获取 NE40 的 sysname 和配置
-                sysname = self.get_sysname_via_telnet(host, port)
+                sysname = self.resolve_sysname(host, port)
                 config = self.get_configuration_via_telnet(host, port)
                 if sysname:
                     self.sysnames[f"{host}:{port}"] = sysname
@@ -128,6 +126,10 @@ class RouterManager:
                 if config:
                     self.configurations[docker_id] = config
 
+        if self.index is not None:
+            self.index.retain(f"{node.get('hostip')}:{node.get('port')}" for node in self.telnet_info["node"])
+            self.index.save()
+
 
 class TopologyMapper:
     def __init__(self, unl_parser, router_manager):
@@ -137,16 +139,18 @@ class TopologyMapper:
     def map_topology(self):
         """Map the sysnames and configurations retrieved to the UNL topology."""
         mapping = {}
+        # sysname -> host:port，每个 UNL 节点按名称 O(1) 查找，不再对所有设备做嵌套循环
+        host_ports = {sysname: host_port for host_port, sysname in self.router_manager.sysnames.items()}
         for node_id, node_info in self.unl_parser.nodes.items():
             node_name = node_info['name']
-            for host_port, sysname in self.router_manager.sysnames.items():
-                if node_name == sysname:
-                    mapping[node_id] = {
-                        'node_name': node_name,
-                        'host_port': host_port,
-                        'sysname': sysname,
-                        'configuration': self.router_manager.configurations.get(host_port, 'No config')
-                    }
+            host_port = host_ports.get(node_name)
+            if host_port is not None:
+                mapping[node_id] = {
+                    'node_name': node_name,
+                    'host_port': host_port,
+                    'sysname': node_name,
+                    'configuration': self.router_manager.configurations.get(host_port, 'No config')
+                }
 
         for docker_id, config in self.router_manager.configurations.items():
             if docker_id not in mapping.values():
@@ -169,7 +173,7 @@ def find_latest_folder(base_path):
     return latest_folder
 
 
-def main(input_path, output_path):
+def main(input_path, output_path, refresh_index=False):
     # Resolve the latest folder number if {t} is used
     base_path = "/uploadPath/reasoning"
     if "{t}" in input_path or "{t}" in output_path:
@@ -189,8 +193,11 @@ def main(input_path, output_path):
     unl_parser = UNLParser(unl_file_path)
     unl_parser.parse()
 
+    # 控制台端口 -> sysname -> UNL 节点的持久化索引，与 UNL 不一致时才重新登录获取 sysname
+    index = SysnameIndex(lab_id, unl_parser.nodes, refresh=refresh_index)
+
     # Manage Telnet/SSH connections and retrieve sysnames and configurations
-    router_manager = RouterManager(telnet_info)
+    router_manager = RouterManager(telnet_info, index=index)
     router_manager.connect_and_get_sysnames_and_configs()
 
     # Map topology
@@ -208,6 +215,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process network topology from UNL and param.json.")
     parser.add_argument("-i", "--input", required=True, help="Path to param.json, use {t} for latest folder number.")
     parser.add_argument("-o", "--output", required=True, help="Output path for process information, use {t} for latest folder number.")
+    parser.add_argument("--refresh-index", action="store_true", help="Ignore the persisted sysname index and probe every device again.")
     args = parser.parse_args()
 
-    main(args.input, args.output)
+    main(args.input, args.output, refresh_index=args.refresh_index)
@@ -1,11 +1,16 @@
 import xml.etree.ElementTree as ET
 import json
-import telnetlib
 import os
+import sys
 import argparse
 import subprocess
 import re
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.console_session import open_session
+from common.output_cache import OutputCache
+from common.sysname_index import SysnameIndex
+
 class UNLParser:
     def __init__(self, unl_file):
         self.unl_file = unl_file
@@ -46,25 +51,18 @@ class UNLParser:
         print("Networks:", self.networks)
 
 class RouterManager:
-    def __init__(self, telnet_info):
+    def __init__(self, telnet_info, cache=None, index=None):
         self.telnet_info = telnet_info
+        self.cache = cache
+        self.index = index  # sysname 索引，为 None 时每次都登录设备获取
         self.sysnames = {}
         self.configurations = {}
 
     def get_sysname_via_telnet(self, host, port):
         """Retrieve sysname via Telnet."""
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-            tn.write(b'\n')
-            output = tn.read_until(b'>', timeout=5)
-            lines = output.decode('ascii').splitlines()
-            sysname = None
-            for line in lines:
-                if line.startswith('<') and line.endswith('>'):
-                    sysname = line.strip('<> ')
-                    break
-            tn.close()
-            return sysname if sysname else None
+            with open_session(host, port, cache=self.cache) as session:
+                return session.sysname
         except Exception as e:
             print(f"Telnet Error: {e}")
             return None
@@ -72,12 +70,9 @@ class RouterManager:
     def get_configuration_via_telnet(self, host, port):
         """Retrieve configuration via Telnet."""
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-            tn.read_until(b'>', timeout=5)
-            tn.write(b'display current-configuration\n')
-            config_output = tn.read_until(b'>', timeout=10)
-            tn.close()
-            return self.clean_configuration(config_output.decode('ascii'))
+            with open_session(host, port, cache=self.cache) as session:
+                config_output = session.execute('display current-configuration')
+            return self.clean_configuration(config_output)
         except Exception as e:
             print(f"Telnet Error: {e}")
             return None
@@ -120,6 +115,12 @@ class RouterManager:
         
         return "\n".join(cleaned_config)
 
+    def resolve_sysname(self, host, port):
+        """优先使用索引中仍与 UNL 一致的 sysname，否则登录设备获取"""
+        if self.index is None:
+            return self.get_sysname_via_telnet(host, port)
+        return self.index.get_sysname(host, port, self.get_sysname_via_telnet)
+
     def connect_and_get_sysnames_and_configs(self):
         """Connect to each router and retrieve sysnames and configurations."""
         for node in self.telnet_info["node"]:
@@ -130,7 +131,7 @@ class RouterManager:
 
             if console_type == "telnet":
                 # Retrieve NE40 sysname and configuration
-                sysname = self.get_sysname_via_telnet(host, port)
+                sysname = self.resolve_sysname(host, port)
                 config = self.get_configuration_via_telnet(host, port)
                 if sysname:
                     self.sysnames[f"{host}:{port}"] = sysname
@@ -142,6 +143,10 @@ class RouterManager:
                 if config:
                     self.configurations[docker_id] = config
 
+        if self.index is not None:
+            self.index.retain(f"{node.get('hostip')}:{node.get('port')}" for node in self.telnet_info["node"])
+            self.index.save()
+
 class TopologyMapper:
     def __init__(self, unl_parser, router_manager):
         self.unl_parser = unl_parser
@@ -150,16 +155,18 @@ class TopologyMapper:
     def map_topology(self):
         """Map the sysnames and configurations retrieved to the UNL topology."""
         mapping = {}
+        # sysname -> host:port，每个 UNL 节点按名称 O(1) 查找，不再对所有设备做嵌套循环
+        host_ports = {sysname: host_port for host_port, sysname in self.router_manager.sysnames.items()}
         for node_id, node_info in self.unl_parser.nodes.items():
             node_name = node_info['name']
-            for host_port, sysname in self.router_manager.sysnames.items():
-                if node_name == sysname:
-                    mapping[node_id] = {
-                        'node_name': node_name,
-                        'host_port': host_port,
-                        'sysname': sysname,
-                        'configuration': self.router_manager.configurations.get(host_port, 'No config')
-                    }
+            host_port = host_ports.get(node_name)
+            if host_port is not None:
+                mapping[node_id] = {
+                    'node_name': node_name,
+                    'host_port': host_port,
+                    'sysname': node_name,
+                    'configuration': self.router_manager.configurations.get(host_port, 'No config')
+                }
 
         for docker_id, config in self.router_manager.configurations.items():
             if docker_id not in mapping.values():
@@ -180,7 +187,7 @@ def find_latest_folder(base_path):
     latest_folder = max(all_folders, key=int)
     return latest_folder
 
-def main(input_path, output_path):
+def main(input_path, output_path, cache_ttl=0, refresh_index=False):
     # Resolve the latest folder number if {t} is used
     base_path = "/uploadPath/reasoning"
     if "{t}" in input_path or "{t}" in output_path:
@@ -200,8 +207,14 @@ def main(input_path, output_path):
     unl_parser = UNLParser(unl_file_path)
     unl_parser.parse()
 
+    # 同一次推演中其他脚本已获取过的输出直接复用
+    cache = OutputCache(ttl=cache_ttl) if cache_ttl > 0 else None
+
+    # 控制台端口 -> sysname -> UNL 节点的持久化索引，与 UNL 不一致时才重新登录获取 sysname
+    index = SysnameIndex(lab_id, unl_parser.nodes, refresh=refresh_index)
+
     # Manage Telnet/SSH connections and retrieve sysnames and configurations
-    router_manager = RouterManager(telnet_info)
+    router_manager = RouterManager(telnet_info, cache=cache, index=index)
     router_manager.connect_and_get_sysnames_and_configs()
 
     # Map topology
@@ -218,6 +231,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process network topology from UNL and param.json.")
     parser.add_argument("-i", "--input", required=True, help="Path to param.json, use {t} for latest folder number.")
     parser.add_argument("-o", "--output", required=True, help="Output path for process information, use {t} for latest folder number.")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="Reuse device outputs cached within this many seconds, 0 disables the cache.")
+    parser.add_argument("--refresh-index", action="store_true", help="Ignore the persisted sysname index and probe every device again.")
     args = parser.parse_args()
 
-    main(args.input, args.output)
+    main(args.input, args.output, args.cache_ttl, refresh_index=args.refresh_index)
@@ -1,9 +1,12 @@
 import xml.etree.ElementTree as ET
 import json
-import telnetlib
 import os
+import sys
 import argparse
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.console_session import open_session
+
 
 class UNLParser:
     def __init__(self, unl_file):
@@ -46,50 +49,53 @@ class UNLParser:
 
 
 class RouterTelnetManager:
+    NEIGHBOR_COMMANDS = {
+        'isis': 'display isis peer',
+        'bgp': 'display bgp peer',
+        'mpls_ldp': 'display mpls ldp peer'
+    }
+
     def __init__(self, telnet_info):
         self.telnet_info = telnet_info
         self.sysnames = {}
         self.neighbor_data = {}
+        self.sessions = {}
+
+    def get_session(self, host, port):
+        """返回该设备的持久会话，首次调用时登录一次，之后所有命令复用同一连接"""
+        key = host + ':' + str(port)
+        if key not in self.sessions:
+            session = open_session(host, port)
+            try:
+                session.open()
+            except Exception as e:
+                print(f"Error connecting to {host}:{port} - {e}")
+                session.close()
+                session = None
+            self.sessions[key] = session
+        return self.sessions[key]
+
+    def close_sessions(self):
+        for session in self.sessions.values():
+            if session:
+                session.close()
+        self.sessions = {}
 
     def get_sysname(self, host, port):
         """通过 Telnet 获取节点的 sysname"""
-        try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-            tn.write(b'\n')
-            output = tn.read_until(b'>', timeout=5)
-            lines = output.decode('ascii').splitlines()
-            sysname = None
-            for line in lines:
-                if line.startswith('<') and line.endswith('>'):
-                    sysname = line.strip('<> ')
-                    break
-            tn.close()
-            return sysname if sysname else None
-        except Exception as e:
-            print(f"Error connecting to {host}:{port} - {e}")
-            return None
+        session = self.get_session(host, port)
+        return session.sysname if session else None
 
     def get_neighbors(self, host, port, protocol):
         """通过 Telnet 获取指定协议的邻居列表"""
-        commands = {
-            'isis': b'display isis peer\n',
-            'bgp': b'display bgp peer\n',
-            'mpls_ldp': b'display mpls ldp peer\n'
-        }
-
-        if protocol not in commands:
+        if protocol not in self.NEIGHBOR_COMMANDS:
             raise ValueError(f"Unsupported protocol: {protocol}")
 
+        session = self.get_session(host, port)
+        if not session:
+            return None
         try:
-            tn = telnetlib.Telnet(host, port, timeout=10)
-            tn.write(b'\n')
-            tn.read_until(b'>', timeout=5)
-
-            tn.write(commands[protocol])
-            output = tn.read_until(b'>', timeout=10)
-
-            tn.close()
-            return output.decode('ascii')
+            return session.execute(self.NEIGHBOR_COMMANDS[protocol])
         except Exception as e:
             print(f"Error retrieving {protocol} neighbors from {host}:{port} - {e}")
             return None
@@ -214,8 +220,11 @@ def main(input_path, output_path):
     unl_parser.parse()
 
     telnet_manager = RouterTelnetManager(telnet_info)
-    telnet_manager.connect_and_get_sysnames()
-    telnet_manager.collect_neighbors(protocols=('isis', 'bgp', 'mpls_ldp'))
+    try:
+        telnet_manager.connect_and_get_sysnames()
+        telnet_manager.collect_neighbors(protocols=('isis', 'bgp', 'mpls_ldp'))
+    finally:
+        telnet_manager.close_sessions()
 
     mapper = TopologyMapper(unl_parser, telnet_manager)
     mapping = mapper.map_topology()
@@ -1,13 +1,23 @@
 import os
+import sys
 import json
 import xml.etree.ElementTree as ET
-import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.container_inventory import get_inventory
+from common.docker_api import get_client
+from common.frr_bundle import FRR_CONF, collect_bundles, bundle_config, bundle_json
 
 class FRRConfigExtractor:
-    def __init__(self, reasoning_directory, labs_directory, output_file_path):
+    def __init__(self, reasoning_directory, labs_directory, output_file_path, json_commands=()):
         self.reasoning_directory = reasoning_directory
         self.labs_directory = labs_directory
         self.output_file_path = output_file_path
+        # 与配置一起采集的运行状态（vtysh 的 json 命令，例如 frr_bundle.DEFAULT_JSON_COMMANDS），和 frr.conf 在同一次 exec 中取回；
+        # 默认不采集，输出与只读取 frr.conf 时相同
+        self.json_commands = json_commands
+        # Docker Engine API 可用时通过长连接访问，否则退回 docker CLI
+        self.docker = get_client()
 
     def get_latest_directory(self, directory):
         dirs = [os.path.join(directory, d) for d in os.listdir(directory) if os.path.isdir(os.path.join(directory, d))]
@@ -68,12 +78,8 @@ class FRRConfigExtractor:
         return nodes, links
 
     def get_running_containers(self):
-        result = subprocess.run(['docker', 'ps', '--format', '{{.ID}} {{.Names}}'], capture_output=True, text=True)
-        containers = {}
-        for line in result.stdout.strip().splitlines():
-            container_id, container_name = line.split(maxsplit=1)
-            containers[container_name] = container_id
-        return containers
+        # 同一次推演中的脚本共享容器清单，只按 docker events 增量更新，不再每次列出所有容器
+        return get_inventory(self.docker).name_to_id()
 
     def match_ids_with_containers(self, lab_id, containers):
         matched_containers = []
@@ -82,13 +88,14 @@ class FRRConfigExtractor:
                 matched_containers.append(container_id)
         return matched_containers
 
-    def get_frr_config_from_container(self, container_id):
-        try:
-            result = subprocess.run(['docker', 'exec', container_id, 'cat', '/etc/frr/frr.conf'],
-                                    capture_output=True, text=True, check=True)
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            return f"Failed to get configuration from container {container_id}. Error: {e}"
+    def read_bundle(self, bundle):
+        """从 bundle 中取出配置（frr.conf 读不到时用 show running-config）和 {命令: 解析后的 JSON}"""
+        config_content = bundle_config(bundle)
+        if config_content is None:
+            error = bundle["error"] or bundle["outputs"].get(FRR_CONF, "").strip()
+            config_content = f"Failed to get configuration from container {bundle['container_id']}. Error: {error}"
+        runtime_state = {command: bundle_json(bundle, command) for command in self.json_commands}
+        return config_content, runtime_state
 
     def parse_frr_config(self, config_content):
         lines = config_content.strip().splitlines()
@@ -119,7 +126,7 @@ class FRRConfigExtractor:
                     router_configs.append(line)
         return hostname, "\n".join(interfaces), "\n".join(router_configs)
 
-    def format_output(self, container_id, hostname, interfaces, router_configs):
+    def format_output(self, container_id, hostname, interfaces, router_configs, runtime_state=None):
         formatted_output = []
         formatted_output.append("="*60)
         formatted_output.append(f"Container ID: {container_id}")
@@ -129,6 +136,11 @@ class FRRConfigExtractor:
         formatted_output.append(interfaces)
         formatted_output.append("\nRouter Configuration:")
         formatted_output.append(router_configs)
+        if runtime_state:
+            formatted_output.append("\nRuntime State:")
+            for command, data in runtime_state.items():
+                formatted_output.append(f"# {command}")
+                formatted_output.append(json.dumps(data, ensure_ascii=False) if data is not None else "Not available")
         formatted_output.append("\n")  # 添加空行分隔不同容器的配置信息
         return "\n".join(formatted_output)
 
@@ -180,14 +192,16 @@ class FRRConfigExtractor:
         matched_container_ids = self.match_ids_with_containers(lab_id_from_unl, running_containers)
         
         if matched_container_ids:
+            # 每个容器只执行一次 exec，取回 frr.conf、show running-config 和所有 json 命令的输出
+            bundles = collect_bundles(matched_container_ids, json_commands=self.json_commands, client=self.docker)
             with open(self.output_file_path, 'w') as output_file:
                 output_file.write(topology_info)
                 print(topology_info)  # 输出拓扑信息到控制台
                 
                 for container_id in matched_container_ids:
-                    config_content = self.get_frr_config_from_container(container_id)
+                    config_content, runtime_state = self.read_bundle(bundles[container_id])
                     hostname, interfaces, router_configs = self.parse_frr_config(config_content)
-                    formatted_output = self.format_output(container_id, hostname, interfaces, router_configs)
+                    formatted_output = self.format_output(container_id, hostname, interfaces, router_configs, runtime_state)
                     output_file.write(formatted_output)
                     print(formatted_output)  # 也可以同时输出到控制台
             print(f"Configuration information written to {self.output_file_path}")
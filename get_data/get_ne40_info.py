@@ -1,9 +1,14 @@
 import xml.etree.ElementTree as ET
 import json
-import telnetlib
 import os
+import sys
 import argparse
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.console_session import open_session
+from common.output_cache import OutputCache
+from common.sysname_index import SysnameIndex
+
 
 class UNLParser:
     def __init__(self, unl_file):
@@ -46,38 +51,23 @@ class UNLParser:
 
 
 class RouterTelnetManager:
-    def __init__(self, telnet_info):
+    def __init__(self, telnet_info, cache=None, index=None):
         self.telnet_info = telnet_info
+        self.cache = cache
+        self.index = index  # sysname 索引，为 None 时每次都登录设备获取
         self.sysnames = {}
         self.configurations = {}
 
     def get_sysname(self, host, port):
         """通过 Telnet 获取节点的 sysname"""
         try:
-            # 增加超时时间，建立 Telnet 连接
-            tn = telnetlib.Telnet(host, port, timeout=10)
-
-            # 发送一个空命令（如回车字符 '\n'），以确保接收到提示符
-            tn.write(b'\n')
-
-            # 设置匹配可能的提示符，增加超时时间来等待返回结果
-            output = tn.read_until(b'>', timeout=5)  # 等待提示符 '>'，超时时间 5 秒
-
-            # 处理输出，假设 sysname 在提示符之间
-            lines = output.decode('ascii').splitlines()
-            sysname = None
-
-            # 遍历每一行，寻找可能的 sysname
-            for line in lines:
-                if line.startswith('<') and line.endswith('>'):
-                    sysname = line.strip('<> ')
-                    break
-
-            tn.close()
+            # 发送回车后按真实提示符 <sysname> / [~sysname] 解析 sysname
+            with open_session(host, port, cache=self.cache) as session:
+                sysname = session.sysname
             if sysname:
                 return sysname
             else:
-                print(f"Could not determine sysname from output: {output}")
+                print(f"Could not determine sysname from prompt of {host}:{port}")
                 return None
 
         except Exception as e:
@@ -87,27 +77,20 @@ class RouterTelnetManager:
     def get_configuration(self, host, port):
         """通过 Telnet 获取节点的配置信息"""
         try:
-            # 建立 Telnet 连接
-            tn = telnetlib.Telnet(host, port, timeout=10)
-
-            # 等待提示符
-            tn.read_until(b'>', timeout=5)
-
-            # 发送 'display current-configuration' 命令
-            tn.write(b'display current-configuration\n')
-
-            # 读取配置输出，直到下一个提示符出现（假设为 '>'）
-            config_output = tn.read_until(b'>', timeout=10)
-
-            tn.close()
-
-            # 返回配置信息
-            return config_output.decode('ascii')
+            # 读取配置输出，直到设备返回提示符为止，--- More --- 自动翻页
+            with open_session(host, port, cache=self.cache) as session:
+                return session.execute('display current-configuration')
 
         except Exception as e:
             print(f"Error connecting to {host}:{port} - {e}")
             return None
 
+    def resolve_sysname(self, host, port):
+        """优先使用索引中仍与 UNL 一致的 sysname，否则登录设备获取"""
+        if self.index is None:
+            return self.get_sysname(host, port)
+        return self.index.get_sysname(host, port, self.get_sysname)
+
     def connect_and_get_sysnames_and_configs(self):
         """Connect to each router via Telnet, retrieve its sysname and configuration."""
         for node in self.telnet_info["node"]:
@@ -115,7 +98,7 @@ class RouterTelnetManager:
             port = node["port"]
 
             # 获取 sysname
-            sysname = self.get_sysname(host, port)
+            sysname = self.resolve_sysname(host, port)
             if sysname:
                 self.sysnames[host + ':' + str(port)] = sysname
                 print(f"Connected to {host}:{port} - Sysname: {sysname}")
@@ -130,6 +113,10 @@ class RouterTelnetManager:
             else:
                 print(f"Failed to retrieve configuration for {host}:{port}")
 
+        if self.index is not None:
+            self.index.retain(f"{node['hostip']}:{node['port']}" for node in self.telnet_info["node"])
+            self.index.save()
+
 
 class TopologyMapper:
     def __init__(self, unl_parser, telnet_manager):
@@ -139,16 +126,18 @@ class TopologyMapper:
     def map_topology(self):
         """Map the sysnames retrieved from Telnet to the nodes in the UNL topology."""
         mapping = {}
+        # sysname -> host:port，每个 UNL 节点按名称 O(1) 查找，不再对所有设备做嵌套循环
+        host_ports = {sysname: host_port for host_port, sysname in self.telnet_manager.sysnames.items()}
         for node_id, node_info in self.unl_parser.nodes.items():
             node_name = node_info['name']
-            for host_port, sysname in self.telnet_manager.sysnames.items():
-                if node_name == sysname:
-                    mapping[node_id] = {
-                        'node_name': node_name,
-                        'host_port': host_port,
-                        'sysname': sysname,
-                        'configuration': self.telnet_manager.configurations.get(host_port, 'No config')
-                    }
+            host_port = host_ports.get(node_name)
+            if host_port is not None:
+                mapping[node_id] = {
+                    'node_name': node_name,
+                    'host_port': host_port,
+                    'sysname': node_name,
+                    'configuration': self.telnet_manager.configurations.get(host_port, 'No config')
+                }
 
         print("Mapping between UNL topology and Telnet sysnames and configurations:")
         print(mapping)
@@ -164,7 +153,7 @@ def find_latest_folder(base_path):
     return latest_folder
 
 
-def main(input_path, output_path):
+def main(input_path, output_path, cache_ttl=0, refresh_index=False):
     # Resolve the latest folder number if {t} is used
     base_path = "/uploadPath/reasoning"
     if "{t}" in input_path or "{t}" in output_path:
@@ -184,8 +173,14 @@ def main(input_path, output_path):
     unl_parser = UNLParser(unl_file_path)
     unl_parser.parse()
 
+    # 同一次推演中其他脚本已获取过的输出直接复用
+    cache = OutputCache(ttl=cache_ttl) if cache_ttl > 0 else None
+
+    # 控制台端口 -> sysname -> UNL 节点的持久化索引，与 UNL 不一致时才重新登录获取 sysname
+    index = SysnameIndex(lab_id, unl_parser.nodes, refresh=refresh_index)
+
     # Manage Telnet connections and retrieve sysnames and configurations
-    telnet_manager = RouterTelnetManager(telnet_info)
+    telnet_manager = RouterTelnetManager(telnet_info, cache=cache, index=index)
     telnet_manager.connect_and_get_sysnames_and_configs()
 
     # Map topology
@@ -203,6 +198,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process network topology from UNL and param.json.")
     parser.add_argument("-i", "--input", required=True, help="Path to param.json, use {t} for latest folder number.")
     parser.add_argument("-o", "--output", required=True, help="Output path for process information, use {t} for latest folder number.")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="Reuse device outputs cached within this many seconds, 0 disables the cache.")
+    parser.add_argument("--refresh-index", action="store_true", help="Ignore the persisted sysname index and probe every device again.")
     args = parser.parse_args()
 
-    main(args.input, args.output)
+    main(args.input, args.output, args.cache_ttl, refresh_index=args.refresh_index)
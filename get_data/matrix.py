@@ -1,16 +1,26 @@
 import telnetlib
 import re
+import os
+import sys
 import requests
 import json
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.governor import get_governor
+from common.prompt_reader import PromptReader
+
 class RouterInfoFetcher:
-    def __init__(self, host, eve_ng_server, lab_path, session_id):
+    def __init__(self, host, eve_ng_server, lab_path, session_id, pipeline=True, max_sessions=32):
         self.host = host
         self.eve_ng_server = eve_ng_server
         self.lab_path = lab_path
         self.session_id = session_id
+        self.pipeline = pipeline  # 是否一次写入全部 display 命令
+        self.max_sessions = max_sessions  # 同时登录的控制台会话上限
+        # 本进程中的所有采集器共用同一个 governor，按控制台主机限流
+        self.governor = get_governor(max_limit=max_sessions)
 
     def fetch_ports_from_eve_ng(self):
         url = f"{self.eve_ng_server}{self.lab_path}"
@@ -37,6 +47,15 @@ class RouterInfoFetcher:
 
         return ports
 
+    def fetch_info_governed(self, port):
+        """在控制台主机当前的自适应并发上限内采集单台设备"""
+        with self.governor.slot(self.host) as slot:
+            info = self.fetch_info_from_router(port)
+            # TelnetClient 捕获了所有异常并返回空字符串，输出为空说明连接或命令失败，需要让并发上限退避
+            if not all(info.values()):
+                slot.fail()
+            return info
+
     def fetch_info_from_router(self, port):
         telnet_client = self.TelnetClient(self.host, port)
 
@@ -46,9 +65,8 @@ class RouterInfoFetcher:
                 print(f"Detected PC at port {port}")
                 return {"Device Type": "PC"}
             else:
-                routing_table_output = telnet_client.execute_command('display ip routing-table')
-                ospf_neighbors_output = telnet_client.execute_command('display ospf peer')
-                bgp_neighbors_output = telnet_client.execute_command('display bgp peer')
+                routing_table_output, ospf_neighbors_output, bgp_neighbors_output = telnet_client.execute_commands(
+                    ['display ip routing-table', 'display ospf peer', 'display bgp peer'], pipeline=self.pipeline)
 
                 return {
                     "Routing Table": routing_table_output,
@@ -167,8 +185,9 @@ class RouterInfoFetcher:
         ospf_results = {}
         bgp_results = {}
 
-        with ThreadPoolExecutor(max_workers=len(routers)) as executor:
-            futures = {executor.submit(self.fetch_info_from_router, router["port"]): f"Router_{i+1}" for i, router in enumerate(routers)}
+        # 线程数只是上限，实际同时登录的会话数由 governor 控制
+        with ThreadPoolExecutor(max_workers=max(1, min(len(routers), self.max_sessions))) as executor:
+            futures = {executor.submit(self.fetch_info_governed, router["port"]): f"Router_{i+1}" for i, router in enumerate(routers)}
 
         for future in futures:
             try:
@@ -208,14 +227,15 @@ class RouterInfoFetcher:
             self.host = host
             self.port = port
             self.telnet = None
+            self.reader = None
             self.connect()
 
         def connect(self):
             try:
                 self.telnet = telnetlib.Telnet(self.host, self.port)
+                self.reader = PromptReader(self.telnet)
                 print(f"Connected to {self.host}:{self.port}")
-                self.write('screen-length 0 temporary')  # Disable pagination
-                self.read_until('>')  # Wait for the command to complete
+                self.reader.execute('screen-length 0 temporary')  # Disable pagination
             except Exception as e:
                 print(f"Failed to connect to {self.host}:{self.port} - {e}")
 
@@ -227,15 +247,28 @@ class RouterInfoFetcher:
 
         def execute_command(self, command):
             try:
-                self.write(command)
-                result = self.read_until('>', timeout=2)
-                output = result.decode('ascii')
+                # 与原先 read_until 的返回值一致，保留末尾提示符（VPCS 检测依赖它）
+                output = self.reader.execute(command) + self.reader.prompt
                 print(f"Command: {command}\nOutput:\n{output}")
                 return output
             except Exception as e:
                 print(f"Failed to execute command {command} - {e}")
                 return ""
 
+        def execute_commands(self, commands, pipeline=True):
+            if not pipeline:
+                return [self.execute_command(command) for command in commands]
+            try:
+                # 一次写入所有命令，按回显和提示符切分输出，N 次往返合并为一次；
+                # 与 execute_command 一样在每条输出末尾加上提示符，两种方式保存的文本相同
+                outputs = [output + self.reader.prompt for output in self.reader.execute_pipelined(commands)]
+                for command, output in zip(commands, outputs):
+                    print(f"Command: {command}\nOutput:\n{output}")
+                return outputs
+            except Exception as e:
+                print(f"Failed to execute pipelined commands {commands} - {e}")
+                return [""] * len(commands)
+
         def close(self):
             if self.telnet:
                 self.telnet.close()
@@ -1,11 +1,14 @@
 import os
 import json
-import telnetlib
 import xml.etree.ElementTree as ET
 import sys
 import argparse
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.console_session import open_session
+from common.output_cache import OutputCache
+
 class ExperimentProcessor:
     def __init__(self, input_base_dir, output_base_dir):
         self.input_base_dir = input_base_dir
@@ -98,37 +101,21 @@ class NetworkTopology:
 
 
 class TelnetConnector:
-    def __init__(self, host, port):
+    def __init__(self, host, port, cache=None):
         self.host = host
         self.port = port
+        self.cache = cache
 
     def get_sysname(self):
         """通过 Telnet 获取节点的 sysname"""
         try:
-            # 增加超时时间，建立 Telnet 连接
-            tn = telnetlib.Telnet(self.host, self.port, timeout=10)
-
-            # 发送一个空命令（如回车字符 '\n'），以确保接收到提示符
-            tn.write(b'\n')
-
-            # 设置匹配可能的提示符，增加超时时间来等待返回结果
-            output = tn.read_until(b'>', timeout=5)  # 等待提示符 '>'，超时时间 5 秒
-
-            # 处理输出，假设 sysname 在提示符之间
-            lines = output.decode('ascii').splitlines()
-            sysname = None
-
-            # 遍历每一行，寻找可能的 sysname
-            for line in lines:
-                if line.startswith('<') and line.endswith('>'):
-                    sysname = line.strip('<> ')
-                    break
-
-            tn.close()
+            # 发送回车后按真实提示符 <sysname> / [~sysname] 解析 sysname
+            with open_session(self.host, self.port, cache=self.cache) as session:
+                sysname = session.sysname
             if sysname:
                 return sysname
             else:
-                print(f"Could not determine sysname from output: {output}")
+                print(f"Could not determine sysname from prompt of {self.host}:{self.port}")
                 return None
 
         except Exception as e:
@@ -209,6 +196,7 @@ def main():
     parser = argparse.ArgumentParser(description="Process input and output paths.")
     parser.add_argument('-i', '--input', type=str, required=True, help='Input file path')
     parser.add_argument('-o', '--output', type=str, required=True, help='Output file path')
+    parser.add_argument('--cache-ttl', type=int, default=0, help='复用多少秒内缓存的设备输出，0 表示不使用缓存')
 
     args = parser.parse_args()
 
@@ -233,8 +221,9 @@ def main():
     # Telnet连接到两个节点并获取sysname
     node1_info = nodes[0]
     node2_info = nodes[1]
-    telnet1 = TelnetConnector(node1_info['hostip'], node1_info['port'])
-    telnet2 = TelnetConnector(node2_info['hostip'], node2_info['port'])
+    cache = OutputCache(ttl=args.cache_ttl) if args.cache_ttl > 0 else None
+    telnet1 = TelnetConnector(node1_info['hostip'], node1_info['port'], cache=cache)
+    telnet2 = TelnetConnector(node2_info['hostip'], node2_info['port'], cache=cache)
     sysname1 = telnet1.get_sysname()
     sysname2 = telnet2.get_sysname()
 
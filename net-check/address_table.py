@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+
+import socket
+import ipaddress
+from array import array
+
+# 各地址族的位数和排序键中索引部分的位数
+WIDTH = {4: 32, 6: 128}
+INDEX_BITS = 32
+
+
+class AddressTable(object):
+    """以整数数组保存所有设备的接口地址，按排序后一次扫描找出地址冲突和子网重叠。
+
+    IPv4 地址保存在 array('I') 中，IPv6 地址拆成高低两个 64 位整数保存在 array('Q') 中，
+    前缀长度和设备编号同样是整数数组，一百万个接口只占几十 MB 内存，也不需要为每个地址创建 ipaddress 对象。
+    """
+
+    def __init__(self):
+        self.devices = []
+        self.device_ids = {}
+        self.addresses = {4: array('I'), 6: array('Q')}
+        self.prefixlens = {4: array('B'), 6: array('B')}
+        self.owners = {4: array('I'), 6: array('I')}
+
+    def __len__(self):
+        return sum(len(owners) for owners in self.owners.values())
+
+    def add(self, device, ip_with_len):
+        """添加一个 "地址/前缀长度" 形式的接口地址"""
+        ip_str, prefixlen = ip_with_len.split('/')
+        device_id = self.device_ids.get(device)
+        if device_id is None:
+            device_id = self.device_ids[device] = len(self.devices)
+            self.devices.append(device)
+        if ':' in ip_str:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip_str), 'big')
+            self.addresses[6].append(value >> 64)
+            self.addresses[6].append(value & 0xFFFFFFFFFFFFFFFF)
+            version = 6
+        else:
+            self.addresses[4].append(int.from_bytes(socket.inet_aton(ip_str), 'big'))
+            version = 4
+        self.prefixlens[version].append(int(prefixlen))
+        self.owners[version].append(device_id)
+
+    def address(self, version, index):
+        if version == 4:
+            return self.addresses[4][index]
+        return (self.addresses[6][2 * index] << 64) | self.addresses[6][2 * index + 1]
+
+    def format(self, version, value, prefixlen=None):
+        address = ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value)
+        return str(address) if prefixlen is None else f"{address}/{prefixlen}"
+
+    def sorted_keys(self, version, key_of):
+        """返回按 key_of(i) 排序的 (key_of(i) << INDEX_BITS | i) 列表，排序只比较整数"""
+        return sorted((key_of(i) << INDEX_BITS) | i for i in range(len(self.owners[version])))
+
+    def duplicates(self):
+        """返回 [(地址族, 地址, 前缀长度, [设备, ...]), ...]：同一个地址配置在多个接口上"""
+        result = []
+        mask = (1 << INDEX_BITS) - 1
+        for version in (4, 6):
+            keys = self.sorted_keys(version, lambda i: self.address(version, i))
+            start = 0
+            for end in range(1, len(keys) + 1):
+                if end < len(keys) and keys[end] >> INDEX_BITS == keys[start] >> INDEX_BITS:
+                    continue
+                if end - start > 1:
+                    indexes = [key & mask for key in keys[start:end]]
+                    result.append((version, keys[start] >> INDEX_BITS, self.prefixlens[version][indexes[0]],
+                                   [self.devices[self.owners[version][i]] for i in indexes]))
+                start = end
+        return result
+
+    def overlaps(self):
+        """返回 [((地址族, 外层网络, 前缀长度, [设备, ...]), (地址族, 内层网络, 前缀长度, [设备, ...])), ...]。
+
+        只报告互不相等但相互包含的子网；链路两端配置的同一网段不算重叠。CIDR 块之间只有包含或不相交两种关系，
+        按 (网络地址, 前缀长度) 排序后用一个栈扫描一遍，每个网络与包含它的最内层网络配对报告。
+        """
+        result = []
+        mask = (1 << INDEX_BITS) - 1
+        for version in (4, 6):
+            width = WIDTH[version]
+            prefixlens = self.prefixlens[version]
+
+            def network_key(i):
+                prefixlen = prefixlens[i]
+                network = self.address(version, i) >> (width - prefixlen) << (width - prefixlen)
+                return (network << 8) | prefixlen
+
+            keys = self.sorted_keys(version, network_key)
+            stack = []  # [(网络地址, 广播地址, 前缀长度, 设备集合)]，由外向内
+            start = 0
+            for end in range(1, len(keys) + 1):
+                # 相同网段的接口合并为一个网络
+                if end < len(keys) and keys[end] >> INDEX_BITS == keys[start] >> INDEX_BITS:
+                    continue
+                network_key_value = keys[start] >> INDEX_BITS
+                network, prefixlen = network_key_value >> 8, network_key_value & 0xFF
+                last = network | ((1 << (width - prefixlen)) - 1)
+                owners = sorted({self.devices[self.owners[version][key & mask]] for key in keys[start:end]})
+                start = end
+
+                while stack and stack[-1][1] < network:
+                    stack.pop()
+                if stack:
+                    outer_network, _, outer_prefixlen, outer_owners = stack[-1]
+                    result.append(((version, outer_network, outer_prefixlen, outer_owners),
+                                   (version, network, prefixlen, owners)))
+                stack.append((network, last, prefixlen, owners))
+        return result
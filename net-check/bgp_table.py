@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+
+import socket
+from array import array
+
+COLUMNS = ("Network", "NextHop", "MED", "LocPrf", "PrefVal", "Path/Ogn")
+MISSING = -1
+
+
+def ip_to_int(ip_str):
+    return int.from_bytes(socket.inet_aton(ip_str), 'big')
+
+
+def int_to_ip(value):
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+class BgpTable(object):
+    """display bgp routing-table 的列式解析结果。
+
+    每一列是一个数组：地址类的列保存为整数，MED/LocPrf/PrefVal 缺省时为 -1，
+    状态码、AS 路径和源码保存为字符串列表。第 i 条路由由各列的第 i 个元素组成。
+    """
+
+    def __init__(self):
+        self.status = []
+        self.network = array('I')
+        self.prefixlen = array('B')
+        self.nexthop = array('I')
+        self.med = array('q')
+        self.locprf = array('q')
+        self.prefval = array('q')
+        self.path = []
+        self.origin = []
+
+    def __len__(self):
+        return len(self.network)
+
+    @classmethod
+    def parse(cls, text):
+        """按表头中各列的起始位置切分每一行，表头不存在时返回 None。
+
+        与列位置对不上的行（网络地址过长挤占了下一列、翻页后行首多出空白、数字列错位）按空白切分，两种方式都无法解析时打印该行；
+        网络地址列为空的行是上一条路由的等价路径，沿用上一行的网络地址。
+        """
+        table = cls()
+        lines = text.splitlines()
+        for index, line in enumerate(lines):
+            if all(name in line for name in COLUMNS):
+                break
+        else:
+            return None
+
+        header = lines[index]
+        net_col, nh_col, med_col, locprf_col, prefval_col, path_col = (header.index(name) for name in COLUMNS)
+        network, prefixlen = 0, 0
+        nexthops = {}  # 下一跳和 AS 路径的取值很少，解析结果按字符串缓存
+        paths = {}
+
+        def convert(fields):
+            """把一行的各列转换为数值，无法转换（IPv6 或列错位）时返回 None"""
+            status, net, nexthop, med, locprf, prefval, path_ogn = fields
+            try:
+                if net:
+                    address, _, length = net.partition('/')
+                    net_value, length_value = ip_to_int(address), int(length or 32)
+                else:
+                    net_value, length_value = network, prefixlen
+                nexthop_value = nexthops.get(nexthop)
+                if nexthop_value is None:
+                    nexthop_value = nexthops[nexthop] = ip_to_int(nexthop)
+                # 数字列交给 int() 处理首尾空白，只有空列需要单独判断
+                numbers = [MISSING if not value or value.isspace() else int(value) for value in (med, locprf, prefval)]
+            except (OSError, ValueError):
+                return None
+            return status, net_value, length_value, nexthop_value, numbers, path_ogn
+
+        append_status = table.status.append
+        append_network = table.network.append
+        append_prefixlen = table.prefixlen.append
+        append_nexthop = table.nexthop.append
+        append_med = table.med.append
+        append_locprf = table.locprf.append
+        append_prefval = table.prefval.append
+        append_path = table.path.append
+        append_origin = table.origin.append
+        for line in lines[index + 1:]:
+            if not line.strip():
+                continue
+            row = None
+            if len(line) > nh_col and not line[:net_col].isspace() and line[nh_col - 1] == ' ' and line[med_col - 1] == ' ':
+                # 列对齐的行直接按位置切分（常见情况，不经过 convert 以减少函数调用）
+                net = line[net_col:nh_col].strip()
+                nexthop = line[nh_col:med_col].strip()
+                med = line[med_col:locprf_col]
+                locprf = line[locprf_col:prefval_col]
+                prefval = line[prefval_col:path_col]
+                try:
+                    if net:
+                        address, _, length = net.partition('/')
+                        net_value, length_value = ip_to_int(address), int(length or 32)
+                    else:
+                        net_value, length_value = network, prefixlen
+                    nexthop_value = nexthops.get(nexthop)
+                    if nexthop_value is None:
+                        nexthop_value = nexthops[nexthop] = ip_to_int(nexthop)
+                    numbers = (MISSING if not med or med.isspace() else int(med),
+                               MISSING if not locprf or locprf.isspace() else int(locprf),
+                               MISSING if not prefval or prefval.isspace() else int(prefval))
+                    row = line[:net_col].strip(), net_value, length_value, nexthop_value, numbers, line[path_col:].strip()
+                except (OSError, ValueError):
+                    pass
+            if row is None:
+                # 与表头的列位置对不上的行（网络地址过长、行首多出空白等）按空白切分
+                fields = table.split_line(line)
+                row = convert(fields) if fields else None
+            if row is None:
+                print(f"无法解析 BGP 路由表中的行: {line.strip()}")
+                continue
+
+            status, network, prefixlen, nexthop_value, (med, locprf, prefval), path_ogn = row
+            append_status(status)
+            append_network(network)
+            append_prefixlen(prefixlen)
+            append_nexthop(nexthop_value)
+            append_med(med)
+            append_locprf(locprf)
+            append_prefval(prefval)
+            path = paths.get(path_ogn)
+            if path is None:
+                path = paths[path_ogn] = path_ogn[:-1].strip()
+            append_path(path)
+            append_origin(path_ogn[-1:])
+        return table
+
+    def split_line(self, line):
+        """列没有对齐时按空白切分：状态码、网络、下一跳之后依次是 MED、LocPrf、PrefVal 中出现的数字，其余为路径"""
+        tokens = line.split()
+        if len(tokens) < 4:
+            return None
+        status, net, nexthop = tokens[:3]
+        numbers = []
+        rest = tokens[3:]
+        while len(rest) > 1 and rest[0].isdigit() and len(numbers) < 3:
+            numbers.append(rest.pop(0))
+        # PrefVal 总是存在；只有两个数字时，IBGP 路由缺省 MED，其余缺省 LocPrf
+        if len(numbers) == 2:
+            numbers = ['', numbers[0], numbers[1]] if status.endswith('i') else [numbers[0], '', numbers[1]]
+        else:
+            numbers = [''] * (3 - len(numbers)) + numbers
+        return status, net, nexthop, numbers[0], numbers[1], numbers[2], ' '.join(rest)
+
+    def rows(self, sys_name, best_only=True):
+        """按原 bgp_routing_table_process 的格式逐行生成：
+        [设备, 状态码, 网络/前缀长度, 下一跳, MED 或 ##, LocPrf 或 ##, PrefVal, AS 路径..., 最后一个 AS+源码]
+        """
+        for i in range(len(self.network)):
+            status = self.status[i]
+            if best_only and '*>' not in status:
+                continue
+            row = [sys_name, status, f"{int_to_ip(self.network[i])}/{self.prefixlen[i]}", int_to_ip(self.nexthop[i]),
+                   str(self.med[i]) if self.med[i] != MISSING else '##',
+                   str(self.locprf[i]) if self.locprf[i] != MISSING else '##',
+                   str(self.prefval[i]) if self.prefval[i] != MISSING else '##']
+            path = self.path[i].split()
+            if path:
+                path[-1] += self.origin[i]
+            else:
+                path = [self.origin[i]]
+            row.extend(path)
+            yield row
@@ -3,9 +3,17 @@
 
 import telnetlib
 
-import time
+import os
+import sys
 import pdb
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.deadline import CircuitBreaker, Deadline, DeadlineExceeded, bounded_timeout
+from common.output_cache import OutputCache
+from common.prompt_reader import ConsoleTimeout, PromptReader
+from bgp_table import BgpTable
 
 host = "172.16.40.157"
 ports = [(32899, 'R1'), (32901, 'R2'), (32900, 'R3'), (32902, 'R4'), (32898, 'R5'), (32897, 'R6')]
@@ -52,17 +60,14 @@ def node_login_tmp(host, port, username, password, sysname):
     
     return tn
 
-def node_login(host, port):
-    tn = telnetlib.Telnet(host, port)
-    tn.read_some()
-    a = tn.read_very_eager()
-    ##print("a = ", a)
-    tn.write(b'\r\n')
-    a = tn.read_very_eager()
-    #print("a = ", a)
-    tn.write(b"system-view\r\n")
-    tn.write(b"screen-length 0\r\n")
-    tn.write(b"commit\r\n")
+def node_login(host, port, deadline=None):
+    # socket 超时同时限制连接的等待时间，挂死的控制台不会一直阻塞
+    tn = telnetlib.Telnet(host, port, timeout=bounded_timeout(deadline, 10))
+    # 每一步都等到提示符出现，登录阶段的输出不会残留到后续命令的结果中
+    reader = PromptReader(tn)
+    reader.sync(timeout=bounded_timeout(deadline, 10))
+    for cmd in ("system-view", "screen-length 0", "commit"):
+        reader.execute(cmd, timeout=bounded_timeout(deadline, 10))
     return tn
 
 def ip_config_str(ip_result):
@@ -101,43 +106,17 @@ def exec_cmd_tmp(tn, cmd_str, end_tag, is_set):
             tn.write(b'\r\n')
             return result
 
-def exec_cmd(tn, cmd_str, is_set):
-    cmd_encode = cmd_str + '\r\n'
-    cmd_encode = cmd_encode.encode()
-   # pdb.set_trace()
-    tn.write(cmd_encode)
-    #tn.write(b'\r\n')
-    time.sleep(0.1)
-    exec_result = tn.read_very_eager()
-    return exec_result.decode()
-    #print("exec_result = ", exec_result)
+def exec_cmd(tn, cmd_str, is_set, deadline=None, timeout=30):
+    # 一直读到命令结束后的提示符出现为止，---- More ---- 自动翻页，\x1b[16D 等控制序列被去掉
+    reader = PromptReader(tn)
+    return reader.execute(cmd_str, timeout=bounded_timeout(deadline, timeout))
 
 def bgp_routing_table_process(bgp_routing_table, sys_name):
-    ip_result = []
-    tmp = "        Network            NextHop                       MED        LocPrf    PrefVal Path/Ogn"
-    route_list = bgp_routing_table.split('\r\n')
-    if tmp not in route_list:
-        return False
-    index_head = route_list.index("        Network            NextHop                       MED        LocPrf    PrefVal Path/Ogn")
-    route_list = route_list[index_head + 1 : ]
-    for index, ip_str in enumerate(route_list):
-        if '*>' not in ip_str:
-            continue
-        ip_seg = ip_str.split()
-        #print("ip_seg = ", ip_seg)
-        if ip_seg[-1].endswith('i') and len(ip_seg) == 5:
-            ip_seg.insert(3, '##')
-            ip_seg.insert(3, '##')
-        elif len(ip_seg) == 6:
-            if ip_seg[0] == '*>i': ip_seg.insert(3, '##')
-            if ip_seg[0] == '*>': ip_seg.insert(4, '##')
-        ip_seg.insert(0, sys_name)
-        if len(ip_seg) < 8:
-            return False
-        ip_result.append(ip_seg)
-    if len(ip_result) == 0:
+    # 按表头中各列的位置解析，表头不存在（输出不完整）时返回 False；没有最优路由时返回空列表，不再触发重试
+    table = BgpTable.parse(bgp_routing_table)
+    if table is None:
         return False
-    return ip_result
+    return list(table.rows(sys_name))
 
 def ip_table_process(ip_table, sysname):
     ip_result = []
@@ -176,25 +155,100 @@ def get_bgp_routing_table(tn):
     #print("result = ", result)
     return result
 
-def get_bgp_routing_tables(device_info_list):
-    bgp_route_list = []
-    for device_info in device_info_list:
-        #print("(port, sys_name) = ", (port, sys_name))
+def sweep_device(host, port, tables, job_deadline, device_timeout, max_attempts, breaker, cache):
+    """一次登录采集 tables 中的所有表，返回 {表名: 解析结果}，未得到完整输出的表为 False。
+
+    tables 为 {表名: (命令, process)}。未过期的缓存输出直接解析，其余的表在同一个会话中依次执行，
+    每张表最多重试 max_attempts 次，并受设备时间预算限制；连续失败的设备由 breaker 在之后的运行中直接跳过。
+    """
+    key = host + ':' + str(port)
+    results = {name: False for name in tables}
+    if not breaker.allow(key):
+        print(f"{key} 连续超时，熔断中，跳过该设备")
+        return results
+
+    missing = []
+    for name, (command, process) in tables.items():
+        cached = cache.get(host, port, command) if cache else None
+        processed = process(cached) if cached is not None else False
+        if processed is False:
+            missing.append(name)
+        else:
+            results[name] = processed
+    if not missing:
+        return results
+
+    deadline = job_deadline.child(device_timeout)
+    tn = None
+    try:
+        tn = node_login(host, port, deadline)
+        for name in missing:
+            command, process = tables[name]
+            for attempt in range(max_attempts):
+                raw = exec_cmd(tn, command, False, deadline)
+                processed = process(raw)
+                if processed is not False:
+                    results[name] = processed
+                    if cache:
+                        cache.put(host, port, command, raw)
+                    break
+                if deadline.expired():
+                    break
+            else:
+                print(f"{key} 在 {max_attempts} 次尝试内未得到 {command} 的完整输出")
+    except (OSError, EOFError, DeadlineExceeded, ConsoleTimeout) as e:
+        print(f"Error connecting to {key} - {e}")
+    finally:
+        if tn:
+            tn.close()
+
+    if all(result is not False for result in results.values()):
+        breaker.record_success(key)
+    elif all(result is False for result in results.values()) and not job_deadline.expired():
+        # 作业预算耗尽导致的失败不计入熔断
+        breaker.record_failure(key)
+    return results
+
+def sweep_devices(device_info_list, max_workers=16, device_timeout=60, job_timeout=300, max_attempts=5,
+                  breaker=None, cache_ttl=0, tables=('ip', 'bgp')):
+    """并发登录每台设备一次，同时采集接口地址表和 BGP 路由表，结果供 ip_conflict_check 和 prefix_hijacking 共用。
+
+    tables 指定要采集的表（'ip' / 'bgp'），单独运行的检查脚本只采集自己需要的表。
+    返回 (ip_list, bgp_route_result)，格式分别与 get_ip_tables 和 get_bgp_routing_tables 相同，未采集的表为空。
+    cache_ttl 大于 0 时原始输出写入共享的命令输出缓存，cache_ttl 秒内先后运行的两个检查脚本只需登录一次设备；
+    默认为 0，不使用缓存，每次都读取设备的当前状态。
+    """
+    job_deadline = Deadline(job_timeout)
+    breaker = breaker or CircuitBreaker()
+    cache = OutputCache(ttl=cache_ttl) if cache_ttl > 0 else None
+
+    def sweep(device_info):
         host = device_info.get('hostip')
         port = device_info.get('port')
-        sys_name = host + ':' + str(port)
-        tn = node_login(host, port)
-        while True:
-            route_raw = get_bgp_routing_table(tn)
-            route_list = bgp_routing_table_process(route_raw, sys_name)
-            if route_list == False:
-                continue
-            else:
-                break
-        bgp_route_list.extend(route_list)
-    bgp_route_result = [tuple(i) for i in bgp_route_list]
-    bgp_route_result = set(bgp_route_result)
-    return bgp_route_result
+        sysname = host + ':' + str(port)
+        available = {
+            'ip': ("display ip interface brief", lambda raw: ip_table_process(raw, sysname)),
+            'bgp': ("display bgp routing-table", lambda raw: bgp_routing_table_process(raw, sysname)),
+        }
+        selected = {name: available[name] for name in tables}
+        return sweep_device(host, port, selected, job_deadline, device_timeout, max_attempts, breaker, cache)
+
+    ip_list = []
+    bgp_route_list = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(device_info_list)))) as executor:
+        for results in executor.map(sweep, device_info_list):
+            if results.get('ip', False) is not False:
+                ip_list.extend(results['ip'])
+            if results.get('bgp', False) is not False:
+                bgp_route_list.extend(results['bgp'])
+    breaker.save()
+    bgp_route_result = set(tuple(i) for i in bgp_route_list)
+    return ip_list, bgp_route_result
+
+def get_bgp_routing_tables(device_info_list, max_workers=16, device_timeout=60, job_timeout=300, max_attempts=5,
+                           breaker=None, cache_ttl=0):
+    return sweep_devices(device_info_list, max_workers, device_timeout, job_timeout, max_attempts, breaker, cache_ttl,
+                         tables=('bgp',))[1]
 
 def get_ip_interface_table(tn):
     statement = "display ip interface brief"
@@ -202,24 +256,10 @@ def get_ip_interface_table(tn):
     
     return result
 
-def get_ip_tables(device_info_list):
-    ip_list = []
-    for device_info in device_info_list:
-        host = device_info.get('hostip')
-        port = device_info.get('port')
-        sysname = host + ':' + str(port)
-        tn = node_login(host, port)
-        while True:
-            ip_raw = get_ip_interface_table(tn)
-            #print("ip_raw = ", repr(ip_raw))
-            processed = ip_table_process(ip_raw, sysname)
-            #print("processed = ", processed)
-            if processed == False:
-                continue
-            else:
-                break
-        ip_list.extend(processed)
-    return ip_list
+def get_ip_tables(device_info_list, max_workers=16, device_timeout=60, job_timeout=300, max_attempts=5,
+                  breaker=None, cache_ttl=0):
+    return sweep_devices(device_info_list, max_workers, device_timeout, job_timeout, max_attempts, breaker, cache_ttl,
+                         tables=('ip',))[0]
 
 def main():
     tn = node_login(host, port, username, password, "R1")
@@ -1,8 +1,30 @@
 #!/usr/bin/env python3
 
 
+import sys
+import time
+import queue
+import argparse
+import threading
+from contextlib import contextmanager
+
 import pymysql
 
+# LibreNMS 中一个接口地址对应的设备名称：优先用 sysName，与 Telnet 采集得到的 sysname 一致
+LIBRENMS_IPV4_SQL = ("SELECT COALESCE(NULLIF(d.sysName, ''), d.hostname) AS device_name, "
+                     "ip_a.ipv4_address AS address, ip_a.ipv4_prefixlen AS prefixlen "
+                     "FROM ipv4_addresses ip_a "
+                     "JOIN ports p ON ip_a.port_id = p.port_id "
+                     "JOIN devices d ON p.device_id = d.device_id "
+                     "WHERE p.deleted = 0")
+LIBRENMS_IPV6_SQL = ("SELECT COALESCE(NULLIF(d.sysName, ''), d.hostname) AS device_name, "
+                     "ip_a.ipv6_address AS address, ip_a.ipv6_prefixlen AS prefixlen "
+                     "FROM ipv6_addresses ip_a "
+                     "JOIN ports p ON ip_a.port_id = p.port_id "
+                     "JOIN devices d ON p.device_id = d.device_id "
+                     "WHERE p.deleted = 0")
+
+
 def create_connection_to_mysql(host, password):
     connection = pymysql.connect(host = host, user = "librenms", password = password, database = 'librenms', charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor)
     cursor = connection.cursor()
@@ -15,12 +37,159 @@ def execute_sql(connection, cursor, sql_str, is_insert):
         connection.commit()
     else:
         exec_result = cursor.fetchall()
-    
+
     return exec_result
 
-#if __name__ == "__main__":
-#    connection, cursor = create_connection_to_mysql("172.16.204.161", "librenms@2024")
-#    sql = "SELECT ipv4_address, ipv4_prefixlen FROM ipv4_addresses;"
-#    result = execute_sql(connection, cursor, sql, False)
-#    print("result = ", result)
 
+class ConnectionPool(object):
+    """LibreNMS 数据库连接池：连接用完后放回池中复用，同时借出的连接数不超过 max_size。
+
+    用法：
+        with pool.connection() as connection:
+            ...
+    借出前用 ping(reconnect=True) 检查空闲连接，被服务器断开的连接会自动重连；
+    使用过程中抛出异常的连接直接关闭，不放回池中。
+    """
+
+    def __init__(self, host, password, user="librenms", database="librenms", port=3306, max_size=4, connect_timeout=10):
+        self.params = dict(host=host, user=user, password=password, database=database, port=port,
+                           charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor, connect_timeout=connect_timeout)
+        self.idle = queue.LifoQueue()
+        self.available = threading.BoundedSemaphore(max_size)
+
+    @contextmanager
+    def connection(self):
+        self.available.acquire()
+        try:
+            try:
+                connection = self.idle.get_nowait()
+                connection.ping(reconnect=True)
+            except queue.Empty:
+                connection = pymysql.connect(**self.params)
+
+            try:
+                yield connection
+            except BaseException:
+                # 出错的连接上可能还有未读完的结果，不再复用
+                if connection.open:
+                    connection.close()
+                raise
+            if connection.open:
+                self.idle.put(connection)
+        finally:
+            self.available.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# abandon_unbuffered 改动的 pymysql 内部状态只在这些版本（含）之间验证过，升级 pymysql 后先运行
+#   python get_device_data.py --check-abandon --host <数据库地址> --password <密码>
+# 通过后再放宽上限
+ABANDON_TESTED_PYMYSQL = ((1, 0), (1, 2))
+
+
+def abandon_unbuffered(connection, cursor):
+    """断开连接并丢弃 SSCursor 上未读完的结果集，不读取剩余的行。
+
+    pymysql 没有放弃未读完结果集的接口：关闭游标会把剩余的结果全部读完再丢弃，结果集很大时要等很久。
+    """
+    # 先用公开接口断开连接，之后的清理无论怎样都不会再读到剩余的结果
+    if connection.open:
+        connection.close()
+    if ABANDON_TESTED_PYMYSQL[0] <= tuple(pymysql.VERSION[:2]) <= ABANDON_TESTED_PYMYSQL[1]:
+        # 已验证的版本：把结果集标记为已读完，游标和结果集回收时就不会去读已断开的连接并打印 Exception ignored
+        result = getattr(cursor, "_result", None)
+        if result is not None:
+            result.unbuffered_active = False
+        cursor.connection = None
+    else:
+        # 未验证的版本只用公开接口：连接已断开，关闭游标时读取立即出错，忽略即可；回收时 pymysql 可能打印警告
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def stream_query(pool, sql_str, args=None, batch_size=10000):
+    """用服务器端游标（SSDictCursor）执行查询，按 batch_size 行一批逐批返回，不会把整个结果集读入内存。
+
+    调用方提前停止迭代或处理出错时用 abandon_unbuffered 直接断开连接，不读完剩余的结果。
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            cursor.execute(sql_str, args)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        except BaseException:
+            abandon_unbuffered(connection, cursor)
+            raise
+        cursor.close()
+
+
+def load_librenms_addresses(pool, table, batch_size=10000, ipv6=True):
+    """把 LibreNMS 中所有未删除端口上的接口地址逐批装入 AddressTable，返回装入的地址数"""
+    count = 0
+    statements = [LIBRENMS_IPV4_SQL, LIBRENMS_IPV6_SQL] if ipv6 else [LIBRENMS_IPV4_SQL]
+    for sql_str in statements:
+        for rows in stream_query(pool, sql_str, batch_size=batch_size):
+            for row in rows:
+                table.add(row["device_name"], f"{row['address']}/{row['prefixlen']}")
+            count += len(rows)
+    return count
+
+def check_abandon(pool, rows=1000000, batch_size=1000, max_seconds=0.5):
+    """检查提前放弃大结果集的流式查询：放弃要在 max_seconds 内完成，之后连接池仍可正常查询。返回是否通过"""
+    digits = "SELECT 0 AS n UNION ALL " + " UNION ALL ".join(f"SELECT {i}" for i in range(1, 10))
+    # 不依赖任何表：用若干个 0-9 的派生表做笛卡尔积生成 rows 行（向上取到 10 的幂），MySQL 和 MariaDB 都支持
+    width = max(1, len(str(rows - 1)))
+    sql_str = "SELECT " + " + ".join(f"d{i}.n * {10 ** i}" for i in range(width)) + " AS n FROM " + \
+              ", ".join(f"({digits}) AS d{i}" for i in range(width))
+
+    stream = stream_query(pool, sql_str, batch_size=batch_size)
+    first = next(stream)
+    start = time.monotonic()
+    stream.close()
+    elapsed = time.monotonic() - start
+    print(f"Read {len(first)} of {10 ** width} rows, abandoning the rest took {elapsed:.2f}s")
+
+    with pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 AS ok")
+            usable = cursor.fetchone() is not None
+    print(f"Pool usable after abandonment: {usable}")
+    return elapsed <= max_seconds and usable
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LibreNMS 数据库访问工具")
+    parser.add_argument("--host", default="172.16.204.161", help="LibreNMS 数据库地址")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="librenms")
+    parser.add_argument("--password", default="librenms@2024")
+    parser.add_argument("--database", default="librenms")
+    parser.add_argument("--check-abandon", action="store_true",
+                        help="检查提前放弃大结果集的流式查询不会把剩余结果读完（升级 pymysql 后运行）")
+    parser.add_argument("--rows", type=int, default=1000000, help="--check-abandon 生成的结果集行数")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.host, args.password, user=args.user, database=args.database, port=args.port)
+    try:
+        if args.check_abandon:
+            print(f"pymysql {'.'.join(str(part) for part in pymysql.VERSION[:3])}")
+            ok = check_abandon(pool, rows=args.rows)
+            print("PASS" if ok else "FAIL")
+            sys.exit(0 if ok else 1)
+        for rows in stream_query(pool, LIBRENMS_IPV4_SQL):
+            for row in rows:
+                print(row)
+    finally:
+        pool.close()
@@ -2,33 +2,34 @@
 
 
 
-import ipaddress  
-#from get_device_data import create_connection_to_mysql, execute_sql
+import os
+import argparse
+import ipaddress
 from get_NE40_telnet import get_ip_tables
 
 from get_device_param import get_json_content
+from address_table import AddressTable
 
 
 host = "172.16.40.157"
 ports = [(32899, 'R1'), (32901, 'R2'), (32900, 'R3'), (32902, 'R4'), (32898, 'R5'), (32897, 'R6')]
 
-'''
-def get_ip_list_backup(host, password):
-    devices = {}
-    connection, cursor = create_connection_to_mysql(host, password)
-    sql_statement = "SELECT p.device_id, ip_a.ipv4_address, ip_a.ipv4_prefixlen FROM ipv4_addresses ip_a left join  ports p on ip_a.port_id = p.port_id where p.ifType = 'ethernetCsmacd';"
-    sql_result = execute_sql(connection, cursor, sql_statement, False)
-    for device in sql_result:
-        device_id = device.get("device_id")
-        if devices.get(device_id):
-            devices[device_id].append(device.get("ipv4_address") + '/' + str(device.get("ipv4_prefixlen")))
-        else:
-            devices[device_id] = [device.get("ipv4_address") + '/' + str(device.get("ipv4_prefixlen"))]
-    #print("devices = ", devices)
-    return devices
-'''
-def get_ip_list(device_info_list):
-    sql_result = get_ip_tables(device_info_list)
+def get_ip_table_from_librenms(db_host, db_password, batch_size=10000):
+    """从 LibreNMS 数据库逐批读取所有设备的接口地址，直接装入地址表，不需要登录任何设备"""
+    # 只有使用 LibreNMS 数据源时才需要 pymysql
+    from get_device_data import ConnectionPool, load_librenms_addresses
+
+    pool = ConnectionPool(db_host, db_password)
+    table = AddressTable()
+    try:
+        count = load_librenms_addresses(pool, table, batch_size)
+    finally:
+        pool.close()
+    print(f"Loaded {count} addresses of {len(table.devices)} devices from LibreNMS")
+    return table
+
+def get_ip_list(device_info_list, ip_tables=None, cache_ttl=0):
+    sql_result = get_ip_tables(device_info_list, cache_ttl=cache_ttl) if ip_tables is None else ip_tables
     #print("sql_result = ", sql_result) 
     devices = {}
     for device in sql_result:
@@ -42,42 +43,35 @@ def get_ip_list(device_info_list):
     return devices
 
 def check_ip_conflict_data_process(devices):
-    subnet_to_devices = {}
-    #print("devices = ", devices)
+    """把 {设备: {"地址/前缀长度", ...}} 装入以整数数组保存的地址表"""
+    table = AddressTable()
     for device_id, ip_list in devices.items():
         for ip_ in ip_list:
-            #print("ip_ = ", ip_)
-            #print(f"device_id = {device_id} ip_list = {ip_list}")
-            ip_str, prefixlen = ip_.split('/')
-            
-            ip = ipaddress.ip_address(ip_str)
-            network = ipaddress.ip_network(ip_, strict = False)
-            
-            if network in subnet_to_devices:
-                if ip in subnet_to_devices[network]:
-                    #print(f"Conflict found for IP {ip_str} between devices {device_id} and {subnet_to_devices[network][ip]}")
-                    subnet_to_devices[network][ip].append(device_id)
-                else:
-                    subnet_to_devices[network].setdefault(ip, []).append(device_id)
-            else:
-                subnet_to_devices[network] = {ip: [device_id]}
-    
-    #print("subnet_to_devices = ", subnet_to_devices)
-    return subnet_to_devices
-
-def check_ip_conflict(subnet_to_devices):
+            table.add(device_id, ip_)
+
+    return table
+
+def check_ip_conflict(table):
+    """返回 {网段: {冲突地址: [设备, ...]}}，同一个地址配置在多个接口上即为冲突"""
     check_result = {}
-    for subnet, ip_dict in subnet_to_devices.items():
-        for ip, device_list in ip_dict.items():
-            if len(device_list) > 1:
-                check_result[subnet] = {}
-                check_result[subnet][ip] = device_list
-            else:
-                continue
+    for version, address, prefixlen, device_list in table.duplicates():
+        subnet = ipaddress.ip_network(table.format(version, address, prefixlen), strict = False)
+        ip = ipaddress.ip_address(table.format(version, address))
+        check_result.setdefault(subnet, {})[ip] = device_list
 
     print("check_result = ", check_result)
     return check_result
 
+def check_subnet_overlap(table):
+    """返回 [(外层网段, [设备, ...], 内层网段, [设备, ...]), ...]，只包含互不相等但相互包含的网段"""
+    overlap_result = []
+    for (version, outer, outer_len, outer_devices), (_, inner, inner_len, inner_devices) in table.overlaps():
+        overlap_result.append((table.format(version, outer, outer_len), outer_devices,
+                               table.format(version, inner, inner_len), inner_devices))
+
+    print("overlap_result = ", overlap_result)
+    return overlap_result
+
 def result_to_txt(result):
     result_str = str(result)
     with open('./ip_conflict.txt', 'w') as f:
@@ -85,13 +79,21 @@ def result_to_txt(result):
 
 
 if __name__ == "__main__":
-    device_info_list = get_json_content('./param.json')
-    #print("device_info_list = ", device_info_list)
-    devices = get_ip_list(device_info_list)
-    #print("devices = ", devices)
-    #print("devices = ", devices)
-    subnet_to_devices = check_ip_conflict_data_process(devices)
-    result = check_ip_conflict(subnet_to_devices)
-    result_to_txt(result)
-    
+    parser = argparse.ArgumentParser(description="检查所有设备接口地址的冲突和子网重叠。")
+    parser.add_argument("-i", "--input", default="./param.json", help="param.json 的路径（默认为 ./param.json），telnet 数据源使用。")
+    parser.add_argument("--source", choices=["telnet", "librenms"], default="telnet", help="地址数据来源：telnet 登录每台设备采集，librenms 直接读取 LibreNMS 数据库（默认为 telnet）。")
+    parser.add_argument("--db-host", default="172.16.204.161", help="LibreNMS 数据库地址。")
+    parser.add_argument("--db-password", default=os.environ.get("NET_TWIN_LIBRENMS_PASSWORD"), help="LibreNMS 数据库用户 librenms 的密码（也可通过 NET_TWIN_LIBRENMS_PASSWORD 设置）。")
+    parser.add_argument("--batch-size", type=int, default=10000, help="从数据库逐批读取的行数（默认为 10000）。")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="复用多少秒内缓存的设备输出，0 表示不使用缓存（默认为 0）。")
+    args = parser.parse_args()
 
+    if args.source == "librenms":
+        table = get_ip_table_from_librenms(args.db_host, args.db_password, args.batch_size)
+    else:
+        device_info_list = get_json_content(args.input)
+        devices = get_ip_list(device_info_list, cache_ttl=args.cache_ttl)
+        table = check_ip_conflict_data_process(devices)
+    result = check_ip_conflict(table)
+    overlaps = check_subnet_overlap(table)
+    result_to_txt({"conflicts": result, "overlaps": overlaps})
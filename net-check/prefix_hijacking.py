@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
 
+import argparse
 import ipaddress
+import socket
 from get_NE40_telnet import get_bgp_routing_tables
 from get_device_param import get_json_content
+from prefix_trie import PrefixTrie
 
 
 class Prefix(object):
@@ -47,40 +50,24 @@ def ip_to_binary(ip_str):
 
 
 def raw_data_process(bgp_routing_data):
-    ip_dic = {}
-    for item in bgp_routing_data:
-        ip_str = item[2].split('/')[0]
-        ip_len = int(item[2].split('/')[1])
-        as_num = item[-1]
-        if as_num == 'i':
-            continue
-        ip_bina = ip_to_binary(ip_str)
-        if ip_dic.get(ip_bina, None):
-            ip_dic[ip_bina].add((ip_str, ip_len, as_num))
-        else:
-            ip_dic[ip_bina] = set()
-            ip_dic[ip_bina].add((ip_str, ip_len, as_num))
-
-    return ip_dic
-
-def subnet_prefix_hijacking(ip_dic):
-    ip_tuple = ip_dic.items()
+    """把各设备的 BGP 表项插入前缀树，每个 (前缀, 源 AS) 只插入一次；本地宣告（源为 i）的表项跳过"""
+    def entries():
+        for item in bgp_routing_data:
+            as_num = item[-1]
+            if as_num == 'i':
+                continue
+            ip_str, ip_len = item[2].split('/')
+            yield int.from_bytes(socket.inet_aton(ip_str), 'big'), int(ip_len), as_num
+
+    trie = PrefixTrie()
+    trie.insert_all(entries())
+    return trie
+
+def subnet_prefix_hijacking(trie):
+    """一次遍历前缀树，返回 {上级前缀: [其他 AS 宣告的更具体或相同前缀, ...]}"""
     prefix_dic = {}
-    ip_dic_sorted = sorted(ip_tuple, key = lambda i: tuple(i[1])[0][1])
-    for index, ip_info in enumerate(ip_dic_sorted):
-        ip_, len_as = ip_info
-        len_as = tuple(len_as)[0]
-        ip_str, prefix_len, as_ = len_as
-        parant_prefix = Prefix(ip_str, as_)
-        for ip_2, prefix_len_as in ip_dic_sorted[index + 1 : ]:
-            ip_str_1, prefix_len_2, as_2 = tuple(prefix_len_as)[0]
-            prefix = Prefix(ip_str_1, as_2)
-            if ip_[: prefix_len] == ip_2[: prefix_len]:
-                if prefix_dic.get(parant_prefix, None):
-                    prefix_dic[parant_prefix].append(prefix)
-                else:
-                    prefix_dic[parant_prefix] = []
-                    prefix_dic[parant_prefix].append(prefix)
+    for (parent_str, parent_as), (prefix_str, as_) in trie.find_conflicts():
+        prefix_dic.setdefault(Prefix(parent_str, parent_as), []).append(Prefix(prefix_str, as_))
 
     return prefix_dic
         
@@ -90,8 +77,13 @@ def result_to_txt(result):
         f.write(result_str + '\n')
 
 if __name__ == "__main__":
-    device_info_list = get_json_content('./param.json')
-    ip_raw_data = get_bgp_routing_tables(device_info_list)
+    parser = argparse.ArgumentParser(description="检查所有设备 BGP 路由表中的前缀劫持。")
+    parser.add_argument("-i", "--input", default="./param.json", help="param.json 的路径（默认为 ./param.json）。")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="复用多少秒内缓存的设备输出，0 表示不使用缓存（默认为 0）。")
+    args = parser.parse_args()
+
+    device_info_list = get_json_content(args.input)
+    ip_raw_data = get_bgp_routing_tables(device_info_list, cache_ttl=args.cache_ttl)
     result = raw_data_process(ip_raw_data)
     
     result = subnet_prefix_hijacking(result)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+
+import gc
+import ipaddress
+from contextlib import contextmanager
+
+
+@contextmanager
+def no_gc():
+    # 建树时一次创建上百万个小对象，分代 GC 会被反复触发并扫描整棵树，批量操作期间暂停
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class TrieNode(object):
+    __slots__ = ('key', 'length', 'origins', 'children')
+
+    def __init__(self, key, length, origins=None):
+        self.key = key
+        self.length = length
+        self.origins = origins  # 宣告该前缀的源 AS 集合，路径压缩产生的中间节点为 None
+        self.children = [None, None]
+
+
+class PrefixTrie(object):
+    """路径压缩的二叉前缀树（Patricia trie），键为整数形式的网络地址。
+
+    第一层按前 stride 位（IPv4 默认 16 位）分桶：全表中绝大多数前缀长度不短于 /16，
+    插入时直接从对应的桶开始，只需走很少几层；更短的前缀放在单独的一棵树中。
+    每个 (前缀, 源 AS) 只插入一次，find_conflicts 一次深度优先遍历即可找出
+    所有被其他 AS 宣告了更具体前缀或相同前缀的情况。
+    """
+
+    def __init__(self, width=32, stride=None):
+        self.width = width
+        self.stride = stride or width // 2
+        self.root = TrieNode(0, 0)  # 长度小于 stride 的前缀
+        self.buckets = {}  # 前 stride 位 -> 该 /stride 前缀对应的子树根
+        self.size = 0
+
+    def bit(self, key, position):
+        return (key >> (self.width - 1 - position)) & 1
+
+    def insert(self, key, length, origin):
+        if length >= self.stride:
+            top = key >> (self.width - self.stride)
+            node = self.buckets.get(top)
+            if node is None:
+                node = self.buckets[top] = TrieNode(top << (self.width - self.stride), self.stride)
+        else:
+            node = self.root
+        self.insert_from(node, key, length, origin)
+
+    def insert_all(self, entries):
+        """批量插入 (key, length, origin)"""
+        with no_gc():
+            for key, length, origin in entries:
+                self.insert(key, length, origin)
+
+    def insert_from(self, node, key, length, origin):
+        width = self.width
+        while True:
+            if node.length == length:
+                # node 总是覆盖 key，长度相同即为同一前缀
+                if node.origins is None:
+                    node.origins = set()
+                    self.size += 1
+                node.origins.add(origin)
+                return
+
+            index = (key >> (width - 1 - node.length)) & 1
+            child = node.children[index]
+            if child is None:
+                node.children[index] = TrieNode(key, length, {origin})
+                self.size += 1
+                return
+
+            child_length = child.length
+            if child_length <= length and (key ^ child.key) >> (width - child_length) == 0:
+                node = child
+                continue
+
+            common = min(length, width - (key ^ child.key).bit_length())
+            if common == length:
+                # 新前缀覆盖 child，插在两者之间
+                new = TrieNode(key, length, {origin})
+                new.children[self.bit(child.key, length)] = child
+            else:
+                # 两者在第 common 位分叉，插入不带宣告的中间节点
+                mask = ((1 << common) - 1) << (width - common)
+                new = TrieNode(key & mask, common)
+                new.children[self.bit(child.key, common)] = child
+                new.children[self.bit(key, common)] = TrieNode(key, length, {origin})
+            node.children[index] = new
+            self.size += 1
+            return
+
+    def insert_prefix(self, prefix, origin):
+        network = ipaddress.ip_network(prefix, strict=False)
+        self.insert(int(network.network_address), network.prefixlen, origin)
+
+    def prefix_str(self, node):
+        key = node.key
+        if self.width == 32:
+            return f"{key >> 24}.{(key >> 16) & 255}.{(key >> 8) & 255}.{key & 255}/{node.length}"
+        return f"{ipaddress.IPv6Address(key)}/{node.length}"
+
+    def covering(self, key):
+        """返回短前缀树中覆盖 key 的所有带宣告的前缀，按长度从短到长排列"""
+        path = []
+        node = self.root
+        while node is not None and (key ^ node.key) >> (self.width - node.length) == 0:
+            if node.origins is not None:
+                path.append(node)
+            if node.length >= self.width:
+                break
+            node = node.children[self.bit(key, node.length)]
+        return path
+
+    def find_conflicts(self):
+        """返回 [((上级前缀, 源 AS), (更具体或相同的前缀, 源 AS)), ...]。
+
+        更具体前缀的源 AS 不在覆盖它的某个上级前缀的源 AS 集合中时，对该上级前缀的每个源 AS 各报告一次；
+        同一前缀被多个 AS 宣告时，两两报告一次。
+        """
+        conflicts = []
+        with no_gc():
+            self.walk(self.root, [], conflicts)
+            for top in sorted(self.buckets):
+                bucket = self.buckets[top]
+                self.walk(bucket, self.covering(bucket.key), conflicts)
+        return conflicts
+
+    def walk(self, start, path, conflicts):
+        """从 start 开始深度优先遍历，path 为 start 之上所有带宣告的前缀"""
+        stack = [(start, len(path))]
+        while stack:
+            node, depth = stack.pop()
+            del path[depth:]
+            origins = node.origins
+            if origins is not None:
+                # 绝大多数前缀没有冲突，只在需要报告时才生成前缀字符串
+                for ancestor in path:
+                    for origin in origins - ancestor.origins:
+                        for ancestor_origin in sorted(ancestor.origins):
+                            conflicts.append(((self.prefix_str(ancestor), ancestor_origin), (self.prefix_str(node), origin)))
+                if len(origins) > 1:
+                    prefix = self.prefix_str(node)
+                    ordered = sorted(origins)
+                    for i, origin in enumerate(ordered):
+                        for other in ordered[i + 1:]:
+                            conflicts.append(((prefix, origin), (prefix, other)))
+                path.append(node)
+            for child in node.children:
+                if child is not None:
+                    stack.append((child, len(path)))
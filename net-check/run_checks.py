@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+
+import argparse
+from get_NE40_telnet import sweep_devices
+from get_device_param import get_json_content
+import ip_conflict_check
+import prefix_hijacking
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="一次采集所有设备，同时进行 IP 冲突检查和前缀劫持检查。")
+    parser.add_argument("-i", "--input", default="./param.json", help="param.json 的路径（默认为 ./param.json）。")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="复用多少秒内缓存的设备输出，0 表示不使用缓存（默认为 0）。")
+    args = parser.parse_args()
+
+    device_info_list = get_json_content(args.input)
+    # 每台设备只登录一次，同一份采集结果同时用于 IP 冲突检查和前缀劫持检查
+    ip_tables, bgp_routes = sweep_devices(device_info_list, cache_ttl=args.cache_ttl)
+
+    devices = ip_conflict_check.get_ip_list(device_info_list, ip_tables)
+    table = ip_conflict_check.check_ip_conflict_data_process(devices)
+    result = ip_conflict_check.check_ip_conflict(table)
+    overlaps = ip_conflict_check.check_subnet_overlap(table)
+    ip_conflict_check.result_to_txt({"conflicts": result, "overlaps": overlaps})
+
+    result = prefix_hijacking.raw_data_process(bgp_routes)
+    result = prefix_hijacking.subnet_prefix_hijacking(result)
+    print("check result = ", result)
+    prefix_hijacking.result_to_txt(result)
@@ -0,0 +1,665 @@
+#!/usr/bin/env python3
+"""模拟 docker CLI，用于在没有真实 FRR 容器的机器上压测 FrrContainerManager 等采集路径。
+
+先生成容器状态，再把 docker 包装脚本放到 PATH 最前面：
+    python simulator/fake_docker.py init --count 1000 --lab-id sim-lab
+    python simulator/fake_docker.py install --bin-dir /tmp/net-twin-sim/bin
+    export PATH=/tmp/net-twin-sim/bin:$PATH
+之后 docker ps / exec / stats 都由本脚本回答。
+
+也可以在 Unix socket 上模拟 Docker Engine API，供 common/docker_api.py 使用：
+    python simulator/fake_docker.py serve --socket /tmp/net-twin-sim/docker.sock
+    export NET_TWIN_DOCKER_SOCKET=/tmp/net-twin-sim/docker.sock
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import fcntl
+import shutil
+import hashlib
+import argparse
+import threading
+import subprocess
+import socketserver
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+STATE_DIR = os.environ.get("NET_TWIN_SIM_DOCKER", "/tmp/net-twin-sim/docker")
+DEFAULT_IMAGE = "25125/frrouting:10-dev-05221913"
+# dockerd 只在内存中保留最近 256 条事件（所有类型共用），更早的事件用 since 也取不回
+EVENT_BUFFER = 256
+
+
+def load_state(state_dir):
+    try:
+        with open(os.path.join(state_dir, "state.json"), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"Cannot connect to the Docker daemon (no simulator state in {state_dir}, run init first)", file=sys.stderr)
+        sys.exit(1)
+
+
+def container_root(state_dir, container_id):
+    return os.path.join(state_dir, "containers", container_id)
+
+
+def frr_config(index, count, config_lines, rng):
+    """链式拓扑的 frr.conf；部分容器故意缺少 BGP/OSPF/静态路由段，供错误检测使用"""
+    lines = ["frr version 10.0", "frr defaults traditional", f"hostname frr{index}", "log syslog informational", "!"]
+    for slot, peer in enumerate(p for p in (index - 1, index + 1) if 1 <= p <= count):
+        link = min(index, peer)
+        side = 1 if index < peer else 2
+        lines += [f"interface eth{slot}", f" ip address 172.20.{link >> 6}.{((link & 63) << 2) + side}/30", "!"]
+    lines += ["interface lo", f" ip address 10.254.{index >> 8}.{index & 255}/32", "!"]
+    missing = rng.choice([None, None, None, 'bgp', 'ospf', 'static'])
+    if missing != 'bgp':
+        lines += [f"router bgp {64512 + index}", f" bgp router-id 10.254.{index >> 8}.{index & 255}"]
+        for peer in (index - 1, index + 1):
+            if 1 <= peer <= count:
+                link = min(index, peer)
+                side = 2 if index < peer else 1
+                lines.append(f" neighbor 172.20.{link >> 6}.{((link & 63) << 2) + side} remote-as {64512 + peer}")
+        lines.append("!")
+    if missing != 'ospf':
+        lines += ["router ospf", f" ospf router-id 10.254.{index >> 8}.{index & 255}", " network 172.20.0.0/16 area 0", "!"]
+    if missing != 'static':
+        lines.append(f"ip route 0.0.0.0/0 172.20.0.1")
+    filler = 0
+    while len(lines) < config_lines:
+        lines.append(f"ip route 198.51.{(filler >> 8) & 255}.{filler & 255}/32 Null0")
+        filler += 1
+    lines += ["!", "line vty", "!", "end"]
+    return "\n".join(lines) + "\n"
+
+
+def cmd_init(args):
+    """生成 count 个运行中的 FRR 容器，每个容器的文件系统放在 state_dir/containers/<id>/ 下"""
+    shutil.rmtree(args.state_dir, ignore_errors=True)
+    rng = random.Random(args.seed)
+    containers = []
+    for index in range(1, args.count + 1):
+        container_id = hashlib.sha256(f"{args.lab_id}-{index}".encode()).hexdigest()
+        name = f"{args.lab_id}-frr{index}"
+        root = container_root(args.state_dir, container_id[:12])
+        os.makedirs(os.path.join(root, "etc", "frr"))
+        with open(os.path.join(root, "etc", "frr", "frr.conf"), 'w') as f:
+            f.write(frr_config(index, args.count, args.config_lines, rng))
+        with open(os.path.join(root, "etc", "frr", "daemons"), 'w') as f:
+            f.write("bgpd=yes\nospfd=yes\nzebra=yes\n")
+        containers.append({"id": container_id, "name": name, "image": args.image, "index": index})
+    state = {"containers": containers, "exec_latency": args.exec_latency, "stats_latency": args.stats_latency,
+             "lab_id": args.lab_id}
+    with open(os.path.join(args.state_dir, "state.json"), 'w') as f:
+        json.dump(state, f, indent=4)
+    print(f"Simulated {args.count} containers in {args.state_dir}")
+
+
+def save_state(state_dir, state):
+    path = os.path.join(state_dir, "state.json")
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+
+def record_event(state_dir, action, container):
+    """把容器事件追加到 events.jsonl，格式与 docker events 的 JSON 输出相同"""
+    now = time.time_ns()
+    event = {"Type": "container", "Action": action, "status": action, "id": container["id"], "from": container["image"],
+             "Actor": {"ID": container["id"], "Attributes": {"name": container["name"], "image": container["image"]}},
+             "scope": "local", "time": now // 10 ** 9, "timeNano": now}
+    path = os.path.join(state_dir, "events.jsonl")
+    with open(os.path.join(state_dir, "events.lock"), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path, 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            lines = []
+        lines = lines[-(EVENT_BUFFER - 1):] + [json.dumps(event) + "\n"]
+        with open(f"{path}.tmp", 'w') as f:
+            f.writelines(lines)
+        os.replace(f"{path}.tmp", path)
+
+
+def read_events(state_dir, since=None, until=None, filters=None):
+    """返回 since <= 时间 < until 的事件，since / until 为 docker 的 "秒.纳秒" 时间戳"""
+    since_ns = int(float(since) * 1e9) if since else 0
+    until_ns = int(float(until) * 1e9) if until else None
+    events = []
+    try:
+        with open(os.path.join(state_dir, "events.jsonl"), 'r') as f:
+            lines = f.readlines()
+    except OSError:
+        return events
+    for line in lines:
+        if not line.endswith("\n"):
+            break
+        event = json.loads(line)
+        if event["timeNano"] < since_ns or (until_ns is not None and event["timeNano"] > until_ns):
+            continue
+        if filters and "type" in filters and event["Type"] not in filters["type"]:
+            continue
+        if filters and "event" in filters and event["Action"] not in filters["event"]:
+            continue
+        events.append(event)
+    return events
+
+
+def cmd_run(args, state):
+    """docker run -d --name NAME IMAGE：新建一个运行中的 FRR 容器"""
+    index = max([c["index"] for c in state["containers"]] + [0]) + 1
+    name = args.name or f"{state.get('lab_id', 'sim-lab')}-frr{index}"
+    if any(c["name"] == name for c in state["containers"]):
+        print(f'docker: Error response from daemon: Conflict. The container name "/{name}" is already in use.', file=sys.stderr)
+        return 125
+    container = {"id": hashlib.sha256(f"{name}-{time.time_ns()}".encode()).hexdigest(), "name": name,
+                 "image": args.image, "index": index}
+    root = container_root(args.state_dir, container["id"][:12])
+    os.makedirs(os.path.join(root, "etc", "frr"))
+    with open(os.path.join(root, "etc", "frr", "frr.conf"), 'w') as f:
+        f.write(frr_config(index, index, 0, random.Random(index)))
+    state["containers"].append(container)
+    save_state(args.state_dir, state)
+    record_event(args.state_dir, "create", container)
+    record_event(args.state_dir, "start", container)
+    print(container["id"])
+    return 0
+
+
+def cmd_rm(args, state):
+    """docker rm -f REF...：删除容器，依次产生 kill / die / destroy 事件"""
+    status = 0
+    for ref in args.containers:
+        container = find_container(state, ref)
+        if container is None:
+            print(f"Error response from daemon: No such container: {ref}", file=sys.stderr)
+            status = 1
+            continue
+        state["containers"].remove(container)
+        save_state(args.state_dir, state)
+        shutil.rmtree(container_root(args.state_dir, container["id"][:12]), ignore_errors=True)
+        for action in ("kill", "die", "destroy"):
+            record_event(args.state_dir, action, container)
+        print(ref)
+    return status
+
+
+def cmd_events(args, state):
+    filters = {}
+    for item in args.filter:
+        key, _, value = item.partition('=')
+        filters.setdefault(key, []).append(value)
+    if not args.until:
+        print("the simulator only supports docker events with --until", file=sys.stderr)
+        return 1
+    for event in read_events(args.state_dir, args.since, args.until, filters):
+        print(json.dumps(event) if args.format == "{{json .}}" else
+              f"{event['Type']} {event['Action']} {event['id']} (name={event['Actor']['Attributes']['name']})")
+    return 0
+
+
+def cmd_install(args):
+    os.makedirs(args.bin_dir, exist_ok=True)
+    wrapper = os.path.join(args.bin_dir, "docker")
+    with open(wrapper, 'w') as f:
+        f.write("#!/bin/sh\n")
+        f.write(f'NET_TWIN_SIM_DOCKER="${{NET_TWIN_SIM_DOCKER:-{os.path.abspath(args.state_dir)}}}" '
+                f'exec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(wrapper, 0o755)
+    print(f"docker wrapper written to {wrapper}; prepend {args.bin_dir} to PATH to use it")
+
+
+def render(template, fields):
+    """按 docker 的 Go 模板语法替换 {{.Field}}"""
+    template = template.replace("\\t", "\t")
+    return re.sub(r"\{\{\s*\.(\w+)\s*\}\}", lambda m: str(fields.get(m.group(1), "")), template)
+
+
+def matches_filters(container, filters):
+    for item in filters:
+        key, _, value = item.partition('=')
+        if key == 'ancestor' and container["image"] != value:
+            return False
+        if key == 'name' and value not in container["name"]:
+            return False
+        if key == 'id' and not container["id"].startswith(value):
+            return False
+    return True
+
+
+def cmd_ps(args, state):
+    containers = [c for c in state["containers"] if matches_filters(c, args.filter)]
+    command = '"/sbin/tini -- /usr…"'
+    if args.quiet:
+        for c in containers:
+            print(c["id"][:12])
+        return 0
+    if args.format:
+        for c in containers:
+            print(render(args.format, {"ID": c["id"][:12], "Names": c["name"], "Image": c["image"],
+                                       "Status": "Up 2 hours", "Command": command}))
+        return 0
+    print(f"{'CONTAINER ID':<15}{'IMAGE':<36}{'COMMAND':<25}{'CREATED':<16}{'STATUS':<15}{'PORTS':<8}NAMES")
+    for c in containers:
+        print(f"{c['id'][:12]:<15}{c['image']:<36}{command:<25}{'2 hours ago':<16}{'Up 2 hours':<15}{'':<8}{c['name']}")
+    return 0
+
+
+def find_container(state, ref):
+    for c in state["containers"]:
+        if c["id"].startswith(ref) or c["name"] == ref:
+            return c
+    return None
+
+
+def vtysh(root, container, command):
+    """只回答采集脚本用到的 show 命令"""
+    with open(os.path.join(root, "etc", "frr", "frr.conf"), 'r') as f:
+        config = f.read()
+    if command in ("show running-config", "show run", "write terminal"):
+        return "Building configuration...\n\nCurrent configuration:\n" + config
+    if command == "show ip route json":
+        routes = re.findall(r"ip address (\S+)", config)
+        return json.dumps({route: [{"prefix": route, "protocol": "connected", "selected": True,
+                                    "nexthops": [{"directlyConnected": True, "interfaceName": f"eth{i}", "active": True}]}]
+                           for i, route in enumerate(routes)}, indent=2) + "\n"
+    if command == "show ip route":
+        routes = re.findall(r"ip address (\S+)", config)
+        lines = ["Codes: K - kernel route, C - connected, S - static, O - OSPF, B - BGP", ""]
+        lines += [f"C>* {route} is directly connected, eth{i}, 02:00:00" for i, route in enumerate(routes)]
+        return "\n".join(lines) + "\n"
+    if command in ("show bgp summary json", "show ip bgp summary json"):
+        neighbors = re.findall(r"neighbor (\S+) remote-as (\d+)", config)
+        peers = {peer: {"remoteAs": int(asn), "msgRcvd": 120, "msgSent": 118, "peerUptime": "02:00:00",
+                        "pfxRcd": 3, "state": "Established"} for peer, asn in neighbors}
+        return json.dumps({"ipv4Unicast": {"peerCount": len(peers), "peers": peers}} if peers else {}, indent=2) + "\n"
+    if command == "show ip ospf neighbor json":
+        return json.dumps({"neighbors": {}}, indent=2) + "\n"
+    if command.startswith("show bgp summary") or command.startswith("show ip bgp summary"):
+        neighbors = re.findall(r"neighbor (\S+) remote-as (\d+)", config)
+        lines = ["IPv4 Unicast Summary:", "Neighbor        V         AS   MsgRcvd   MsgSent   TblVer  InQ OutQ  Up/Down State/PfxRcd"]
+        lines += [f"{peer:<15} 4 {asn:>10} {120:>9} {118:>9} {0:>8} {0:>4} {0:>4} 02:00:00 {3:>12}" for peer, asn in neighbors]
+        return "\n".join(lines) + "\n"
+    return f"% Unknown command: {command}\n"
+
+
+def run_exec(state_dir, state, container, command):
+    """在模拟容器中执行 command，返回 (退出码, stdout, stderr)；与 dockerd 一样每次 exec 产生 exec_create / exec_start / exec_die 三条事件"""
+    # 脚本中调用的 vtysh 在真实容器里不是一次新的 exec，不产生事件
+    if os.environ.get("NET_TWIN_SIM_NESTED"):
+        return exec_in_container(state_dir, state, container, command)
+    record_event(state_dir, "exec_create: " + " ".join(command), container)
+    record_event(state_dir, "exec_start: " + " ".join(command), container)
+    try:
+        return exec_in_container(state_dir, state, container, command)
+    finally:
+        record_event(state_dir, "exec_die", container)
+
+
+def exec_in_container(state_dir, state, container, command):
+    time.sleep(state.get("exec_latency", 0) / 1000.0)
+    root = container_root(state_dir, container["id"][:12])
+    if command[0] == "cat":
+        status = 0
+        stdout, stderr = [], []
+        for path in command[1:]:
+            try:
+                with open(os.path.join(root, path.lstrip('/')), 'r') as f:
+                    stdout.append(f.read())
+            except OSError:
+                stderr.append(f"cat: {path}: No such file or directory\n")
+                status = 1
+        return status, "".join(stdout), "".join(stderr)
+    if command[0] == "vtysh":
+        commands = [command[i + 1] for i, word in enumerate(command[:-1]) if word == "-c"]
+        outputs = [vtysh(root, container, item) for item in commands]
+        return (1 if any(output.startswith("% Unknown command") for output in outputs) else 0), "".join(outputs), ""
+    if command[0] in ("sh", "bash") and len(command) >= 3 and command[1] == "-c":
+        # 在宿主机 shell 中执行脚本，cat / vtysh 被替换为读取模拟容器的文件系统
+        prelude = (f'cat() {{ for f in "$@"; do command cat "{root}$f"; done; }}\n'
+                   f'vtysh() {{ NET_TWIN_SIM_DOCKER="{state_dir}" NET_TWIN_SIM_NESTED=1 "{sys.executable}" "{os.path.abspath(__file__)}" '
+                   f'exec {container["id"][:12]} vtysh "$@"; }}\n')
+        result = subprocess.run(["/bin/sh", "-c", prelude + command[2]], capture_output=True, text=True)
+        return result.returncode, result.stdout, result.stderr
+    return 126, "", f'OCI runtime exec failed: exec: "{command[0]}": executable file not found in $PATH: unknown\n'
+
+
+def cmd_exec(args, state):
+    container = find_container(state, args.container)
+    if container is None:
+        print(f"Error response from daemon: No such container: {args.container}", file=sys.stderr)
+        return 1
+    if not args.command:
+        print("docker exec requires at least 2 arguments", file=sys.stderr)
+        return 1
+    status, stdout, stderr = run_exec(args.state_dir, state, container, args.command)
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return status
+
+
+def container_stats(container, rng):
+    memory = rng.uniform(20, 200)
+    return {
+        "ID": container["id"][:12],
+        "Container": container["id"][:12],
+        "Name": container["name"],
+        "CPUPerc": f"{rng.uniform(0, 15):.2f}%",
+        "MemUsage": f"{memory:.2f}MiB / 7.775GiB",
+        "MemPerc": f"{memory / 7961.6 * 100:.2f}%",
+        "NetIO": f"{rng.uniform(1, 900):.1f}kB / {rng.uniform(1, 900):.1f}kB",
+        "BlockIO": f"{rng.uniform(0, 50):.1f}MB / {rng.uniform(0, 5):.2f}MB",
+        "PIDs": str(rng.randint(8, 30)),
+    }
+
+
+def cmd_stats(args, state):
+    if args.containers:
+        containers = []
+        for ref in args.containers:
+            container = find_container(state, ref)
+            if container is None:
+                print(f"Error response from daemon: No such container: {ref}", file=sys.stderr)
+                return 1
+            containers.append(container)
+    else:
+        containers = state["containers"]
+    # docker stats --no-stream 需要采样一段时间，耗时与容器数量无关
+    time.sleep(state.get("stats_latency", 0) / 1000.0)
+    rng = random.Random()
+    rows = [container_stats(c, rng) for c in containers]
+    if args.format:
+        for row in rows:
+            print(render(args.format, row))
+        return 0
+    print(f"{'CONTAINER ID':<15}{'NAME':<24}{'CPU %':<10}{'MEM USAGE / LIMIT':<26}{'MEM %':<9}{'NET I/O':<22}{'BLOCK I/O':<20}PIDS")
+    for row in rows:
+        print(f"{row['ID']:<15}{row['Name']:<24}{row['CPUPerc']:<10}{row['MemUsage']:<26}{row['MemPerc']:<9}"
+              f"{row['NetIO']:<22}{row['BlockIO']:<20}{row['PIDs']}")
+    return 0
+
+
+def engine_stats(container, rng):
+    """/containers/{id}/stats?stream=false 的原始统计，precpu_stats 为约 1 秒前的采样"""
+    online_cpus = 4
+    system = int(time.time() * 1e9) * online_cpus
+    usage = rng.randint(10 ** 9, 10 ** 12)
+    memory = int(rng.uniform(20, 200) * 1048576)
+    return {
+        "id": container["id"],
+        "name": "/" + container["name"],
+        "read": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "cpu_stats": {"cpu_usage": {"total_usage": usage}, "system_cpu_usage": system, "online_cpus": online_cpus},
+        "precpu_stats": {"cpu_usage": {"total_usage": usage - int(rng.uniform(0, 0.15) * 1e9)},
+                         "system_cpu_usage": system - online_cpus * 10 ** 9, "online_cpus": online_cpus},
+        "memory_stats": {"usage": memory + 4096, "limit": 8348340224, "stats": {"inactive_file": 4096}},
+        "networks": {"eth0": {"rx_bytes": rng.randint(1000, 900000), "tx_bytes": rng.randint(1000, 900000)},
+                     "eth1": {"rx_bytes": rng.randint(1000, 900000), "tx_bytes": rng.randint(1000, 900000)}},
+        "blkio_stats": {"io_service_bytes_recursive": [
+            {"major": 8, "minor": 0, "op": "read", "value": rng.randint(0, 50 * 10 ** 6)},
+            {"major": 8, "minor": 0, "op": "write", "value": rng.randint(0, 5 * 10 ** 6)}]},
+        "pids_stats": {"current": rng.randint(8, 30)},
+    }
+
+
+class EngineHandler(BaseHTTPRequestHandler):
+    """模拟 Docker Engine API 的 /_ping、/containers/json、exec 和 stats，支持 HTTP/1.1 长连接"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            sys.stderr.write(f"[conn {id(self.connection) & 0xffff:04x}] {format % args}\n")
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_body(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_found(self, message):
+        self.send_body(404, {"message": message})
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length) if length else b''
+        return json.loads(data) if data else {}
+
+    def route(self, method):
+        url = urlsplit(self.path)
+        path = re.sub(r"^/v[\d.]+(?=/)", "", url.path)
+        query = parse_qs(url.query)
+        body = self.read_json() if method == "POST" else None
+        state = self.server.current_state()
+        with self.server.lock:
+            self.server.requests += 1
+
+        if method == "GET" and path == "/_ping":
+            return self.send_body(200, b"OK", "text/plain; charset=utf-8")
+        if method == "GET" and path == "/events":
+            return self.send_events(query)
+        if method == "GET" and path == "/containers/json":
+            filters = json.loads(query.get("filters", ["{}"])[0])
+            items = [f"{key}={value}" for key, values in filters.items() for value in values]
+            return self.send_body(200, [{"Id": c["id"], "Names": ["/" + c["name"]], "Image": c["image"],
+                                         "State": "running", "Status": "Up 2 hours"}
+                                        for c in state["containers"] if matches_filters(c, items)])
+
+        match = re.match(r"^/containers/([^/]+)/(exec|stats)$", path)
+        if match:
+            container = find_container(state, match.group(1))
+            if container is None:
+                return self.not_found(f"No such container: {match.group(1)}")
+            if match.group(2) == "stats" and method == "GET":
+                time.sleep(state.get("stats_latency", 0) / 1000.0)
+                return self.send_body(200, engine_stats(container, random.Random()))
+            if match.group(2) == "exec" and method == "POST":
+                if not body.get("Cmd"):
+                    return self.send_body(400, {"message": "No exec command specified"})
+                exec_id = hashlib.sha256(os.urandom(16)).hexdigest()
+                with self.server.lock:
+                    self.server.execs[exec_id] = {"container": container, "command": body["Cmd"],
+                                                  "running": False, "exit_code": None}
+                return self.send_body(201, {"Id": exec_id})
+
+        match = re.match(r"^/exec/([^/]+)/(start|json)$", path)
+        if match:
+            instance = self.server.execs.get(match.group(1))
+            if instance is None:
+                return self.not_found(f"No such exec instance: {match.group(1)}")
+            if match.group(2) == "json" and method == "GET":
+                return self.send_body(200, {"ID": match.group(1), "Running": instance["running"],
+                                            "ExitCode": instance["exit_code"]})
+            if match.group(2) == "start" and method == "POST":
+                return self.start_exec(instance)
+
+        return self.not_found("page not found")
+
+    def send_events(self, query):
+        """指定 until 时一次返回历史事件；否则用 chunked 编码持续推送新事件，直到客户端断开"""
+        since = query.get("since", [None])[0]
+        until = query.get("until", [None])[0]
+        filters = json.loads(query.get("filters", ["{}"])[0])
+        if until:
+            data = "".join(json.dumps(event) + "\n" for event in read_events(self.server.state_dir, since, until, filters))
+            return self.send_body(200, data.encode('utf-8'))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        last_ns = int(float(since) * 1e9) if since else time.time_ns()
+        try:
+            while True:
+                for event in read_events(self.server.state_dir, filters=filters):
+                    if event["timeNano"] < last_ns:
+                        continue
+                    data = (json.dumps(event) + "\n").encode('utf-8')
+                    self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                    self.wfile.flush()
+                    last_ns = event["timeNano"] + 1
+                time.sleep(0.2)
+        except OSError:
+            self.close_connection = True
+
+    def start_exec(self, instance):
+        """exec start 接管连接：响应头之后是按帧复用的 stdout/stderr，输出结束后关闭连接"""
+        instance["running"] = True
+        upgrade = self.headers.get("Upgrade", "").lower() == "tcp"
+        self.send_response(101 if upgrade else 200, "UPGRADED" if upgrade else None)
+        self.send_header("Content-Type", "application/vnd.docker.multiplexed-stream")
+        if upgrade:
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Upgrade", "tcp")
+        self.end_headers()
+        status, stdout, stderr = run_exec(self.server.state_dir, self.server.state, instance["container"], instance["command"])
+        for stream, text in ((1, stdout), (2, stderr)):
+            data = text.encode('utf-8')
+            for offset in range(0, len(data), 32768):
+                chunk = data[offset:offset + 32768]
+                self.wfile.write(bytes([stream, 0, 0, 0]) + len(chunk).to_bytes(4, 'big') + chunk)
+        instance["exit_code"] = status
+        instance["running"] = False
+        self.close_connection = True
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+
+class EngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # dockerd 按系统的 somaxconn 监听；socketserver 默认的 5 在并发 exec 时会让客户端 connect 返回 EAGAIN
+    request_queue_size = 128
+
+    def __init__(self, socket_path, state_dir, state, verbose=False):
+        self.state_dir = state_dir
+        self.state = state
+        self.verbose = verbose
+        self.execs = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.state_mtime = self.mtime()
+        super().__init__(socket_path, EngineHandler)
+
+    def mtime(self):
+        try:
+            return os.path.getmtime(os.path.join(self.state_dir, "state.json"))
+        except OSError:
+            return None
+
+    def current_state(self):
+        """docker run / rm 修改状态文件后重新加载"""
+        mtime = self.mtime()
+        if mtime != self.state_mtime:
+            with self.lock:
+                self.state = load_state(self.state_dir)
+                self.state_mtime = mtime
+        return self.state
+
+    def get_request(self):
+        # UnixStreamServer 的客户端地址是空字符串，BaseHTTPRequestHandler 需要 (host, port)
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def cmd_serve(args, state):
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = EngineServer(args.socket, args.state_dir, state, args.verbose)
+    print(f"Docker Engine API simulator listening on {args.socket} ({len(state['containers'])} containers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+        print(f"{server.requests} requests over {server.connections} connections")
+    return 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="docker", description="模拟 docker CLI（ps / exec / stats / run / rm / events）。")
+    parser.add_argument("--state-dir", default=STATE_DIR, help=f"模拟状态目录（默认为 {STATE_DIR}，也可通过 NET_TWIN_SIM_DOCKER 设置）。")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    init = sub.add_parser("init", help="生成模拟的 FRR 容器。")
+    init.add_argument("--count", type=int, default=10, help="容器数量（默认为 10）。")
+    init.add_argument("--lab-id", default="sim-lab", help="容器名称中包含的实验 ID（默认为 sim-lab）。")
+    init.add_argument("--image", default=DEFAULT_IMAGE, help=f"容器镜像（默认为 {DEFAULT_IMAGE}）。")
+    init.add_argument("--config-lines", type=int, default=0, help="frr.conf 至少包含的行数（默认不填充）。")
+    init.add_argument("--exec-latency", type=float, default=50, help="每次 docker exec 的延迟（毫秒，默认为 50）。")
+    init.add_argument("--stats-latency", type=float, default=1000, help="每次 docker stats --no-stream 的采样延迟（毫秒，默认为 1000）。")
+    init.add_argument("--seed", type=int, default=1, help="随机种子（默认为 1）。")
+
+    install = sub.add_parser("install", help="生成 docker 包装脚本。")
+    install.add_argument("--bin-dir", default="/tmp/net-twin-sim/bin", help="包装脚本所在目录（默认为 /tmp/net-twin-sim/bin）。")
+
+    ps = sub.add_parser("ps")
+    ps.add_argument("-q", "--quiet", action="store_true")
+    ps.add_argument("-a", "--all", action="store_true")
+    ps.add_argument("--no-trunc", action="store_true")
+    ps.add_argument("-f", "--filter", action="append", default=[])
+    ps.add_argument("--format")
+
+    exec_ = sub.add_parser("exec")
+    exec_.add_argument("-i", "--interactive", action="store_true")
+    exec_.add_argument("-t", "--tty", action="store_true")
+    exec_.add_argument("container")
+    exec_.add_argument("command", nargs=argparse.REMAINDER)
+
+    stats = sub.add_parser("stats")
+    stats.add_argument("--no-stream", action="store_true")
+    stats.add_argument("-a", "--all", action="store_true")
+    stats.add_argument("--no-trunc", action="store_true")
+    stats.add_argument("--format")
+    stats.add_argument("containers", nargs="*")
+
+    run = sub.add_parser("run")
+    run.add_argument("-d", "--detach", action="store_true")
+    run.add_argument("--name")
+    run.add_argument("image")
+
+    rm = sub.add_parser("rm")
+    rm.add_argument("-f", "--force", action="store_true")
+    rm.add_argument("containers", nargs="+")
+
+    events = sub.add_parser("events")
+    events.add_argument("--since")
+    events.add_argument("--until")
+    events.add_argument("-f", "--filter", action="append", default=[])
+    events.add_argument("--format")
+
+    serve = sub.add_parser("serve", help="在 Unix socket 上模拟 Docker Engine API。")
+    serve.add_argument("--socket", default="/tmp/net-twin-sim/docker.sock", help="监听的 socket 路径（默认为 /tmp/net-twin-sim/docker.sock）。")
+    serve.add_argument("--verbose", action="store_true", help="打印每个请求。")
+
+    args = parser.parse_args(argv)
+    if args.action == "init":
+        return cmd_init(args)
+    if args.action == "install":
+        return cmd_install(args)
+
+    state = load_state(args.state_dir)
+    handlers = {"ps": cmd_ps, "exec": cmd_exec, "stats": cmd_stats, "run": cmd_run, "rm": cmd_rm, "events": cmd_events,
+                "serve": cmd_serve}
+    return handlers[args.action](args, state)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]) or 0)
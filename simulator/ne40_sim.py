@@ -0,0 +1,536 @@
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import ipaddress
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.async_console import raise_nofile_limit
+
+# Telnet 协议控制字节
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+ECHO = 1
+SGA = 3
+
+MORE = "  ---- More ----"
+MORE_ERASE = "\x1b[16D                \x1b[16D"
+
+BGP_TABLE_HEADER = "        Network            NextHop                       MED        LocPrf    PrefVal Path/Ogn"
+IP_BRIEF_HEADER = "Interface                         IP Address/Mask      Physical   Protocol VPN "
+
+
+def loopback(index):
+    return f"10.255.{index >> 8}.{index & 255}"
+
+
+def link_addresses(link):
+    """第 link 条链路（连接 link 号和 link+1 号设备）的 /30 网段两端地址"""
+    base = ipaddress.IPv4Address("172.16.0.0") + link * 4
+    return str(base + 1), str(base + 2), f"{base}/30"
+
+
+class Ne40Device:
+    """模拟一台 NE40：用户视图 <sysname>、系统视图 [~sysname]，按链式拓扑生成路由表、邻居和 NQA 结果"""
+
+    def __init__(self, index, count, options):
+        self.index = index  # 从 1 开始
+        self.count = count
+        self.options = options
+        self.sysname = f"R{index}"
+        self.router_id = loopback(index)
+        self.as_number = 65000 + index
+        self.view = 'user'
+        self.context = ''
+        self.uncommitted = False
+        self.screen_length = options.page_lines
+        self.nqa = {}
+        self.random = random.Random(options.seed * 100003 + index)
+        self.interfaces = self.build_interfaces()
+        self.outputs = {}
+
+    def build_interfaces(self):
+        interfaces = [("LoopBack0", self.router_id, 32, None)]
+        slot = 0
+        if self.index > 1:
+            _, address, _ = link_addresses(self.index - 1)
+            peer_address, _, _ = link_addresses(self.index - 1)
+            interfaces.append((f"GigabitEthernet0/0/{slot}", address, 30, (self.index - 1, peer_address)))
+            slot += 1
+        if self.index < self.count:
+            address, peer_address, _ = link_addresses(self.index)
+            interfaces.append((f"GigabitEthernet0/0/{slot}", address, 30, (self.index + 1, peer_address)))
+        return interfaces
+
+    def neighbors(self):
+        return [(name, address, peer) for name, address, _, peer in self.interfaces if peer]
+
+    def prompt(self):
+        if self.view == 'user':
+            return f"<{self.sysname}>"
+        mark = '*' if self.uncommitted else '~'
+        return f"[{mark}{self.sysname}{self.context}]"
+
+    def handle(self, line):
+        """执行一条命令，返回输出（不含回显和提示符）"""
+        command = ' '.join(line.split())
+        if not command:
+            return ""
+        words = command.split()
+        if command.startswith(('display ', 'dis ')):
+            return self.display(command)
+        if words[:2] == ['screen-length', '0'] or command == 'scr 0 t':
+            if not self.options.force_paging:
+                self.screen_length = 0
+            return "Info: The configuration takes effect on the current user terminal interface only."
+        if command in ('system-view', 'sys'):
+            self.view = 'system'
+            return "Enter system view, return user view with return command."
+        if self.view == 'user':
+            return self.unrecognized(command)
+        return self.configure(command, words)
+
+    def configure(self, command, words):
+        if command == 'return':
+            self.view, self.context = 'user', ''
+            return ""
+        if command in ('q', 'quit'):
+            if self.context:
+                self.context = ''
+            else:
+                self.view = 'user'
+            return ""
+        if command == 'commit':
+            self.uncommitted = False
+            return ""
+        if command == 'clear configuration candidate':
+            self.uncommitted = False
+            return ""
+        if words[0] == 'sysname' and len(words) == 2:
+            self.sysname = words[1]
+            self.uncommitted = True
+            return ""
+        if command.startswith('nqa test-instance '):
+            self.context = f"-nqa-{words[2]}-{words[3]}"
+            self.nqa.setdefault((words[2], words[3]), {"probe-count": 3, "interval": 4000, "started": None})
+            return ""
+        if command.startswith('undo nqa test-instance '):
+            self.nqa.pop((words[3], words[4]), None)
+            self.uncommitted = True
+            return ""
+        if self.context.startswith('-nqa-'):
+            return self.configure_nqa(command, words)
+        self.uncommitted = True
+        return ""
+
+    def configure_nqa(self, command, words):
+        _, _, admin, name = self.context.split('-', 3)
+        test = self.nqa[(admin, name)]
+        if words[0] == 'probe-count':
+            if not words[1:] or not words[1].isdigit() or not 1 <= int(words[1]) <= 15:
+                return "                ^\r\nError: Wrong parameter found at '^' position."
+            test["probe-count"] = int(words[1])
+        elif command.startswith('interval milliseconds'):
+            test["interval"] = int(words[2])
+        elif command.startswith('interval seconds'):
+            test["interval"] = int(words[2]) * 1000
+        elif words[0] == 'frequency':
+            test["frequency"] = int(words[1])
+        elif command.startswith('destination-address'):
+            test["destination"] = words[-1]
+        elif command == 'start now':
+            test["started"] = asyncio.get_running_loop().time()
+        elif command == 'stop':
+            test["started"] = None
+        self.uncommitted = True
+        return ""
+
+    def unrecognized(self, command):
+        return f"                  ^\r\nError: Unrecognized command found at '^' position."
+
+    def display(self, command):
+        words = command.split()
+        topic = ' '.join(words[1:])
+        if topic.startswith('nqa results'):
+            return self.nqa_results(words)
+        if topic in self.outputs:
+            return self.outputs[topic]
+        builders = {
+            'ip routing-table': self.routing_table,
+            'bgp peer': self.bgp_peer,
+            'ospf peer': self.ospf_peer,
+            'isis peer': self.isis_peer,
+            'mpls ldp peer': self.ldp_peer,
+            'ip interface brief': self.ip_interface_brief,
+            'bgp routing-table': self.bgp_routing_table,
+            'current-configuration': self.current_configuration,
+        }
+        builder = builders.get(topic)
+        if builder is None:
+            return self.unrecognized(command)
+        # 输出只依赖拓扑，生成一次后复用
+        self.outputs[topic] = builder()
+        return self.outputs[topic]
+
+    def route_entries(self):
+        routes = []
+        for name, address, masklen, _ in self.interfaces:
+            network = ipaddress.IPv4Network(f"{address}/{masklen}", strict=False)
+            routes.append((str(network), "Direct", 0, 0, "127.0.0.1" if masklen == 32 else address, name))
+        uplinks = self.neighbors()
+        for other in range(1, self.count + 1):
+            if other == self.index or len(routes) >= self.options.routes:
+                continue
+            name, _, (_, peer_address) = uplinks[0 if other < self.index or len(uplinks) == 1 else -1]
+            routes.append((f"{loopback(other)}/32", "OSPF", 10, abs(other - self.index), peer_address, name))
+        extra = 0
+        while len(routes) < self.options.routes and uplinks:
+            name, _, (_, peer_address) = uplinks[extra % len(uplinks)]
+            routes.append((f"192.{168 + (extra >> 16) % 64}.{(extra >> 8) & 255}.{extra & 255}/32", "O_ASE", 150, 1, peer_address, name))
+            extra += 1
+        return routes
+
+    def routing_table(self):
+        routes = self.route_entries()
+        lines = [
+            "Route Flags: R - relay, D - download to fib",
+            "-" * 78,
+            "Routing Tables: _public_",
+            f"         Destinations : {len(routes)}        Routes : {len(routes)}",
+            "",
+            "Destination/Mask    Proto   Pre  Cost      Flags NextHop         Interface",
+            "",
+        ]
+        for dest, proto, pre, cost, nexthop, iface in routes:
+            lines.append(f"{dest:>18}  {proto:<7} {pre:<4} {cost:<9} {'D':>4}   {nexthop:<15} {iface}")
+        return "\r\n".join(lines)
+
+    def bgp_peer(self):
+        peers = self.neighbors()
+        lines = [
+            "",
+            f" BGP local router ID : {self.router_id}",
+            f" Local AS number : {self.as_number}",
+            f" Total number of peers : {len(peers)}                 Peers in established state : {len(peers)}",
+            "",
+            "  Peer            V          AS  MsgRcvd  MsgSent  OutQ  Up/Down       State  PrefRcv",
+            "",
+        ]
+        for _, _, (peer, peer_address) in peers:
+            lines.append(f"  {peer_address:<15} 4 {65000 + peer:>11} {120:>8} {118:>8} {0:>5} 01:02:03 Established {self.options.bgp_routes:>8}")
+        return "\r\n".join(lines)
+
+    def ospf_peer(self):
+        lines = ["", f"          OSPF Process 1 with Router ID {self.router_id}", "                Neighbors", ""]
+        for name, address, (peer, peer_address) in self.neighbors():
+            lines += [
+                f" Area 0.0.0.0 interface {address}({name})'s neighbors",
+                f" Router ID: {loopback(peer)}         Address: {peer_address}",
+                "   State: Full  Mode:Nbr is Master  Priority: 1",
+                "   DR: None  BDR: None  MTU: 0",
+                "   Dead timer due in 33  sec",
+                "",
+            ]
+        return "\r\n".join(lines)
+
+    def isis_peer(self):
+        lines = ["", "                          Peer information for ISIS(1)", "",
+                 "  System Id     Interface          Circuit Id        State HoldTime Type     PRI",
+                 "-" * 80]
+        for name, _, (peer, _) in self.neighbors():
+            lines.append(f"  R{peer:<12} {name:<18} {peer:04d}.{self.index:04d}.00    Up   24s      L2       --")
+        lines.append(f"Total Peer(s): {len(self.neighbors())}")
+        return "\r\n".join(lines)
+
+    def ldp_peer(self):
+        lines = ["", " LDP Peer Information in Public network", " An asterisk (*) before a peer means the peer is being deleted.",
+                 " " + "-" * 76, " PeerID                 TransportAddress   DiscoverySource", " " + "-" * 76]
+        for name, _, (peer, _) in self.neighbors():
+            lines.append(f" {loopback(peer) + ':0':<22} {loopback(peer):<18} {name}")
+        lines.append(" " + "-" * 76)
+        lines.append(f" TOTAL: {len(self.neighbors())} Peer(s) Found.")
+        return "\r\n".join(lines)
+
+    def ip_interface_brief(self):
+        lines = ["*down: administratively down", "^down: standby", "(l): loopback", "(s): spoofing",
+                 "The number of interface that is UP in Physical is 3", "", IP_BRIEF_HEADER]
+        for name, address, masklen, _ in self.interfaces:
+            lines.append(f"{name:<33} {address + '/' + str(masklen):<20} {'up':<10} {'up':<8} --  ")
+        lines.append(f"{'NULL0':<33} {'unassigned':<20} {'up':<10} {'up(s)':<8} --  ")
+        return "\r\n".join(lines)
+
+    def bgp_prefixes(self, index):
+        return [f"100.{(index >> 4) & 255}.{((index & 15) << 4) + i}.0/24" for i in range(self.options.bgp_routes)]
+
+    def bgp_routing_table(self):
+        lines = ["", f" BGP Local router ID is {self.router_id}",
+                 " Status codes: * - valid, > - best, d - damped, x - best external, a - add path,",
+                 "               h - history,  i - internal, s - suppressed, S - Stale",
+                 "               Origin : i - IGP, e - EGP, ? - incomplete", "", "",
+                 f" Total Number of Routes: {self.options.bgp_routes * (1 + len(self.neighbors()))}",
+                 BGP_TABLE_HEADER, ""]
+        for prefix in self.bgp_prefixes(self.index):
+            lines.append(f" *>     {prefix:<18} {'0.0.0.0':<29} {0:<10} {'':<9} {0:<7} i")
+        for _, _, (peer, peer_address) in self.neighbors():
+            for prefix in self.bgp_prefixes(peer):
+                lines.append(f" *>     {prefix:<18} {peer_address:<29} {0:<10} {'':<9} {0:<7} {65000 + peer}i")
+        return "\r\n".join(lines)
+
+    def current_configuration(self):
+        lines = ["!Software Version V800R011C00SPC607B607", "#", f"sysname {self.sysname}", "#",
+                 "aaa", " authentication-scheme default0", "#", "mpls lsr-id " + self.router_id, "mpls", "#",
+                 "isis 1", f" network-entity 49.0001.0000.0000.{self.index:04d}.00", "#"]
+        for name, address, masklen, _ in self.interfaces:
+            mask = ipaddress.IPv4Network(f"0.0.0.0/{masklen}").netmask
+            lines += [f"interface {name}", " undo shutdown", f" ip address {address} {mask}", " isis enable 1", "#"]
+        lines += [f"bgp {self.as_number}", f" router-id {self.router_id}"]
+        for _, _, (peer, peer_address) in self.neighbors():
+            lines.append(f" peer {peer_address} as-number {65000 + peer}")
+        lines += ["#", "ospf 1", " area 0.0.0.0"]
+        for name, address, masklen, _ in self.interfaces:
+            lines.append(f"  network {address} 0.0.0.{3 if masklen == 30 else 0}")
+        lines.append("#")
+        # 按需把配置补到指定行数，模拟大配置
+        filler = 0
+        while len(lines) < self.options.config_lines:
+            lines += [f"ip route-static 198.{18 + (filler >> 16) % 2}.{(filler >> 8) & 255}.{filler & 255} 255.255.255.255 NULL0"]
+            filler += 1
+        lines.append("return")
+        return "\r\n".join(lines)
+
+    def nqa_results(self, words):
+        key = (words[-2], words[-1]) if len(words) >= 6 else None
+        test = self.nqa.get(key)
+        if not test or test["started"] is None:
+            return ""
+        # 测试时长约为 probe-count × interval；配置了 frequency 时按周期重复，保留最近 5 次记录
+        duration = test["probe-count"] * test["interval"] / 1000.0
+        elapsed = asyncio.get_running_loop().time() - test["started"]
+        frequency = test.get("frequency")
+        if frequency:
+            current = int(elapsed // frequency) + 1
+            running = elapsed - (current - 1) * frequency < duration
+        else:
+            current = 1
+            running = elapsed < duration
+        active = running or bool(frequency)
+        lines = [f" NQA entry({key[0]}, {key[1]}) :testflag is {'active' if active else 'inactive'} ,testtype is icmpjitter"]
+        for number in range(max(1, current - 4), current + 1):
+            if number == current and running:
+                lines.append(f"  {number} . Test {number} result   The test is running")
+                continue
+            lines.append(f"  {number} . Test {number} result   The test is finished")
+            base = 1 + abs(self.index - self.random.randint(1, self.count)) % 20
+            jitter = self.random.randint(0, 3)
+            loss = 0 if self.random.random() > 0.1 else self.random.randint(1, 20)
+            lines += [f"   SendProbe:{test['probe-count']}  ResponseProbe:{test['probe-count']}",
+                      f"   Min/Max/Avg/Sum RTT:{base}/{base + jitter}/{base + jitter // 2}/{(base + jitter // 2) * test['probe-count']}",
+                      f"   Average of Jitter: {jitter / 2}",
+                      f"   Packet Loss Ratio: {loss} %"]
+        return "\r\n".join(lines)
+
+
+class VpcsDevice:
+    """模拟 VPCS：提示符 VPCS>，只支持 show ip / ping 等少量命令"""
+
+    def __init__(self, index, options):
+        self.index = index
+        self.sysname = "VPCS"
+        self.screen_length = 0
+        self.address = f"192.168.{(index >> 8) & 255}.{index & 255}"
+
+    def prompt(self):
+        return f"{self.sysname}> "
+
+    def handle(self, line):
+        words = line.split()
+        if not words:
+            return ""
+        if words[0] == 'show' and words[1:2] == ['ip']:
+            return (f"NAME        : VPCS[1]\r\nIP/MASK     : {self.address}/24\r\nGATEWAY     : 192.168.0.1\r\n"
+                    f"MAC         : 00:50:79:66:68:{self.index & 255:02x}\r\nLPORT       : 20000\r\nMTU         : 1500")
+        if words[0] == 'ping' and len(words) > 1:
+            return "\r\n".join(f"84 bytes from {words[1]} icmp_seq={i} ttl=64 time=1.{i} ms" for i in range(1, 6))
+        return f"Bad command: \"{line.strip()}\". Use ? for help."
+
+
+class ConsoleServer:
+    """为每台模拟设备监听一个 Telnet 端口，行为接近 EVE-NG 的控制台"""
+
+    def __init__(self, devices, options):
+        self.devices = devices
+        self.options = options
+        self.random = random.Random(options.seed)
+
+    async def start(self):
+        servers = []
+        for port, device in self.devices:
+            servers.append(await asyncio.start_server(
+                lambda reader, writer, device=device: self.handle(reader, writer, device),
+                self.options.host, port, backlog=64))
+        return servers
+
+    async def respond_delay(self):
+        delay = self.options.latency + self.random.uniform(0, self.options.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+    async def handle(self, reader, writer, device):
+        writer.write(bytes([IAC, WILL, ECHO, IAC, WILL, SGA]) + b"\r\n")
+        line = bytearray()
+        pages = []
+        state = None  # Telnet 命令解析状态
+        last = None
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                for byte in data:
+                    # 跳过客户端发来的 Telnet 协商
+                    if state == 'iac':
+                        state = 'option' if byte in (DO, DONT, WILL, WONT) else ('sb' if byte == SB else None)
+                        continue
+                    if state == 'option':
+                        state = None
+                        continue
+                    if state == 'sb':
+                        state = 'sb-iac' if byte == IAC else 'sb'
+                        continue
+                    if state == 'sb-iac':
+                        state = None if byte == SE else 'sb'
+                        continue
+                    if byte == IAC:
+                        state = 'iac'
+                        continue
+
+                    if pages:
+                        # 翻页时任意键继续，q 结束
+                        if byte in (ord('q'), 3):
+                            pages = []
+                            writer.write(("\r\n" + device.prompt()).encode())
+                        else:
+                            pages = self.write_page(writer, device, pages, MORE_ERASE)
+                        continue
+
+                    if byte in (10, 13):
+                        if byte == 10 and last == 13:
+                            last = byte
+                            continue
+                        last = byte
+                        command = line.decode('ascii', errors='ignore')
+                        line.clear()
+                        writer.write(command.encode() + b"\r\n")
+                        await self.respond_delay()
+                        output = device.handle(command)
+                        lines = output.split("\r\n") if output else []
+                        pages = self.write_page(writer, device, lines, "")
+                        await writer.drain()
+                        continue
+                    last = byte
+                    if byte == 0:
+                        continue
+                    if byte in (8, 127):
+                        del line[-1:]
+                    else:
+                        line.append(byte)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def write_page(self, writer, device, lines, prefix):
+        """输出一页，返回剩余的行；关闭分页时一次输出全部"""
+        page = device.screen_length if device.screen_length else len(lines)
+        chunk, rest = lines[:page], lines[page:]
+        text = prefix + "".join(line + "\r\n" for line in chunk)
+        if rest:
+            writer.write((text + MORE).encode())
+        else:
+            writer.write((text + device.prompt()).encode())
+        return rest
+
+
+def write_param(path, lab_id, host, devices):
+    nodes = [{"hostip": host, "port": port, "console_type": "telnet", "name": device.sysname}
+             for port, device in devices]
+    with open(path, 'w') as f:
+        json.dump({"labId": lab_id, "node": nodes}, f, indent=4)
+    print(f"param.json written to {path}")
+
+
+def write_unl(path, lab_id, devices):
+    """生成与模拟拓扑一致的 .unl 文件，供 UNLParser 解析"""
+    lines = [f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+             f'<lab name="simulated" id="{lab_id}" version="1">', '  <topology>', '    <nodes>']
+    for node_id, (_, device) in enumerate(devices, start=1):
+        lines.append(f'      <node id="{node_id}" name="{device.sysname}" type="qemu" template="huaweine40">')
+        if isinstance(device, Ne40Device):
+            for interface_id, (name, _, _, peer) in enumerate(device.interfaces):
+                if peer:
+                    link = min(device.index, peer[0])
+                    lines.append(f'        <interface id="{interface_id}" name="{name}" type="ethernet" network_id="{link}"/>')
+        lines.append('      </node>')
+    lines += ['    </nodes>', '    <networks>']
+    routers = sum(1 for _, device in devices if isinstance(device, Ne40Device))
+    for link in range(1, routers):
+        lines.append(f'      <network id="{link}" type="bridge" name="Net-R{link}-R{link + 1}"/>')
+    lines += ['    </networks>', '  </topology>', '</lab>']
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"UNL file written to {path}")
+
+
+async def serve(options):
+    devices = []
+    port = options.base_port
+    for index in range(1, options.routers + 1):
+        devices.append((port, Ne40Device(index, options.routers, options)))
+        port += 1
+    for index in range(1, options.pcs + 1):
+        devices.append((port, VpcsDevice(index, options)))
+        port += 1
+
+    if options.param_out:
+        write_param(options.param_out, options.lab_id, options.host, devices)
+    if options.unl_out:
+        write_unl(options.unl_out, options.lab_id, devices)
+
+    raise_nofile_limit(len(devices) * 4 + 1024)
+    servers = await ConsoleServer(devices, options).start()
+    print(f"Simulating {options.routers} NE40 and {options.pcs} VPCS consoles on "
+          f"{options.host}:{options.base_port}-{port - 1}")
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 NE40/VPCS 控制台模拟器：在连续端口上模拟大量 Telnet 控制台，用于压测采集脚本。")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认为 127.0.0.1）。")
+    parser.add_argument("--base-port", type=int, default=40000, help="第一台设备的控制台端口（默认为 40000）。")
+    parser.add_argument("--routers", type=int, default=10, help="模拟的 NE40 数量（默认为 10），按链式拓扑互联。")
+    parser.add_argument("--pcs", type=int, default=0, help="模拟的 VPCS 数量（默认为 0），端口排在路由器之后。")
+    parser.add_argument("--latency", type=float, default=20, help="每条命令的响应延迟（毫秒，默认为 20）。")
+    parser.add_argument("--jitter", type=float, default=10, help="响应延迟的随机抖动上限（毫秒，默认为 10）。")
+    parser.add_argument("--routes", type=int, default=50, help="display ip routing-table 的路由条数（默认为 50）。")
+    parser.add_argument("--bgp-routes", type=int, default=3, help="每台设备发布的 BGP 前缀数（默认为 3）。")
+    parser.add_argument("--config-lines", type=int, default=0, help="display current-configuration 至少输出的行数（默认不填充）。")
+    parser.add_argument("--page-lines", type=int, default=0, help="每页行数，出现 ---- More ---- 分页（默认为 0，不分页）。")
+    parser.add_argument("--force-paging", action="store_true", help="忽略 screen-length 0，登录后仍按 --page-lines 分页，用于测试翻页处理。")
+    parser.add_argument("--lab-id", default="sim-lab", help="写入 param.json / .unl 的实验 ID（默认为 sim-lab）。")
+    parser.add_argument("--param-out", help="把设备列表写成 param.json，供各采集脚本使用。")
+    parser.add_argument("--unl-out", help="把模拟拓扑写成 .unl 文件。")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子（默认为 1）。")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass